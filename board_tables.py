@@ -0,0 +1,78 @@
+# Таблицы ходов для каждой клетки доски, вычисляются один раз при импорте модуля
+#
+# Клетки нумеруются индексами от 0 до 63: 0 - a1, 1 - b1, ..., 7 - h1, 8 - a2, ..., 63 - h8
+# (индекс = 8 * (горизонталь - 1) + номер вертикали от 0 до 7)
+
+# Клетки доски в порядке индексов
+CELLS = [f'{letter}{num}' for num in '12345678' for letter in 'abcdefgh']
+CELL_INDEX = {cell: index for index, cell in enumerate(CELLS)}
+
+# Цвета в таблицах пешек: 0 - белые, 1 - черные
+WHITE = 0
+BLACK = 1
+
+
+# получить индекс клетки по номеру вертикали (0-7) и горизонтали (0-7), None если за пределами доски
+def _square(file: int, rank: int):
+    if 0 <= file <= 7 and 0 <= rank <= 7:
+        return rank * 8 + file
+    return None
+
+
+# получить список существующих клеток по заданным сдвигам (сдвиг по вертикали, сдвиг по горизонтали)
+def _targets(index: int, steps: list) -> tuple:
+    file, rank = index % 8, index // 8
+    targets = [_square(file + df, rank + dr) for df, dr in steps]
+    return tuple(target for target in targets if target is not None)
+
+
+# получить луч (упорядоченный список клеток от ближней к дальней) в заданном направлении
+def _ray(index: int, df: int, dr: int) -> tuple:
+    file, rank = index % 8, index // 8
+    ray = []
+    target = _square(file + df, rank + dr)
+    while target is not None:
+        ray.append(target)
+        file, rank = file + df, rank + dr
+        target = _square(file + df, rank + dr)
+    return tuple(ray)
+
+
+# Направления лучей: направо, налево, вверх, вниз,
+# вверх-направо, вверх-налево, вниз-направо, вниз-налево
+DIRECTIONS = [(1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (-1, 1), (1, -1), (-1, -1)]
+
+# RAYS[направление][клетка] - луч из клетки в данном направлении (см. DIRECTIONS)
+RAYS = [[_ray(index, df, dr) for index in range(64)] for df, dr in DIRECTIONS]
+
+# лучи ладьи (по горизонтали и вертикали), слона (по диагоналям) и ферзя (все 8 направлений)
+ROOK_RAYS = [tuple(RAYS[direction][index] for direction in range(4)) for index in range(64)]
+BISHOP_RAYS = [tuple(RAYS[direction][index] for direction in range(4, 8)) for index in range(64)]
+QUEEN_RAYS = [ROOK_RAYS[index] + BISHOP_RAYS[index] for index in range(64)]
+
+# Клетки, куда может пойти конь (максимум 8)
+KNIGHT_TARGETS = [
+    _targets(index, [(2, 1), (-2, 1), (1, 2), (-1, 2), (2, -1), (-2, -1), (1, -2), (-1, -2)])
+    for index in range(64)
+]
+
+# Соседние клетки для короля (максимум 8)
+KING_TARGETS = [
+    _targets(index, [(0, 1), (-1, 1), (1, 1), (-1, 0), (1, 0), (0, -1), (-1, -1), (1, -1)])
+    for index in range(64)
+]
+
+# PAWN_PUSHES[цвет][клетка] - ходы пешки вперед: на одну клетку и (с начальной горизонтали) на две
+PAWN_PUSHES = [
+    [
+        _targets(index, [(0, step), (0, 2 * step)] if index // 8 == start_rank else [(0, step)])
+        for index in range(64)
+    ]
+    for step, start_rank in [(1, 1), (-1, 6)]
+]
+
+# PAWN_CAPTURES[цвет][клетка] - клетки, которые бьет пешка (сначала справа, потом слева)
+PAWN_CAPTURES = [
+    [_targets(index, [(1, step), (-1, step)]) for index in range(64)]
+    for step in [1, -1]
+]
@@ -1,37 +1,175 @@
-import copy
+from types import MappingProxyType
+
+from board_tables import (
+    CELLS, CELL_INDEX, WHITE, BLACK,
+    ROOK_RAYS, BISHOP_RAYS, QUEEN_RAYS, KNIGHT_TARGETS, KING_TARGETS, PAWN_PUSHES, PAWN_CAPTURES
+)
+from move_encoding import (
+    FLAGS_MASK, CAPTURE, EN_PASSANT, CASTLING, PROMOTION, PROMOTION_CAPTURE,
+    MOVE_BODIES, MOVES_BY_BODY, POLICY_MOVES
+)
+from zobrist import PIECE_KEYS, BLACK_TO_MOVE_KEY, CASTLING_RIGHTS_KEYS, EN_PASSANT_FILE_KEYS
 
 # https://github.com/UmidSadatov/ChessModel.git
 
+# Порядок клеток в строке board_stat (с 8-й горизонтали до 1-й, слева направо)
+BOARD_STAT_ORDER = [CELL_INDEX[f'{letter}{num}'] for num in '87654321' for letter in 'abcdefgh']
+
+# Порядок ключей в словаре get_board_stat_dict (по вертикалям: a1, a2, ..., h8)
+BOARD_DICT_ORDER = [f'{letter}{num}' for letter in 'abcdefgh' for num in '12345678']
+
+# Коды фигур (одна клетка массива - одно маленькое число):
+# 0 - пустая клетка, 1-6 - белые фигуры, 7-12 - черные фигуры
+PIECES = ['00', 'wp', 'wn', 'wb', 'wr', 'wq', 'wk', 'bp', 'bn', 'bb', 'br', 'bq', 'bk']
+PIECE_CODES = {piece: code for code, piece in enumerate(PIECES)}
+
+# буква фигуры в записи хода и цвет фигуры (WHITE / BLACK) по коду фигуры
+PIECE_LETTERS = ['0', 'P', 'N', 'B', 'R', 'Q', 'K', 'P', 'N', 'B', 'R', 'Q', 'K']
+PIECE_COLORS = [None, WHITE, WHITE, WHITE, WHITE, WHITE, WHITE, BLACK, BLACK, BLACK, BLACK, BLACK, BLACK]
+
+# лучи дальнобойных фигур
+SLIDER_RAYS = {'R': ROOK_RAYS, 'B': BISHOP_RAYS, 'Q': QUEEN_RAYS}
+
+PAWN_PROMOTION_PIECES = ['Q', 'N', 'B', 'R']
+
+# коды фигур превращения по цвету в порядке PAWN_PROMOTION_PIECES (как в флагах закодированного хода)
+PROMOTION_CODES = [
+    [PIECE_CODES[f'{color}{piece.lower()}'] for piece in PAWN_PROMOTION_PIECES]
+    for color in 'wb'
+]
+
+# начальные клетки королей (для рокировки): e1 и e8
+CASTLING_KING_CELLS = [CELL_INDEX['e1'], CELL_INDEX['e8']]
+
+# взятие на проходе: горизонталь пешки (5-я для белых, 4-я для черных),
+# сдвиг от целевой клетки до взятой пешки и пешка оппонента
+EN_PASSANT_RANKS = [4, 3]
+EN_PASSANT_CAPTURED_SHIFT = [-8, 8]
+ENEMY_PAWNS = [PIECE_CODES['bp'], PIECE_CODES['wp']]
+
+# коды фигур по цвету (WHITE / BLACK): пешка, конь, слон, ладья, ферзь, король
+ATTACKER_CODES = [
+    tuple(PIECE_CODES[f'{color}{piece}'] for piece in 'pnbrqk')
+    for color in 'wb'
+]
+KING_CODES = [PIECE_CODES['wk'], PIECE_CODES['bk']]
+
+# рокировки (закодированный ход -> клетка ладьи, куда идет ладья)
+CASTLING_MOVES = {
+    MOVES_BY_BODY['e1<O-O>']: (CELL_INDEX['h1'], CELL_INDEX['f1']),
+    MOVES_BY_BODY['e1<O-O-O>']: (CELL_INDEX['a1'], CELL_INDEX['d1']),
+    MOVES_BY_BODY['e8<O-O>']: (CELL_INDEX['h8'], CELL_INDEX['f8']),
+    MOVES_BY_BODY['e8<O-O-O>']: (CELL_INDEX['a8'], CELL_INDEX['d8']),
+}
+
+# клетки, через которые проходит король при рокировке (не должны быть под боем)
+CASTLING_PATHS = {
+    MOVES_BY_BODY['e1<O-O>']: (CELL_INDEX['f1'], CELL_INDEX['g1']),
+    MOVES_BY_BODY['e1<O-O-O>']: (CELL_INDEX['c1'], CELL_INDEX['d1']),
+    MOVES_BY_BODY['e8<O-O>']: (CELL_INDEX['f8'], CELL_INDEX['g8']),
+    MOVES_BY_BODY['e8<O-O-O>']: (CELL_INDEX['c8'], CELL_INDEX['d8']),
+}
+
+# ключи прав на рокировку в контексте
+# (права хранятся 4 битами: бит i - право CASTLING_KEYS[i])
+CASTLING_KEYS = [
+    'whites_chance_for_kingside_castling', 'whites_chance_for_queenside_castling',
+    'blacks_chance_for_kingside_castling', 'blacks_chance_for_queenside_castling'
+]
+WHITE_KINGSIDE, WHITE_QUEENSIDE, BLACK_KINGSIDE, BLACK_QUEENSIDE = 1, 2, 4, 8
+ALL_CASTLING_RIGHTS = 15
+
+# бит права на рокировку, нужного для каждой рокировки
+CASTLING_RIGHT_OF_MOVE = {
+    MOVES_BY_BODY['e1<O-O>']: WHITE_KINGSIDE,
+    MOVES_BY_BODY['e1<O-O-O>']: WHITE_QUEENSIDE,
+    MOVES_BY_BODY['e8<O-O>']: BLACK_KINGSIDE,
+    MOVES_BY_BODY['e8<O-O-O>']: BLACK_QUEENSIDE,
+}
+
+# CASTLING_RIGHTS_LOST[клетка] - права на рокировку, которые теряются при ходе из клетки (или в клетку)
+# короля или ладьи
+CASTLING_RIGHTS_LOST = [0] * 64
+CASTLING_RIGHTS_LOST[CELL_INDEX['e1']] = WHITE_KINGSIDE | WHITE_QUEENSIDE
+CASTLING_RIGHTS_LOST[CELL_INDEX['h1']] = WHITE_KINGSIDE
+CASTLING_RIGHTS_LOST[CELL_INDEX['a1']] = WHITE_QUEENSIDE
+CASTLING_RIGHTS_LOST[CELL_INDEX['e8']] = BLACK_KINGSIDE | BLACK_QUEENSIDE
+CASTLING_RIGHTS_LOST[CELL_INDEX['h8']] = BLACK_KINGSIDE
+CASTLING_RIGHTS_LOST[CELL_INDEX['a8']] = BLACK_QUEENSIDE
+
+# часть хеша Зобриста от прав на рокировку для каждого из 16 значений 4 битов
+CASTLING_ZOBRIST_KEYS = [0] * 16
+for _rights in range(16):
+    for _bit in range(4):
+        if _rights & 1 << _bit:
+            CASTLING_ZOBRIST_KEYS[_rights] ^= CASTLING_RIGHTS_KEYS[_bit]
+del _rights, _bit
+
+# цвет по индексу (WHITE / BLACK)
+COLORS = ['white', 'black']
+
+INITIAL_BOARD_STAT = ("br bn bb bq bk bb bn br "
+                      "bp bp bp bp bp bp bp bp "
+                      "00 00 00 00 00 00 00 00 "
+                      "00 00 00 00 00 00 00 00 "
+                      "00 00 00 00 00 00 00 00 "
+                      "00 00 00 00 00 00 00 00 "
+                      "wp wp wp wp wp wp wp wp "
+                      "wr wn wb wq wk wb wn wr")
+
+# FEN: буква фигуры -> код фигуры (заглавные - белые, строчные - черные) и обратно
+FEN_PIECE_CODES = {
+    (letter if color == 'w' else letter.lower()): PIECE_CODES[f'{color}{letter.lower()}']
+    for color in 'wb' for letter in 'PNBRQK'
+}
+FEN_PIECE_LETTERS = {code: letter for letter, code in FEN_PIECE_CODES.items()}
+
+# FEN: символ права на рокировку -> бит права (в порядке CASTLING_KEYS)
+FEN_CASTLING_SYMBOLS = {'K': WHITE_KINGSIDE, 'Q': WHITE_QUEENSIDE, 'k': BLACK_KINGSIDE, 'q': BLACK_QUEENSIDE}
+
+# результат законченной партии по победителю (None - ничья)
+GAME_RESULTS = {'white': '1-0', 'black': '0-1', None: '1/2-1/2'}
+
+# 75 ходов каждого игрока без взятий и ходов пешкой (150 полуходов) - автоничья
+SEVENTY_FIVE_MOVE_RULE_PLIES = 150
+
+# коды легких фигур (для проверки недостатка материала)
+MINOR_PIECE_CODES = {PIECE_CODES['wn'], PIECE_CODES['wb'], PIECE_CODES['bn'], PIECE_CODES['bb']}
+BISHOP_CODES = {PIECE_CODES['wb'], PIECE_CODES['bb']}
+
+INITIAL_FEN = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+
+# начальная позиция в виде массива кодов фигур
+INITIAL_BOARD = bytearray(64)
+for _index, _piece in zip(BOARD_STAT_ORDER, INITIAL_BOARD_STAT.split(' ')):
+    INITIAL_BOARD[_index] = PIECE_CODES[_piece]
+del _index, _piece
+
+
 class ChessBoard:
 
-    def __init__(self):
-        # Состояние доски (расположение фигур на доске)
-        self.board_stat = ("br bn bb bq bk bb bn br "
-                           "bp bp bp bp bp bp bp bp "
-                           "00 00 00 00 00 00 00 00 "
-                           "00 00 00 00 00 00 00 00 "
-                           "00 00 00 00 00 00 00 00 "
-                           "00 00 00 00 00 00 00 00 "
-                           "wp wp wp wp wp wp wp wp "
-                           "wr wn wb wq wk wb wn wr")
-
-        # Контекст (некоторые данные о текущем состоянии): возможности рокировки и взятий на проходе
-        self.context = {
-            "whites_chance_for_kingside_castling": True,  # у белых есть шанс на короткую рокировку при подходящей позиции
-            "whites_chance_for_queenside_castling": True,  # у белых есть шанс на длинную рокировку при подходящей позиции
-
-            "blacks_chance_for_kingside_castling": True,  # у черных есть шанс на короткую рокировку при подходящей позиции
-            "blacks_chance_for_queenside_castling": True,  # у черных есть шанс на длинную рокировку при подходящей позиции
-
-            # Взятия на проходе
-            # Например для белой пешки на f5:
-            # "Pf5xg6" - взятие на проходе черной пешки стоящей на g5, который последним сделал двойной ход с g7 на g5
-            "en_passant_chance_for_white": [],    # шанс взятия на проходе для белого (белый может взять)
-            "en_passant_chance_for_black": [],     # шанс взятия на проходе для черного (черный может взять)
-
-            # Чей ход: 'white' - ход белых, 'black' - ход черных
-            "current_player_color": 'white'
-        }
+    # Доска хранит только массив клеток и несколько чисел (без словаря атрибутов экземпляра)
+    __slots__ = ('board', '_castling', '_en_passant', '_color', 'halfmove_clock', 'fullmove_number',
+                 '_history', '_undo_stack', 'zobrist_key', '_repetitions', '_game_status')
+
+    # Общий для всех досок процесса кэш разрешенных ходов (см. move_cache.LegalMovesCache)
+    # None - кэш не используется
+    legal_moves_cache = None
+
+    # fen - начальная позиция в виде FEN-строки (по умолчанию - стандартная начальная позиция)
+    def __init__(self, fen: str = None):
+        # Состояние доски (расположение фигур на доске):
+        # массив из 64 клеток, в каждой код фигуры (см. PIECES), индекс клетки - см. CELLS
+        self.board = bytearray(INITIAL_BOARD)
+
+        # Контекст (некоторые данные о текущем состоянии), см. свойство context:
+        # права на рокировку - 4 бита (см. CASTLING_KEYS)
+        self._castling = ALL_CASTLING_RIGHTS
+        # клетка, через которую пешка оппонента только что прошла двойным ходом, если ее можно взять
+        # на проходе (есть пешка игрока рядом), иначе -1
+        self._en_passant = -1
+        # чей ход: WHITE / BLACK
+        self._color = WHITE
 
         # Количество полуходов: ходов подряд без взятия и без хода пешкой
         # обнуляется при ходе пешкой или взятии
@@ -39,642 +177,384 @@ class ChessBoard:
         # а при 75: автоничья
         self.halfmove_clock = 0
 
-        # Список состояний и контекстов доски
-        # При троекратном повторении: любой игрок имеет право потребовать ничью
-        self.stats_list = [[self.board_stat, self.context]]
+        # Номер хода (увеличивается после каждого хода черных)
+        self.fullmove_number = 1
+
+        if fen is not None:
+            self._load_fen(fen)
+
+        self._reset_history()
+
+    # создать доску с позицией из FEN-строки
+    @classmethod
+    def from_fen(cls, fen: str):
+        return cls(fen)
+
+    # создать доску из упакованной позиции (см. position_store): коды 64 клеток, права на рокировку (4 бита),
+    # чей ход ('white' / 'black'), вертикаль взятия на проходе (0-7 или None) и счетчик полуходов
+    # (номер хода не хранится и равен 1)
+    @classmethod
+    def from_packed(cls, codes, castling: int, color: str, en_passant_file: int = None, halfmove_clock: int = 0):
+        board = cls()
+        board.board[:] = bytes(codes)
+        board._castling = castling & ALL_CASTLING_RIGHTS
+        board._color = WHITE if color == 'white' else BLACK
+        board.halfmove_clock = halfmove_clock
+
+        # клетка взятия на проходе - за пешкой, которая прошла двойным ходом (6-я горизонталь для хода белых)
+        board._en_passant = -1
+        if en_passant_file is not None:
+            board._set_en_passant((5 if board._color == WHITE else 2) * 8 + en_passant_file)
+
+        board._reset_history()
+        return board
+
+    # заполнить доску и контекст из FEN-строки за один проход
+    # (поля после расстановки фигур необязательны: по умолчанию 'w - - 0 1')
+    def _load_fen(self, fen: str):
+        fields = fen.split()
+        if not fields or len(fields) > 6:
+            raise AttributeError(f"invalid FEN '{fen}'")
+        placement, side, castling, en_passant, halfmove_clock, fullmove_number = \
+            (fields + ['w', '-', '-', '0', '1'][len(fields) - 1:])[:6]
+
+        # фигуры (FEN перечисляет горизонтали с 8-й до 1-й)
+        board = self.board
+        board[:] = bytes(64)
+        rows = placement.split('/')
+        if len(rows) != 8:
+            raise AttributeError(f"invalid FEN '{fen}': 8 ranks expected")
+        for rank, row in zip(range(7, -1, -1), rows):
+            file = 0
+            for symbol in row:
+                if symbol.isdigit():
+                    file += int(symbol)
+                elif symbol in FEN_PIECE_CODES and file < 8:
+                    board[rank * 8 + file] = FEN_PIECE_CODES[symbol]
+                    file += 1
+                else:
+                    raise AttributeError(f"invalid FEN '{fen}': bad rank '{row}'")
+            if file != 8:
+                raise AttributeError(f"invalid FEN '{fen}': bad rank '{row}'")
+
+        if side not in ('w', 'b'):
+            raise AttributeError(f"invalid FEN '{fen}': side to move must be 'w' or 'b'")
+        color = 'white' if side == 'w' else 'black'
+
+        self._castling = 0
+        for symbol, bit in FEN_CASTLING_SYMBOLS.items():
+            if symbol in castling:
+                self._castling |= bit
+        self._color = WHITE if color == 'white' else BLACK
+
+        self._en_passant = -1
+        if en_passant != '-':
+            # пропущенная пешкой клетка: 6-я горизонталь, если ход белых, 3-я - если ход черных
+            if en_passant not in CELL_INDEX or en_passant[1] != ('6' if self._color == WHITE else '3'):
+                raise AttributeError(f"invalid FEN '{fen}': bad en passant square '{en_passant}'")
+            self._set_en_passant(CELL_INDEX[en_passant])
+
+        try:
+            self.halfmove_clock = int(halfmove_clock)
+            self.fullmove_number = int(fullmove_number)
+        except ValueError:
+            raise AttributeError(f"invalid FEN '{fen}': move counters must be integers") from None
+
+    # получить позицию в виде FEN-строки
+    # (поле взятия на проходе пишется, только если взятие на проходе возможно)
+    def to_fen(self) -> str:
+        board = self.board
+        rows = []
+        for rank in range(7, -1, -1):
+            row = ''
+            empty = 0
+            for code in board[rank * 8:rank * 8 + 8]:
+                if code == 0:
+                    empty += 1
+                    continue
+                if empty:
+                    row += str(empty)
+                    empty = 0
+                row += FEN_PIECE_LETTERS[code]
+            rows.append(row + str(empty) if empty else row)
+
+        castling = ''.join([symbol for symbol, bit in FEN_CASTLING_SYMBOLS.items() if self._castling & bit]) or '-'
+        en_passant = CELLS[self._en_passant] if self._en_passant != -1 else '-'
+
+        return f"{'/'.join(rows)} {'wb'[self._color]} {castling} {en_passant} {self.halfmove_clock} " \
+               f"{self.fullmove_number}"
+
+    # Контекст (некоторые данные о текущем состоянии) в виде словаря только для чтения:
+    #   "whites_chance_for_kingside_castling" и т.д. - права на рокировку (см. CASTLING_KEYS)
+    #   "en_passant_chance_for_white" / "..._black" - разрешенные взятия на проходе, например для белой
+    #       пешки на f5: "Pf5xg6EP" - взятие черной пешки на g5, которая последним ходом пошла с g7 на g5
+    #   "current_player_color" - чей ход: 'white' или 'black'
+    # Словарь создается при каждом обращении; изменить позицию можно через from_fen
+    @property
+    def context(self):
+        context = {key: bool(self._castling & 1 << bit) for bit, key in enumerate(CASTLING_KEYS)}
+        board = self.board
+        en_passant_chances = [PIECE_LETTERS[board[move & 63]] + MOVE_BODIES[move]
+                              for move in self._get_en_passant_moves(self._color)]
+        context['en_passant_chance_for_white'] = en_passant_chances if self._color == WHITE else []
+        context['en_passant_chance_for_black'] = en_passant_chances if self._color == BLACK else []
+        context['current_player_color'] = COLORS[self._color]
+        return MappingProxyType(context)
+
+    # чей ход: 'white' или 'black'
+    @property
+    def current_player_color(self) -> str:
+        return COLORS[self._color]
+
+    # права на рокировку: 4 бита в порядке CASTLING_KEYS
+    @property
+    def castling_rights(self) -> int:
+        return self._castling
+
+    # клетка взятия на проходе (индекс, см. CELLS) или None, если взятие на проходе невозможно
+    @property
+    def en_passant_square(self):
+        return self._en_passant if self._en_passant != -1 else None
+
+    # запомнить клетку взятия на проходе, только если рядом есть пешка игрока, чья очередь хода
+    # (соседние клетки - это клетки, которые бьет с пропущенной клетки пешка оппонента)
+    def _set_en_passant(self, en_passant_index: int):
+        board = self.board
+        opponent = 1 - self._color
+        self._en_passant = -1
+        for neighbour in PAWN_CAPTURES[opponent][en_passant_index]:
+            if board[neighbour] == ENEMY_PAWNS[opponent]:
+                self._en_passant = en_passant_index
+
+    # закодированные взятия на проходе для игрока заданного цвета (WHITE / BLACK)
+    # (сначала пешкой справа, потом слева)
+    def _get_en_passant_moves(self, color_index: int) -> list:
+        en_passant_index = self._en_passant
+        if en_passant_index == -1 or color_index != self._color:
+            return []
+        board = self.board
+        pawn = ENEMY_PAWNS[1 - color_index]
+        return [neighbour | en_passant_index << 6 | EN_PASSANT
+                for neighbour in PAWN_CAPTURES[1 - color_index][en_passant_index] if board[neighbour] == pawn]
+
+    # запись истории партии о текущей позиции
+    def _history_entry(self) -> tuple:
+        return bytes(self.board), self._castling, self._en_passant, self._color
+
+    # История партии: список [board_stat, контекст] для каждой позиции
+    # При троекратном повторении: любой игрок имеет право потребовать ничью
+    # Список строится из self._history при каждом обращении (ходы хранят только компактные записи)
+    @property
+    def stats_list(self) -> list:
+        position = ChessBoard.__new__(ChessBoard)
+        stats_list = []
+        for position.board, position._castling, position._en_passant, position._color in self._history:
+            stats_list.append([position.board_stat, dict(position.context)])
+        return stats_list
+
+    # начать историю партии с текущей позиции
+    def _reset_history(self):
+        # История позиций партии: (клетки доски, права на рокировку, взятие на проходе, чей ход)
+        # (в прежнем виде - см. stats_list)
+        self._history = [self._history_entry()]
+
+        # Стек отмены ходов (см. push и pop): только то, что изменилось при каждом ходе
+        self._undo_stack = []
+
+        # Хеш Зобриста текущей позиции (обновляется при каждом ходе, см. zobrist.py)
+        self.zobrist_key = self.compute_zobrist_key()
+
+        # Счетчик повторений позиций (хеш -> сколько раз встречалась)
+        # с последнего необратимого хода (хода пешкой или взятия)
+        self._repetitions = {self.zobrist_key: 1}
+
+        # Состояние партии, вычисленное game_status: (ключ позиции, состояние)
+        self._game_status = None
+
+    # состояние доски в строчном виде (вычисляется из массива self.board)
+    @property
+    def board_stat(self) -> str:
+        board = self.board
+        return ' '.join([PIECES[board[index]] for index in BOARD_STAT_ORDER])
+
+    @board_stat.setter
+    def board_stat(self, board_stat: str):
+        board = self.board
+        for index, piece in zip(BOARD_STAT_ORDER, board_stat.split(' ')):
+            board[index] = PIECE_CODES[piece]
+        self.zobrist_key = self.compute_zobrist_key()
 
     # перевести состояние доски из строчного вида в словарь
     def get_board_stat_dict(self) -> dict:
-        board_stat_dict = {}
-
-        for letter in 'abcdefgh':
-            for num in '12345678':
-                board_stat_dict[letter + num] = None
-
-        board_stat_list = self.board_stat.split(' ')
-
-        for num in '87654321':
-            for letter in 'abcdefgh':
-                board_stat_dict[letter + num] = board_stat_list[0]
-                board_stat_list = board_stat_list[1:]
-
-        return board_stat_dict
+        board = self.board
+        return {cell: PIECES[board[CELL_INDEX[cell]]] for cell in BOARD_DICT_ORDER}
 
     # перевести состояние доски из словаря в строку
-    def get_board_stat_from_dict(self, board_stat_dict:dict):
-        board_stat_str = ''
-        for num in '87654321':
-            for letter in 'abcdefgh':
-                board_stat_str += board_stat_dict[letter + num] + ' '
-        self.board_stat = board_stat_str[:-1]
+    def get_board_stat_from_dict(self, board_stat_dict: dict):
+        board = self.board
+        for cell, piece in board_stat_dict.items():
+            board[CELL_INDEX[cell]] = PIECE_CODES[piece]
+        self.zobrist_key = self.compute_zobrist_key()
+
+    # вход нейросети: доска в виде массива 8x8x12 и цвет игрока (1 - белый, 0 - черный), см. encoding
+    # (numpy нужен только здесь, поэтому модуль encoding импортируется при вызове)
+    def to_tensor(self, dtype='uint8') -> tuple:
+        from encoding import encode_boards
+        tensor, colors = encode_boards([self], dtype=dtype)
+        return tensor[0], int(colors[0])
+
+    # маска разрешенных ходов игрока, чья очередь хода, по словарю ходов moves.json (см. encoding)
+    def legal_policy_mask(self):
+        from encoding import legal_policy_masks
+        return legal_policy_masks([self])[0]
+
+    # перевести выход policy_head (вектор по словарю moves.json) в top_k лучших разрешенных ходов
+    # для make_move ('Pe2e4', ...) по убыванию оценки
+    def decode_policy(self, logits, top_k: int = 1) -> list:
+        from encoding import decode_policies
+        return decode_policies(logits, [self], top_k)[0]
 
     # показать доску
     def show(self):
         stat_list = self.board_stat.split(' ')
-        print(' '.join(stat_list[:8]))
-        print(' '.join(stat_list[8:16]))
-        print(' '.join(stat_list[16:24]))
-        print(' '.join(stat_list[24:32]))
-        print(' '.join(stat_list[32:40]))
-        print(' '.join(stat_list[40:48]))
-        print(' '.join(stat_list[48:56]))
-        print(' '.join(stat_list[56:]))
+        for row in range(8):
+            print(' '.join(stat_list[row * 8:row * 8 + 8]))
 
     # получить фигуру в заданной клетке
     def get_piece_in_cell(self, cell: str) -> str:
-        bsd = self.get_board_stat_dict()
-        return bsd[cell]
-        # try:
-        #     return bsd[cell]
-        # except KeyError:
-        #     for key, value in bsd.items():
-        #         print(f'{key}: {value}')
-        #     print(cell)
+        return PIECES[self.board[CELL_INDEX[cell]]]
 
     # сделать заданную клетку пустым (убрать фигуру)
     def remove_piece_in_cell(self, cell: str):
-        # убираем фигуру, сделав заданную клетку пустым, возвращаем новое состояние доски
-        bsd = self.get_board_stat_dict()
-        bsd[cell] = '00'
-        self.get_board_stat_from_dict(bsd)
+        self.put_piece_in_cell(cell, '00')
 
     # поставить заданную фигуру в заданную клетку
+    # (независимо какая была фигура до этого или была ли пустая данная клетка)
     def put_piece_in_cell(self, cell: str, piece: str):
-        # ставим фигуру в заданную клетку
-        # (независимо какая была фигура до этого или была ли пустая данная клетка),
-        # возвращаем новое состояние доски
-        bsd = self.get_board_stat_dict()
-        bsd[cell] = piece
-        self.get_board_stat_from_dict(bsd)
+        index = CELL_INDEX[cell]
+        code = PIECE_CODES[piece]
+        self.zobrist_key ^= PIECE_KEYS[self.board[index]][index] ^ PIECE_KEYS[code][index]
+        self.board[index] = code
 
     # получить предварительный список возможных ходов, включая взятия
     def get_preliminary_moves_list_of_piece(self, cell: str) -> list:
         #   получить ПРЕДВАРИТЕЛЬНЫЙ список возможных ходов фигуры
         #   в заданной клетке при заданном состоянии доски
         #   без учета возможных шахов
+        index = CELL_INDEX[cell]
+        letter = PIECE_LETTERS[self.board[index]]
+        return [letter + MOVE_BODIES[move] for move in self._get_preliminary_moves(index)]
 
+    # то же самое в виде закодированных ходов (см. move_encoding)
+    # (все целевые клетки берутся из заранее вычисленных таблиц board_tables)
+    def _get_preliminary_moves(self, index: int) -> list:
         moves_list_of_piece = []
-        piece = self.get_piece_in_cell(cell)
-
-        # Ладья:
-        if piece[1] == 'r':
-
-            letters = 'abcdefgh'
-            cur_let_indx = letters.index(cell[0])
-
-            # направо:
-            next_let_indx = cur_let_indx + 1
-            while next_let_indx <= 7:
-                next_letter = letters[next_let_indx]
-                next_cell = f'{next_letter}{cell[1]}'
-                next_piece = self.get_piece_in_cell(next_cell)
-                if next_piece == '00':
-                    # если след. клетка пустая
-                    moves_list_of_piece.append(f'R{cell}{next_cell}')
-                    next_let_indx += 1
-                elif piece[0] != next_piece[0]:
-                    # если в след. клетке фигура оппонента (другого цвета)
-                    moves_list_of_piece.append(f'R{cell}x{next_cell}')
-                    break
-                else:
-                    break
-
-            # налево:
-            prev_let_indx = cur_let_indx - 1
-            while prev_let_indx >= 0:
-                prev_letter = letters[prev_let_indx]
-                prev_cell = f'{prev_letter}{cell[1]}'
-                prev_piece = self.get_piece_in_cell(prev_cell)
-                if prev_piece == '00':
-                    # если пред. клетка пустая
-                    moves_list_of_piece.append(f'R{cell}{prev_cell}')
-                    prev_let_indx -= 1
-                elif piece[0] != prev_piece[0]:
-                    # если в пред. клетке фигура оппонента (другого цвета)
-                    moves_list_of_piece.append(f'R{cell}x{prev_cell}')
-                    break
-                else:
-                    break
-
-            letter = cell[0]
-            current_num = cell[1]
-
-            # вверх
-            upper_num = int(current_num) + 1
-            while upper_num <= 8:
-                upper_cell = f'{letter}{upper_num}'
-                upper_piece = self.get_piece_in_cell(upper_cell)
-                if upper_piece == '00':
-                    # если верхняя клетка пустая
-                    moves_list_of_piece.append(f'R{cell}{upper_cell}')
-                    upper_num += 1
-                elif piece[0] != upper_piece[0]:
-                    # если в верхней клетке фигура оппонента (другого цвета)
-                    moves_list_of_piece.append(f'R{cell}x{upper_cell}')
-                    break
-                else:
-                    break
-
-            # вниз
-            lower_num = int(current_num) - 1
-            while lower_num > 0:
-                lower_cell = f'{letter}{lower_num}'
-                lower_piece = self.get_piece_in_cell(lower_cell)
-                if lower_piece == '00':
-                    # если нижняя клетка пустая
-                    moves_list_of_piece.append(f'R{cell}{lower_cell}')
-                    lower_num -= 1
-                elif piece[0] != lower_piece[0]:
-                    # если в нижней клетке фигура оппонента (другого цвета)
-                    moves_list_of_piece.append(f'R{cell}x{lower_cell}')
-                    break
-                else:
-                    break
-
-        # Слон:
-        elif piece[1] == 'b':
-            letters = 'abcdefgh'
-
-            cur_let_indx = letters.index(cell[0])
-            cur_num = int(cell[1])
-
-            # вверх-направо
-            upper_num = int(cur_num) + 1
-            next_let_indx = cur_let_indx + 1
-            while upper_num <= 8 and next_let_indx <= 7:
-                next_letter = letters[next_let_indx]
-                upper_next_cell = f'{next_letter}{upper_num}'
-                upper_next_piece = self.get_piece_in_cell(upper_next_cell)
-                if upper_next_piece == '00':
-                    # если верхняя-правая клетка пустая
-                    moves_list_of_piece.append(f'B{cell}{upper_next_cell}')
-                    next_let_indx += 1
-                    upper_num += 1
-                elif piece[0] != upper_next_piece[0]:
-                    # если в верхней-правой клетке фигура оппонента (другого цвета)
-                    moves_list_of_piece.append(f'B{cell}x{upper_next_cell}')
-                    break
-                else:
-                    break
-
-            # вверх-налево
-            upper_num = int(cur_num) + 1
-            prev_let_indx = cur_let_indx - 1
-            while upper_num <= 8 and prev_let_indx >= 0:
-                prev_letter = letters[prev_let_indx]
-                upper_prev_cell = f'{prev_letter}{upper_num}'
-                upper_prev_piece = self.get_piece_in_cell(upper_prev_cell)
-                if upper_prev_piece == '00':
-                    # если верхняя-левая клетка пустая
-                    moves_list_of_piece.append(f'B{cell}{upper_prev_cell}')
-                    prev_let_indx -= 1
-                    upper_num += 1
-                elif piece[0] != upper_prev_piece[0]:
-                    # если в верхней-левой клетке фигура оппонента (другого цвета)
-                    moves_list_of_piece.append(f'B{cell}x{upper_prev_cell}')
-                    break
-                else:
-                    break
-
-            # вниз-направо
-            lower_num = int(cur_num) - 1
-            next_let_indx = cur_let_indx + 1
-            while lower_num > 0 and next_let_indx <= 7:
-                next_letter = letters[next_let_indx]
-                lower_next_cell = f'{next_letter}{lower_num}'
-                lower_next_piece = self.get_piece_in_cell(lower_next_cell)
-                if lower_next_piece == '00':
-                    # если нижняя-правая клетка пустая
-                    moves_list_of_piece.append(f'B{cell}{lower_next_cell}')
-                    next_let_indx += 1
-                    lower_num -= 1
-                elif piece[0] != lower_next_piece[0]:
-                    # если в нижней-правой клетке фигура оппонента (другого цвета)
-                    moves_list_of_piece.append(f'B{cell}x{lower_next_cell}')
-                    break
-                else:
-                    break
-
-            # вниз-налево
-            lower_num = int(cur_num) - 1
-            prev_let_indx = cur_let_indx - 1
-            while lower_num > 0 and prev_let_indx >= 0:
-                prev_letter = letters[prev_let_indx]
-                lower_prev_cell = f'{prev_letter}{lower_num}'
-                lower_prev_piece = self.get_piece_in_cell(lower_prev_cell)
-                if lower_prev_piece == '00':
-                    # если нижняя-левая клетка пустая
-                    moves_list_of_piece.append(f'B{cell}{lower_prev_cell}')
-                    prev_let_indx -= 1
-                    lower_num -= 1
-                elif piece[0] != lower_prev_piece[0]:
-                    # если в нижней-левой клетке фигура оппонента (другого цвета)
-                    moves_list_of_piece.append(f'B{cell}x{lower_prev_cell}')
-                    break
-                else:
-                    break
-
-        # Конь
-        elif piece[1] == 'n':
-            letters = 'abcdefgh'
-            cur_let_indx = letters.index(cell[0])
-            cur_num = int(cell[1])
-
-            # один шаг вверх
-            one_step_upper_num = cur_num + 1
-
-            # два шага вверх
-            two_steps_upper_num = cur_num + 2
-
-            # один шаг вниз
-            one_step_lower_num = cur_num - 1
-
-            # два шага вниз
-            two_steps_lower_num = cur_num - 2
-
-            # один шаг направо
-            one_step_right_let_indx = cur_let_indx + 1
-
-            # два шага направо
-            two_steps_right_let_indx = cur_let_indx + 2
-
-            # один шаг налево
-            one_step_left_let_indx = cur_let_indx - 1
-
-            # два шага налево
-            two_steps_left_let_indx = cur_let_indx - 2
-
-            # список целевых (возможных) ходов коня, максимум 8
-            target_cells = []
-
-            # один шаг вверх
-            if one_step_upper_num <= 8:
-
-                # два шага вправо
-                if two_steps_right_let_indx <= 7:
-                    two_steps_right_letter = letters[two_steps_right_let_indx]
-                    target_cell = f'{two_steps_right_letter}{one_step_upper_num}'
-                    target_cells.append(target_cell)
-                # два шага влево
-                if two_steps_left_let_indx >= 0:
-                    two_steps_left_letter = letters[two_steps_left_let_indx]
-                    target_cell = f'{two_steps_left_letter}{one_step_upper_num}'
-                    target_cells.append(target_cell)
-
-                # два шага вверх
-                if two_steps_upper_num <= 8:
-                    # один шаг вправо
-                    if one_step_right_let_indx <= 7:
-                        one_step_right_letter = letters[one_step_right_let_indx]
-                        target_cell = f'{one_step_right_letter}{two_steps_upper_num}'
-                        target_cells.append(target_cell)
-                    # один шаг влево
-                    if one_step_left_let_indx >= 0:
-                        one_step_left_letter = letters[one_step_left_let_indx]
-                        target_cell = f'{one_step_left_letter}{two_steps_upper_num}'
-                        target_cells.append(target_cell)
-
-            # один шаг вниз
-            if one_step_lower_num > 0:
-
-                # два шага вправо
-                if two_steps_right_let_indx <= 7:
-                    two_steps_right_letter = letters[two_steps_right_let_indx]
-                    target_cell = f'{two_steps_right_letter}{one_step_lower_num}'
-                    target_cells.append(target_cell)
-                # два шага влево
-                if two_steps_left_let_indx >= 0:
-                    two_steps_left_letter = letters[two_steps_left_let_indx]
-                    target_cell = f'{two_steps_left_letter}{one_step_lower_num}'
-                    target_cells.append(target_cell)
-
-                # два шага вниз
-                if two_steps_lower_num > 0:
-                    # один шаг вправо
-                    if one_step_right_let_indx <= 7:
-                        one_step_right_letter = letters[one_step_right_let_indx]
-                        target_cell = f'{one_step_right_letter}{two_steps_lower_num}'
-                        target_cells.append(target_cell)
-                    # один шаг влево
-                    if one_step_left_let_indx >= 0:
-                        one_step_left_letter = letters[one_step_left_let_indx]
-                        target_cell = f'{one_step_left_letter}{two_steps_lower_num}'
-                        target_cells.append(target_cell)
-
-            for target_cell in target_cells:
-                target_piece = self.get_piece_in_cell(target_cell)
-                if target_piece == '00':
+        board = self.board
+        code = board[index]
+
+        # пустая клетка
+        if code == 0:
+            return moves_list_of_piece
+
+        letter = PIECE_LETTERS[code]
+        color = PIECE_COLORS[code]
+
+        # Ладья, Слон, Ферзь: идем по лучам до первой занятой клетки
+        # (ходы Ферзя - это ходы Ладьи и затем ходы Слона)
+        if letter in SLIDER_RAYS:
+            for ray in SLIDER_RAYS[letter][index]:
+                for target in ray:
+                    target_code = board[target]
+                    if target_code == 0:
+                        # если клетка пустая
+                        moves_list_of_piece.append(index | target << 6)
+                    else:
+                        # если в клетке фигура оппонента (другого цвета)
+                        if PIECE_COLORS[target_code] != color:
+                            moves_list_of_piece.append(index | target << 6 | CAPTURE)
+                        break
+
+        # Конь и Король
+        elif letter == 'N' or letter == 'K':
+            for target in (KNIGHT_TARGETS if letter == 'N' else KING_TARGETS)[index]:
+                target_code = board[target]
+                if target_code == 0:
                     # если целевая клетка пустая
-                    moves_list_of_piece.append(f'N{cell}{target_cell}')
-                elif piece[0] != target_piece[0]:
+                    moves_list_of_piece.append(index | target << 6)
+                elif PIECE_COLORS[target_code] != color:
                     # если в целевой клетке фигура оппонента
-                    moves_list_of_piece.append(f'N{cell}x{target_cell}')
-
-        # Ферзь
-        elif piece[1] == 'q':
-            # ходы Ладьи + ходы Слона (горизонтально, вертикально и по всем диагоналям)
-
-            # Определим ходы по горизонтали и вертикали (как у Ладьи)
-            # сначала заменяем Ферзь на Ладью (такого же цвета в той же клетке)
-            self.put_piece_in_cell(cell, f'{piece[0]}r')
-            hor_and_vert_moves = self.get_preliminary_moves_list_of_piece(cell)
-
-            # Определим ходы по диагонялям (как у Слона)
-            # сначала заменяем Ферзь на Слона (такого же цвета в той же клетке)
-            self.put_piece_in_cell(cell, f'{piece[0]}b')
-            diagonal_moves = self.get_preliminary_moves_list_of_piece(cell)
-
-            # Обратно поставим Ферзь в эту клетку
-            self.put_piece_in_cell(cell, f'{piece[0]}q')
-
-            # все ходы соберем в один список
-            moves_list_of_piece = hor_and_vert_moves + diagonal_moves
-
-            # первую букву всех ходов заменяем на Q (означающую Ферзь)
-            moves_list_of_piece = [f'Q{move[1:]}' for move in moves_list_of_piece]
-
-        # Король
-        elif piece[1] == 'k':
-
-            letters = 'abcdefgh'
-            cur_let_indx = letters.index(cell[0])
-
-            left_let_indx = cur_let_indx - 1
-            right_let_indx = cur_let_indx + 1
-
-            upper_num = int(cell[1]) + 1
-            lower_num = int(cell[1]) - 1
-
-            target_cells = []
-
-            if upper_num <= 8:
-                target_cells.append(f'{cell[0]}{upper_num}')
-                if left_let_indx >= 0:
-                    left_letter = letters[left_let_indx]
-                    target_cells.append(f'{left_letter}{upper_num}')
-                if right_let_indx <= 7:
-                    right_letter = letters[right_let_indx]
-                    target_cells.append(f'{right_letter}{upper_num}')
-
-            if left_let_indx >= 0:
-                left_letter = letters[left_let_indx]
-                target_cells.append(f'{left_letter}{cell[1]}')
-            if right_let_indx <= 7:
-                right_letter = letters[right_let_indx]
-                target_cells.append(f'{right_letter}{cell[1]}')
-
-            if lower_num > 0:
-                target_cells.append(f'{cell[0]}{lower_num}')
-                if left_let_indx >= 0:
-                    left_letter = letters[left_let_indx]
-                    target_cells.append(f'{left_letter}{lower_num}')
-                if right_let_indx <= 7:
-                    right_letter = letters[right_let_indx]
-                    target_cells.append(f'{right_letter}{lower_num}')
-
-            for target_cell in target_cells:
-                target_piece = self.get_piece_in_cell(target_cell)
-                if target_piece == '00':
-                    # если целевая клетка пустая
-                    moves_list_of_piece.append(f'K{cell}{target_cell}')
-                elif piece[0] != target_piece[0]:
-                    # если в целевой клетке находится фигура оппонента (другого цвета)
-                    moves_list_of_piece.append(f'K{cell}x{target_cell}')
+                    moves_list_of_piece.append(index | target << 6 | CAPTURE)
 
             # РОКИРОВКА (при подходящей позиции):
-
-            # для белого
-            if piece == 'wk' and cell == 'e1':
-                # короткая
-                if \
-                        self.get_piece_in_cell('f1') == '00' and \
-                                self.get_piece_in_cell('g1') == '00' and \
-                                self.get_piece_in_cell('h1') == 'wr':
-                    moves_list_of_piece.append('Ke1<O-O>')
-                # длинная
-                if \
-                        self.get_piece_in_cell('d1') == '00' and \
-                                self.get_piece_in_cell('c1') == '00' and \
-                                self.get_piece_in_cell('b1') == '00' and \
-                                self.get_piece_in_cell('a1') == 'wr':
-                    moves_list_of_piece.append('Ke1<O-O-O>')
-
-            # для черного
-            elif piece == 'bk' and cell == 'e8':
+            if letter == 'K' and index == CASTLING_KING_CELLS[color]:
+                rook = PIECE_CODES['wr'] if color == WHITE else PIECE_CODES['br']
+                row = index - 4
                 # короткая
-                if \
-                        self.get_piece_in_cell('f8') == '00' and \
-                                self.get_piece_in_cell('g8') == '00' and \
-                                self.get_piece_in_cell('h8') == 'br':
-                    moves_list_of_piece.append('Ke8<O-O>')
+                if board[row + 5] == 0 and board[row + 6] == 0 and board[row + 7] == rook:
+                    moves_list_of_piece.append(index | (row + 6) << 6 | CASTLING)
                 # длинная
-                if \
-                        self.get_piece_in_cell('d8') == '00' and \
-                                self.get_piece_in_cell('c8') == '00' and \
-                                self.get_piece_in_cell('b8') == '00' and \
-                                self.get_piece_in_cell('a8') == 'br':
-                    moves_list_of_piece.append('Ke8<O-O-O>')
+                if board[row + 3] == 0 and board[row + 2] == 0 and board[row + 1] == 0 and board[row] == rook:
+                    moves_list_of_piece.append(index | (row + 2) << 6 | CASTLING)
 
         # Пешка
-        elif piece[1] == 'p':
-
-            letters = 'abcdefgh'
-
-            cur_letter = cell[0]
-            cur_num = int(cell[1])
-
-            cur_let_indx = letters.index(cur_letter)
-
-            right_let_indx = cur_let_indx + 1
-            left_let_indx = cur_let_indx - 1
-
-            pawn_promotion_pieces = ['Q', 'N', 'B', 'R']
-
-            # для белой пешки
-            if piece[0] == 'w':
-
-                one_step_upper_num = cur_num + 1
-                two_steps_upper_num = cur_num + 2
-
-                if one_step_upper_num < 8:
-
-                    one_step_upper_cell = f'{cur_letter}{one_step_upper_num}'
-                    one_step_upper_piece = self.get_piece_in_cell(one_step_upper_cell)
-
-                    # если клетка сверху (на одну клетку выше) пустая
-                    if one_step_upper_piece == '00':
-                        # то можно сделать один ход (на одну клетку выше)
-                        moves_list_of_piece.append(f'P{cell}{one_step_upper_cell}')
-
-                        # если пешка находится во второй горизонтальной линии (в первоначальном состоянии)
-                        if cur_num == 2:
-
-                            two_steps_upper_cell = f'{cur_letter}{two_steps_upper_num}'
-                            two_steps_upper_piece = self.get_piece_in_cell(two_steps_upper_cell)
-
-                            #  и если клетка на две ступени выше пустая
-                            if two_steps_upper_piece == '00':
-                                # то можно сделать двойной ход (на две клетки выше)
-                                moves_list_of_piece.append(f'P{cell}{two_steps_upper_cell}')
-
-                    # если данная фигура не в самом правом краю доски
-                    if right_let_indx <= 7:
-                        # определим в какой горизонтали (букве)
-                        right_letter = letters[right_let_indx]
-                        upper_right_cell = f'{right_letter}{one_step_upper_num}'
-                        upper_right_piece = self.get_piece_in_cell(upper_right_cell)
-                        # если сверху справа находится фигура оппонента (другого цвета)
-                        if piece[0] != upper_right_piece[0] and upper_right_piece != '00':
-                            # то добавим взятие как возможный ход
-                            moves_list_of_piece.append(f'P{cell}x{upper_right_cell}')
-
-                        # ВЗЯТИЕ НА ПРОХОДЕ В ПРАВУЮ СТОРОНУ
-                        # если данная белая пешка находится в 5-ой горизонтали, сверху-справа пусто
-                        # и справа от него находится черная пешка
-                        if cur_num == 5 and upper_right_piece == '00':
-                            right_cell = f'{right_letter}5'
-                            right_piece = self.get_piece_in_cell(right_cell)
-                            if right_piece == 'bp':
-                                moves_list_of_piece.append(f'P{cell}x{upper_right_cell}EP')
-
-                    # если эта фигура не в самом левом краю доски
-                    if left_let_indx >= 0:
-                        left_letter = letters[left_let_indx]
-                        upper_left_cell = f'{left_letter}{one_step_upper_num}'
-                        # определим фигуру сверху-слева
-                        upper_left_piece = self.get_piece_in_cell(upper_left_cell)
-                        # если слева-сверху фигура оппонента (другого цвета)
-                        if piece[0] != upper_left_piece[0] and upper_left_piece != '00':
-                            # то учтем взятие как ход
-                            moves_list_of_piece.append(f'P{cell}x{upper_left_cell}')
-
-                        # ВЗЯТИЕ НА ПРОХОДЕ В ЛЕВУЮ СТОРОНУ
-                        # если данная белая пешка находится в 5-ой горизонтали, сверху-слева пусто
-                        # и слева от него находится черная пешка
-                        if cur_num == 5 and upper_left_piece == '00':
-                            left_cell = f'{left_letter}5'
-                            left_piece = self.get_piece_in_cell(left_cell)
-                            if left_piece == 'bp':
-                                moves_list_of_piece.append(f'P{cell}x{upper_left_cell}EP')
-
-                # превращение (в ферзя, коня, слона или ладью)
-                elif one_step_upper_num == 8:
-                    one_step_upper_cell = f'{cur_letter}{one_step_upper_num}'
-                    one_step_upper_piece = self.get_piece_in_cell(one_step_upper_cell)
-                    if one_step_upper_piece == '00':
-                        for ppp in pawn_promotion_pieces:
-                            moves_list_of_piece.append(f'P{cell}{one_step_upper_cell}{ppp}')
-
-                    # если данная фигура не в самом правом краю доски
-                    if right_let_indx <= 7:
-                        # определим в какой горизонтали (букве)
-                        right_letter = letters[right_let_indx]
-                        upper_right_cell = f'{right_letter}{one_step_upper_num}'
-                        upper_right_piece = self.get_piece_in_cell(upper_right_cell)
-                        # если сверху справа находится фигура оппонента (другого цвета)
-                        if piece[0] != upper_right_piece[0] and upper_right_piece != '00':
-                            # то добавим взятие как возможный ход с превращением
-                            for ppp in pawn_promotion_pieces:
-                                moves_list_of_piece.append(f'P{cell}x{upper_right_cell}{ppp}')
-
-                    # если эта фигура не в самом левом краю доски
-                    if left_let_indx >= 0:
-                        left_letter = letters[left_let_indx]
-                        upper_left_cell = f'{left_letter}{one_step_upper_num}'
-                        # определим фигуру сверху-слева
-                        upper_left_piece = self.get_piece_in_cell(upper_left_cell)
-                        # если слева-сверху фигура оппонента (другого цвета)
-                        if piece[0] != upper_left_piece[0] and upper_left_piece != '00':
-                            # то учтем взятие как ход с превращением пешки
-                            for ppp in pawn_promotion_pieces:
-                                moves_list_of_piece.append(f'P{cell}x{upper_left_cell}{ppp}')
-
-
-            # для черной пешки
-            elif piece[0] == 'b':
-
-                one_step_lower_num = cur_num - 1
-                two_steps_lower_num = cur_num - 2
-
-                if one_step_lower_num > 1:
-                    one_step_lower_cell = f'{cur_letter}{one_step_lower_num}'
-                    one_step_lower_piece = self.get_piece_in_cell(one_step_lower_cell)
-
-                    if one_step_lower_piece == '00':
-                        moves_list_of_piece.append(f'P{cell}{one_step_lower_cell}')
-
-                        if cur_num == 7:
-
-                            two_steps_lower_cell = f'{cur_letter}{two_steps_lower_num}'
-                            two_steps_lower_piece = self.get_piece_in_cell(two_steps_lower_cell)
-
-                            if two_steps_lower_piece == '00':
-                                moves_list_of_piece.append(f'P{cell}{two_steps_lower_cell}')
-
-                    if right_let_indx <= 7:
-                        right_letter = letters[right_let_indx]
-                        lower_right_cell = f'{right_letter}{one_step_lower_num}'
-                        lower_right_piece = self.get_piece_in_cell(lower_right_cell)
-                        if piece[0] != lower_right_piece[0] and lower_right_piece != '00':
-                            moves_list_of_piece.append(f'P{cell}x{lower_right_cell}')
-
-                        # ВЗЯТИЕ НА ПРОХОДЕ В ПРАВУЮ СТОРОНУ
-                        # если данная черная пешка находится в 4-ой горизонтали, снизу-справа пусто
-                        # и справа от него находится белая пешка
-                        if cur_num == 4 and lower_right_piece == '00':
-                            right_cell = f'{right_letter}4'
-                            right_piece = self.get_piece_in_cell(right_cell)
-                            if right_piece == 'wp':
-                                moves_list_of_piece.append(f'P{cell}x{lower_right_cell}EP')
-
-                    if left_let_indx >= 0:
-                        left_letter = letters[left_let_indx]
-                        lower_left_cell = f'{left_letter}{one_step_lower_num}'
-                        lower_left_piece = self.get_piece_in_cell(lower_left_cell)
-                        if piece[0] != lower_left_piece[0] and lower_left_piece != '00':
-                            moves_list_of_piece.append(f'P{cell}x{lower_left_cell}')
-
-                        # ВЗЯТИЕ НА ПРОХОДЕ В ЛЕВУЮ СТОРОНУ
-                        # если данная черная пешка находится в 4-ой горизонтали, снизу-слева пусто
-                        # и слева от него находится белая пешка
-                        if cur_num == 4 and lower_left_piece == '00':
-                            left_cell = f'{left_letter}4'
-                            left_piece = self.get_piece_in_cell(left_cell)
-                            if left_piece == 'wp':
-                                moves_list_of_piece.append(f'P{cell}x{lower_left_cell}EP')
-
-                # превращение (в ферзя, коня, слона или ладью)
-                elif one_step_lower_num == 1:
-                    one_step_lower_cell = f'{cur_letter}{one_step_lower_num}'
-                    one_step_lower_piece = self.get_piece_in_cell(one_step_lower_cell)
-
-                    if one_step_lower_piece == '00':
-                        for ppp in pawn_promotion_pieces:
-                            moves_list_of_piece.append(f'P{cell}{one_step_lower_cell}{ppp}')
-
-                    if right_let_indx <= 7:
-                        right_letter = letters[right_let_indx]
-                        lower_right_cell = f'{right_letter}{one_step_lower_num}'
-                        lower_right_piece = self.get_piece_in_cell(lower_right_cell)
-
-                        if piece[0] != lower_right_piece[0] and lower_right_piece != '00':
-                            for ppp in pawn_promotion_pieces:
-                                moves_list_of_piece.append(f'P{cell}x{lower_right_cell}{ppp}')
-
-                    if left_let_indx >= 0:
-                        left_letter = letters[left_let_indx]
-                        lower_left_cell = f'{left_letter}{one_step_lower_num}'
-                        lower_left_piece = self.get_piece_in_cell(lower_left_cell)
-                        if piece[0] != lower_left_piece[0] and lower_left_piece != '00':
-                            for ppp in pawn_promotion_pieces:
-                                moves_list_of_piece.append(f'P{cell}x{lower_left_cell}{ppp}')
+        elif letter == 'P':
+            rank = index // 8
+
+            # превращение, если пешка идет на последнюю горизонталь
+            is_promotion = rank == (6 if color == WHITE else 1)
+
+            pushes = PAWN_PUSHES[color][index]
+
+            # если клетка впереди пустая
+            if pushes and board[pushes[0]] == 0:
+                if is_promotion:
+                    for number in range(4):
+                        moves_list_of_piece.append(index | pushes[0] << 6 | PROMOTION | number << 12)
+                else:
+                    moves_list_of_piece.append(index | pushes[0] << 6)
+                    # двойной ход с начальной горизонтали, если и вторая клетка пустая
+                    if len(pushes) == 2 and board[pushes[1]] == 0:
+                        moves_list_of_piece.append(index | pushes[1] << 6)
+
+            # взятия (сначала справа, потом слева)
+            for target in PAWN_CAPTURES[color][index]:
+                target_code = board[target]
+                if target_code != 0:
+                    # если по диагонали фигура оппонента (другого цвета)
+                    if PIECE_COLORS[target_code] != color:
+                        if is_promotion:
+                            for number in range(4):
+                                moves_list_of_piece.append(index | target << 6 | PROMOTION_CAPTURE | number << 12)
+                        else:
+                            moves_list_of_piece.append(index | target << 6 | CAPTURE)
+
+                # ВЗЯТИЕ НА ПРОХОДЕ
+                # если пешка на 5-ой (для черной на 4-ой) горизонтали, по диагонали пусто
+                # и рядом с ней находится пешка оппонента
+                elif rank == EN_PASSANT_RANKS[color] and \
+                        board[target + EN_PASSANT_CAPTURED_SHIFT[color]] == ENEMY_PAWNS[color]:
+                    moves_list_of_piece.append(index | target << 6 | EN_PASSANT)
 
         return moves_list_of_piece
 
+    # передать ход другому игроку (без хода на доске)
+    # взятие на проходе было возможно только для прежнего игрока, поэтому пропадает;
+    # хеш обновляется так же, как в push - по изменению контекста; это не ход, поэтому новое повторение
+    # не засчитывается: вхождение текущей позиции в счетчике повторений переходит на новый хеш
+    # (и pop после передачи хода снимает именно его)
     def change_current_player_color(self):
-        self.context['current_player_color'] = 'black' \
-            if self.context['current_player_color'] == 'white' \
-            else 'white'
+        repetitions = self._repetitions
+        count = repetitions[self.zobrist_key] - 1
+        if count:
+            repetitions[self.zobrist_key] = count
+        else:
+            del repetitions[self.zobrist_key]
+
+        context_zobrist_key = self._context_zobrist_key()
+        self._color = 1 - self._color
+        self._en_passant = -1
+        self.zobrist_key ^= context_zobrist_key ^ self._context_zobrist_key()
+        repetitions[self.zobrist_key] = repetitions.get(self.zobrist_key, 0) + 1
 
     # получить какая фигура будет взята при ходе
     def get_captured_piece(self, move: str) -> str:
@@ -685,7 +565,7 @@ class ChessBoard:
                 captured_cell = f'{new_cell[0]}{original_cell[1]}'
                 return self.get_piece_in_cell(captured_cell)
             else:
-                captured_cell = move.split('x')[1][:3]
+                captured_cell = move.split('x')[1][:2]
                 # if captured_cell == 'wp':
                 #     print(move)
                 return self.get_piece_in_cell(captured_cell)
@@ -693,146 +573,209 @@ class ChessBoard:
             return '00'
 
     # сделать ход (изменить состояние доски и контекст)
-    def make_considered_move(self, move: str):
-        original_cell = move[1:3]
-        piece = self.get_piece_in_cell(original_cell)
-        mover_color = 'white' if piece[0] == 'w' else 'black'
-
-        pawn_promotion_piece = None
-
+    # ход - строка ('Pe2e4') или закодированный ход (см. move_encoding)
+    def make_considered_move(self, move):
         # если нет этого хода
-        if move not in self.get_preliminary_moves_list_of_piece(move[1:3]):
+        if isinstance(move, str):
+            if move not in self.get_preliminary_moves_list_of_piece(move[1:3]):
+                raise AttributeError(f"move {move} is impossible")
+        elif move not in self._get_preliminary_moves(move & 63):
             raise AttributeError(f"move {move} is impossible")
 
-        # если это рокировка
-        elif 'O-O' in move:
-            # короткая рокировка белого короля
-            if move == 'Ke1<O-O>':
-                self.remove_piece_in_cell('e1')
-                self.remove_piece_in_cell('h1')
-                self.put_piece_in_cell('g1', 'wk')
-                self.put_piece_in_cell('f1', 'wr')
-
-            # длинная рокировка белого короля
-            elif move == 'Ke1<O-O-O>':
-                self.remove_piece_in_cell('e1')
-                self.remove_piece_in_cell('a1')
-                self.put_piece_in_cell('c1', 'wk')
-                self.put_piece_in_cell('d1', 'wr')
-
-            # короткая рокировка черного короля
-            elif move == 'Ke8<O-O>':
-                self.remove_piece_in_cell('e8')
-                self.remove_piece_in_cell('h8')
-                self.put_piece_in_cell('g8', 'bk')
-                self.put_piece_in_cell('f8', 'br')
-
-            # длинная рокировка черного короля
-            elif move == 'Ke8<O-O-O>':
-                self.remove_piece_in_cell('e8')
-                self.remove_piece_in_cell('a8')
-                self.put_piece_in_cell('c8', 'bk')
-                self.put_piece_in_cell('d8', 'br')
-
+        self.push(move)
+        self._history.append(self._history_entry())
+
+    # сделать ход без проверки, запомнив только то, что изменилось (для отмены через pop)
+    # ход - строка ('Pe2e4') или закодированный ход (см. move_encoding)
+    def push(self, move):
+        encoded_move = move if isinstance(move, int) else MOVES_BY_BODY[move[1:]]
+        board = self.board
+
+        # запись для отмены хода: измененные клетки (индекс, старый код фигуры),
+        # права на рокировку, клетка взятия на проходе, чей ход, счетчик полуходов, длина истории,
+        # хеш позиции и счетчик повторений
+        changed_cells = []
+        self._undo_stack.append((
+            move,
+            changed_cells,
+            self._castling,
+            self._en_passant,
+            self._color,
+            self.halfmove_clock,
+            len(self._history),
+            self.zobrist_key,
+            self._repetitions
+        ))
+        context_zobrist_key = self._context_zobrist_key()
+
+        original_index = encoded_move & 63
+        target_index = (encoded_move >> 6) & 63
+        flag = encoded_move & FLAGS_MASK
+
+        mover_code = board[original_index]
+        mover_color_index = PIECE_COLORS[mover_code]
+        changed_cells.append((original_index, mover_code))
+        changed_cells.append((target_index, board[target_index]))
+
+        # если это рокировка: ладья тоже ходит
+        if flag == CASTLING:
+            rook_index, rook_target = CASTLING_MOVES[encoded_move]
+            changed_cells.append((rook_index, board[rook_index]))
+            changed_cells.append((rook_target, board[rook_target]))
+            board[rook_target] = board[rook_index]
+            board[rook_index] = 0
+
+        # взятие на проходе: убираем пешку оппонента рядом с начальной клеткой
+        elif flag == EN_PASSANT:
+            captured_index = target_index + EN_PASSANT_CAPTURED_SHIFT[mover_color_index]
+            changed_cells.append((captured_index, board[captured_index]))
+            board[captured_index] = 0
+
+        board[original_index] = 0
+
+        # превращение пешки
+        if flag >= PROMOTION:
+            board[target_index] = PROMOTION_CODES[mover_color_index][(flag >> 12) & 3]
         else:
+            board[target_index] = mover_code
 
-            # определим начальную и конечную клетку хода
-            if 'x' in move[1:]:
+        is_pawn_move = PIECE_LETTERS[mover_code] == 'P'
 
-                if move[-2:] == 'EP':
-                    cells = move[1:-2].split('x')
-                    original_cell, target_cell = cells[0], cells[1]
-                    en_passant_captured_cell = f'{target_cell[0]}{original_cell[1]}'
-                    self.remove_piece_in_cell(en_passant_captured_cell)
+        # ход из клетки (или в клетку) короля или ладьи лишает соответствующих прав на рокировку
+        self._castling &= ~(CASTLING_RIGHTS_LOST[original_index] | CASTLING_RIGHTS_LOST[target_index])
 
-                elif move[0] == 'P' and move[-1] in ['Q', 'N', 'B', 'R']:
-                    pawn_promotion_piece = move[-1]
-                    cells = move[1:-1].split('x')
-                    original_cell, target_cell = cells[0], cells[1]
-                else:
-                    cells = move[1:].split('x')
-                    original_cell, target_cell = cells[0], cells[1]
+        self._color = 1 - self._color
 
-            else:
-                if move[0] == 'P' and move[-1] in ['Q', 'N', 'B', 'R']:
-                    pawn_promotion_piece = move[-1]
-                    original_cell, target_cell = move[1:3], move[3:5]
-                else:
-                    original_cell = move[1:3]
-                    target_cell = move[3:]
-
-            # определим фигуру (какая фигура выполняет ход: ладья, конь, пешка ит.д.)
-            moved_piece = self.get_piece_in_cell(original_cell)
+        # после двойного хода пешки соседние пешки оппонента получают шанс взятия на проходе
+        if is_pawn_move and abs(target_index - original_index) == 16:
+            self._set_en_passant((original_index + target_index) // 2)
+        else:
+            self._en_passant = -1
 
-            # Первый этап: убираем из доски фигуру который ходит из клетки где она находится
-            self.remove_piece_in_cell(original_cell)
+        if mover_color_index == BLACK:
+            self.fullmove_number += 1
 
-            # Второй этап: ставим фигуру в нужную клетку доски
-            if pawn_promotion_piece is None:
-                self.put_piece_in_cell(target_cell, moved_piece)
-            else:
-                self.put_piece_in_cell(target_cell, f'{moved_piece[0]}{pawn_promotion_piece.lower()}')
-
-            if move[0] == 'P':
-                letters = 'abcdefgh'
-                if original_cell[1] == '2' and target_cell[1] == '4' and original_cell[0] == target_cell[0] and mover_color == 'white':
-                    right_let_indx = letters.index(target_cell[0]) + 1
-                    left_let_indx = letters.index(target_cell[0]) - 1
-                    if right_let_indx <= 7:
-                        right_letter = letters[right_let_indx]
-                        right_cell = f'{right_letter}4'
-                        if self.get_piece_in_cell(right_cell) == 'bp':
-                            self.context[f'en_passant_chance_for_black'].append(f'P{right_cell}x{target_cell[0]}3EP')
-                    if left_let_indx >=0:
-                        left_letter = letters[left_let_indx]
-                        left_cell = f'{left_letter}4'
-                        if self.get_piece_in_cell(left_cell) == 'bp':
-                            self.context[f'en_passant_chance_for_black'].append(f'P{left_cell}x{target_cell[0]}3EP')
-
-                elif original_cell[1] == '7' and target_cell[1] == '5' and original_cell[0] == target_cell[0] and mover_color == 'black':
-                    right_let_indx = letters.index(target_cell[0]) + 1
-                    left_let_indx = letters.index(target_cell[0]) - 1
-                    if right_let_indx <= 7:
-                        right_letter = letters[right_let_indx]
-                        right_cell = f'{right_letter}5'
-                        if self.get_piece_in_cell(right_cell) == 'wp':
-                            self.context[f'en_passant_chance_for_white'].append(f'P{right_cell}x{target_cell[0]}6EP')
-                    if left_let_indx >= 0:
-                        left_letter = letters[left_let_indx]
-                        left_cell = f'{left_letter}5'
-                        if self.get_piece_in_cell(left_cell) == 'wp':
-                            self.context[f'en_passant_chance_for_white'].append(f'P{left_cell}x{target_cell[0]}6EP')
-
-            elif move[0] == 'R':
-                original_cell = move[1:3]
-                if original_cell == 'a1':
-                    self.context['whites_chance_for_queenside_castling'] = False
-                elif original_cell == 'h1':
-                    self.context['whites_chance_for_kingside_castling'] = False
-                elif original_cell == 'a8':
-                    self.context['blacks_chance_for_queenside_castling'] = False
-                elif original_cell == 'h8':
-                    self.context['blacks_chance_for_kingside_castling'] = False
-
-            elif move[0] == 'K':
-                original_cell = move[1:3]
-                if original_cell == 'e1':
-                    self.context['whites_chance_for_queenside_castling'] = False
-                    self.context['whites_chance_for_kingside_castling'] = False
-                elif original_cell == 'e8':
-                    self.context['blacks_chance_for_queenside_castling'] = False
-                    self.context['blacks_chance_for_kingside_castling'] = False
-
-        self.context[f'en_passant_chance_for_{mover_color}'] = []
-
-        self.change_current_player_color()
-
-        if move[0] == 'P' or 'x' in move:
+        if is_pawn_move or flag == CAPTURE or flag >= PROMOTION_CAPTURE:
             self.halfmove_clock = 0
         else:
             self.halfmove_clock += 1
 
-        self.stats_list.append([self.board_stat, self.context])
+        # обновляем хеш: только измененные клетки и изменения контекста
+        zobrist_key = self.zobrist_key ^ context_zobrist_key ^ self._context_zobrist_key()
+        for index, code in changed_cells:
+            zobrist_key ^= PIECE_KEYS[code][index] ^ PIECE_KEYS[board[index]][index]
+        self.zobrist_key = zobrist_key
+
+        # после необратимого хода прежние позиции больше не повторятся - начинаем новый счетчик
+        if self.halfmove_clock == 0:
+            self._repetitions = {}
+        self._repetitions[zobrist_key] = self._repetitions.get(zobrist_key, 0) + 1
+
+    # отменить последний сделанный ход (через push или make_considered_move), вернуть этот ход
+    def pop(self):
+        move, changed_cells, castling_rights, en_passant_index, color, halfmove_clock, history_len, \
+            zobrist_key, repetitions = self._undo_stack.pop()
+
+        if self._repetitions is repetitions:
+            count = repetitions[self.zobrist_key] - 1
+            if count:
+                repetitions[self.zobrist_key] = count
+            else:
+                del repetitions[self.zobrist_key]
+        else:
+            self._repetitions = repetitions
+        self.zobrist_key = zobrist_key
+
+        board = self.board
+        # восстанавливаем клетки в обратном порядке
+        for index, code in reversed(changed_cells):
+            board[index] = code
+
+        self._castling = castling_rights
+        self._en_passant = en_passant_index
+        self._color = color
+
+        if color == BLACK:
+            self.fullmove_number -= 1
+
+        self.halfmove_clock = halfmove_clock
+        del self._history[history_len:]
+
+        return move
+
+    # вычислить хеш Зобриста позиции заново (по всей доске и контексту)
+    def compute_zobrist_key(self) -> int:
+        zobrist_key = self._context_zobrist_key()
+        for index, code in enumerate(self.board):
+            if code != 0:
+                zobrist_key ^= PIECE_KEYS[code][index]
+        return zobrist_key
+
+    # часть хеша Зобриста от контекста: чей ход, права на рокировку и вертикаль взятия на проходе
+    def _context_zobrist_key(self) -> int:
+        zobrist_key = CASTLING_ZOBRIST_KEYS[self._castling]
+        if self._color == BLACK:
+            zobrist_key ^= BLACK_TO_MOVE_KEY
+        if self._en_passant != -1:
+            zobrist_key ^= EN_PASSANT_FILE_KEYS[self._en_passant % 8]
+        return zobrist_key
+
+    # сколько раз текущая позиция встречалась в партии (включая текущую)
+    def get_repetition_count(self) -> int:
+        return self._repetitions.get(self.zobrist_key, 0)
+
+    # троекратное повторение позиции (любой игрок имеет право потребовать ничью)
+    def is_threefold_repetition(self) -> bool:
+        return self._repetitions.get(self.zobrist_key, 0) >= 3
+
+    # пятикратное повторение позиции (автоничья)
+    def is_fivefold_repetition(self) -> bool:
+        return self._repetitions.get(self.zobrist_key, 0) >= 5
+
+    # находится ли клетка под боем фигур заданного цвета
+    def is_square_attacked(self, cell: str, by_color: str) -> bool:
+
+        if by_color not in ['white', 'black']:
+            raise AttributeError("the parameter 'by_color' must be 'white' or 'black'")
+
+        return self._is_attacked(CELL_INDEX[cell], WHITE if by_color == 'white' else BLACK)
+
+    # то же самое по индексу клетки и цвету (WHITE / BLACK):
+    # смотрим из клетки наружу - ходами коня, пешки, короля и по лучам дальнобойных фигур
+    def _is_attacked(self, index: int, by: int) -> bool:
+        board = self.board
+        pawn, knight, bishop, rook, queen, king = ATTACKER_CODES[by]
+
+        for target in KNIGHT_TARGETS[index]:
+            if board[target] == knight:
+                return True
+
+        # пешку, которая бьет клетку, найдем там, куда била бы пешка другого цвета из этой клетки
+        for target in PAWN_CAPTURES[1 - by][index]:
+            if board[target] == pawn:
+                return True
+
+        for target in KING_TARGETS[index]:
+            if board[target] == king:
+                return True
+
+        for ray in ROOK_RAYS[index]:
+            for target in ray:
+                code = board[target]
+                if code != 0:
+                    if code == rook or code == queen:
+                        return True
+                    break
+
+        for ray in BISHOP_RAYS[index]:
+            for target in ray:
+                code = board[target]
+                if code != 0:
+                    if code == bishop or code == queen:
+                        return True
+                    break
+
+        return False
 
     # шах ли
     def is_check(self, to_color: str) -> bool:
@@ -840,29 +783,14 @@ class ChessBoard:
         if to_color not in ['white', 'black']:
             raise AttributeError("the parameter 'to_color' must be 'white' or 'black'")
 
-        board_stat_dict = self.get_board_stat_dict()
-
-        # белому
-        if to_color == 'white':
-            for cell, piece in board_stat_dict.items():
-                if piece[0] == 'b':
-                    preliminary_moves_list_of_piece = self.get_preliminary_moves_list_of_piece(cell)
-                    for move in preliminary_moves_list_of_piece:
-                        if self.get_captured_piece(move) == 'wk':
-                            return True
-
-        # черному
-        elif to_color == 'black':
-            for cell, piece in board_stat_dict.items():
-                if piece[0] == 'w':
-                    preliminary_moves_list_of_piece = self.get_preliminary_moves_list_of_piece(cell)
-                    for move in preliminary_moves_list_of_piece:
-                        if self.get_captured_piece(move) == 'bk':
-                            return True
+        color = WHITE if to_color == 'white' else BLACK
+        king_index = self.board.find(KING_CODES[color])
 
-        return False
+        # если короля нет на доске
+        if king_index == -1:
+            return False
 
-        # blacks_preliminary_moves_list = get_preliminary_moves_list_of_piece()
+        return self._is_attacked(king_index, 1 - color)
 
     # Получить список всех разрешенных ходов
     def get_legal_moves_list(self, color: str) -> list:
@@ -870,120 +798,303 @@ class ChessBoard:
         if color not in ['white', 'black']:
             raise AttributeError("the parameter 'color' must be 'white' or 'black'")
 
-        moves_list = []
-
-        for letter in 'abcdefgh':
-
-            for num in range(1, 9):
+        board = self.board
+        return [PIECE_LETTERS[board[move & 63]] + MOVE_BODIES[move]
+                for move in self._get_legal_moves_and_check(color)[0]]
 
-                cell = f'{letter}{num}'
-                piece = self.get_piece_in_cell(cell)
+    # Получить список всех разрешенных ходов в виде закодированных ходов (см. move_encoding)
+    def get_encoded_legal_moves(self, color: str) -> list:
 
-                if piece[0][0] == color[0]:
-
-
-                    preliminary_moves_list_of_piece = self.get_preliminary_moves_list_of_piece(cell)
-
-                    original_board = copy.deepcopy(self.board_stat)
-                    original_context = copy.deepcopy(self.context)
-                    original_halfmove_clock = copy.deepcopy(self.halfmove_clock)
-                    original_statslist = copy.deepcopy(self.stats_list)
-
-                    for move in preliminary_moves_list_of_piece:
-
-                        self.board_stat = copy.deepcopy(original_board)
-                        self.context = copy.deepcopy(original_context)
-                        self.halfmove_clock = copy.deepcopy(original_halfmove_clock)
-                        self.stats_list = copy.deepcopy(original_statslist)
-
-                        # исключаем короткие рокировки, которых нельзя совершать
-                        if "<O-O>" in move:
+        if color not in ['white', 'black']:
+            raise AttributeError("the parameter 'color' must be 'white' or 'black'")
 
-                            if not self.context[f'{color}s_chance_for_kingside_castling']:
-                                continue
+        return self._get_legal_moves_and_check(color)[0]
+
+    # перевести закодированный ход в запись ChessBoard ('Pe2e4', 'Ke1<O-O>', ...) в текущей позиции
+    def decode_move(self, move: int) -> str:
+        return PIECE_LETTERS[self.board[move & 63]] + MOVE_BODIES[move]
+
+    # получить закодированный ход в текущей позиции по индексу хода в moves.json
+    # (флаг взятия или взятия на проходе определяется по доске)
+    def policy_index_to_move(self, index: int) -> int:
+        move = POLICY_MOVES[index]
+        if move & FLAGS_MASK == 0:
+            board = self.board
+            target_index = (move >> 6) & 63
+            if board[target_index] != 0:
+                move |= CAPTURE
+            elif PIECE_LETTERS[board[move & 63]] == 'P' and (target_index - (move & 63)) % 8 != 0:
+                move |= EN_PASSANT
+        return move
+
+    # получить разрешенные ходы и есть ли шах (через кэш разрешенных ходов, если он подключен)
+    def _get_legal_moves_and_check(self, color: str) -> tuple:
+        cache = self.legal_moves_cache
+        if cache is None:
+            return self._generate_legal_moves(color)
+
+        key = (self.zobrist_key, color)
+        entry = cache.get(key)
+        if entry is not None:
+            return list(entry[0]), entry[1]
+
+        moves_list, is_check = self._generate_legal_moves(color)
+        cache.put(key, moves_list, is_check)
+        return moves_list, is_check
+
+    # сгенерировать разрешенные ходы и определить, есть ли шах
+    def _generate_legal_moves(self, color: str) -> tuple:
+        board = self.board
+        color_index = WHITE if color == 'white' else BLACK
+        opponent_index = 1 - color_index
+        king_index = board.find(KING_CODES[color_index])
+
+        # без короля на доске шахов не бывает - проверим ходы по-старому
+        if king_index == -1:
+            return self._filter_legal_moves(color), False
+
+        # Один раз для позиции находим шахующие фигуры и связанные фигуры
+        # checkers - количество шахующих фигур
+        # evasion_cells - клетки, куда можно пойти для защиты от шаха (закрыться или взять шахующую фигуру)
+        # pinned - связанные фигуры: клетка фигуры -> клетки луча связки (фигура может ходить только по нему)
+        checkers = 0
+        evasion_cells = None
+        pinned = {}
+
+        pawn, knight, bishop, rook, queen, king = ATTACKER_CODES[opponent_index]
+
+        for target in KNIGHT_TARGETS[king_index]:
+            if board[target] == knight:
+                checkers += 1
+                evasion_cells = {target}
+
+        for target in PAWN_CAPTURES[color_index][king_index]:
+            if board[target] == pawn:
+                checkers += 1
+                evasion_cells = {target}
+
+        for rays, sliders in ((ROOK_RAYS[king_index], (rook, queen)), (BISHOP_RAYS[king_index], (bishop, queen))):
+            for ray in rays:
+                own_piece_index = -1
+                for ray_position, target in enumerate(ray):
+                    code = board[target]
+                    if code == 0:
+                        continue
+                    if PIECE_COLORS[code] == color_index:
+                        # вторая своя фигура на луче - связки нет
+                        if own_piece_index != -1:
+                            break
+                        own_piece_index = target
+                        continue
+                    if code in sliders:
+                        line = set(ray[:ray_position + 1])
+                        if own_piece_index == -1:
+                            checkers += 1
+                            evasion_cells = line
+                        else:
+                            pinned[own_piece_index] = line
+                    break
 
-                            elif self.is_check(color):
-                                continue
+        moves_list = []
+        en_passant_chances = self._get_en_passant_moves(color_index)
+
+        for cell in BOARD_DICT_ORDER:
+
+            index = CELL_INDEX[cell]
+            code = board[index]
+
+            if code == 0 or PIECE_COLORS[code] != color_index:
+                continue
+
+            # Король: не может идти на битые клетки (проверяем, убрав короля с доски,
+            # чтобы он не закрывал собой луч шахующей фигуры)
+            if index == king_index:
+                king_moves = self._get_preliminary_moves(index)
+                board[king_index] = 0
+                for move in king_moves:
+                    if move & FLAGS_MASK == CASTLING:
+                        # король не может рокироваться из-под шаха и через битое поле
+                        if checkers == 0 and self._castling & CASTLING_RIGHT_OF_MOVE[move] and not any(
+                                self._is_attacked(target, opponent_index) for target in CASTLING_PATHS[move]):
+                            moves_list.append(move)
+                    elif not self._is_attacked((move >> 6) & 63, opponent_index):
+                        moves_list.append(move)
+                board[king_index] = code
+                continue
+
+            # при двойном шахе ходит только король
+            if checkers > 1:
+                continue
+
+            # клетки, куда может пойти фигура (None - любые)
+            allowed_cells = pinned.get(index)
+            if checkers == 1:
+                allowed_cells = evasion_cells if allowed_cells is None else allowed_cells & evasion_cells
+
+            for move in self._get_preliminary_moves(index):
+
+                # взятие на проходе: убирает с горизонтали сразу две пешки, поэтому проверяем его отдельно,
+                # сделав ход
+                if move & FLAGS_MASK == EN_PASSANT:
+                    if move in en_passant_chances:
+                        self.push(move)
+                        if not self._is_attacked(king_index, opponent_index):
+                            moves_list.append(move)
+                        self.pop()
 
-                            else:
-                                num = move[2]
+                elif allowed_cells is None or (move >> 6) & 63 in allowed_cells:
+                    moves_list.append(move)
 
-                                self.remove_piece_in_cell(f'e{num}')
-                                self.put_piece_in_cell(f'f{num}', f'{color[0]}k')
+        return moves_list, checkers > 0
 
-                                if self.is_check(color):
-                                    continue
+    # Получить список всех разрешенных ходов перебором: каждый предварительный ход делается и
+    # проверяется на шах самому себе (медленнее, используется для сверки с get_legal_moves_list)
+    def get_legal_moves_list_by_filtering(self, color: str) -> list:
 
-                                self.remove_piece_in_cell(f'f{num}')
-                                self.put_piece_in_cell(f'g{num}', f'{color[0]}k')
+        if color not in ['white', 'black']:
+            raise AttributeError("the parameter 'color' must be 'white' or 'black'")
 
-                                if self.is_check(color):
-                                    continue
+        board = self.board
+        return [PIECE_LETTERS[board[move & 63]] + MOVE_BODIES[move] for move in self._filter_legal_moves(color)]
 
-                        # исключаем длинные рокировки, которых нельзя совершать
-                        elif "<O-O-O>" in move:
+    # то же самое в виде закодированных ходов
+    def _filter_legal_moves(self, color: str) -> list:
+        moves_list = []
+        board = self.board
+        color_index = WHITE if color == 'white' else BLACK
+        en_passant_chances = self._get_en_passant_moves(color_index)
 
-                            if not self.context[f'{color}s_chance_for_queenside_castling']:
-                                continue
+        for cell in BOARD_DICT_ORDER:
 
-                            elif self.is_check(color):
-                                continue
+            index = CELL_INDEX[cell]
+            code = board[index]
 
-                            else:
-                                num = move[2]
+            if code == 0 or PIECE_COLORS[code] != color_index:
+                continue
 
-                                self.remove_piece_in_cell(f'e{num}')
-                                self.put_piece_in_cell(f'c{num}', f'{color[0]}k')
+            for move in self._get_preliminary_moves(index):
 
-                                if self.is_check(color):
-                                    continue
+                flag = move & FLAGS_MASK
 
-                                self.remove_piece_in_cell(f'c{num}')
-                                self.put_piece_in_cell(f'd{num}', f'{color[0]}k')
+                # исключаем рокировки, которых нельзя совершать
+                if flag == CASTLING:
 
-                                if self.is_check(color):
-                                    continue
+                    if not self._castling & CASTLING_RIGHT_OF_MOVE[move]:
+                        continue
 
-                        self.board_stat = copy.deepcopy(original_board)
-                        self.context = copy.deepcopy(original_context)
-                        self.halfmove_clock = copy.deepcopy(original_halfmove_clock)
-                        self.stats_list = copy.deepcopy(original_statslist)
+                    # король не может рокироваться из-под шаха и через битое поле
+                    elif self.is_check(color) or any(
+                            self._is_attacked(target, 1 - color_index) for target in CASTLING_PATHS[move]):
+                        continue
 
-                        # рассматриваеый ход
-                        self.make_considered_move(move)
+                # исключаем взятие на проходе, который не рарешен
+                elif flag == EN_PASSANT and move not in en_passant_chances:
+                    continue
 
-                        # исключаем все ходы, после которых самому же игроку (который сделал ход) будет шах (игрок сам себе не должен сделать шах)
-                        if self.is_check(color):
-                            continue
+                # рассматриваеый ход
+                self.push(move)
 
-                        # исключаем взятие на проходе, который не рарешен
-                        elif move[-2:] == 'EP' and move not in original_context[f'en_passant_chance_for_{color}']:
-                            continue
+                # исключаем все ходы, после которых самому же игроку (который сделал ход) будет шах
+                # (игрок сам себе не должен сделать шах)
+                is_check = self.is_check(color)
 
-                        # после всех вышеуказанных фильтров, ход считается разрешенным
-                        else:
-                            moves_list.append(move)
+                self.pop()
 
-                    self.board_stat = copy.deepcopy(original_board)
-                    self.context = copy.deepcopy(original_context)
-                    self.halfmove_clock = copy.deepcopy(original_halfmove_clock)
-                    self.stats_list = copy.deepcopy(original_statslist)
+                # после всех вышеуказанных фильтров, ход считается разрешенным
+                if not is_check:
+                    moves_list.append(move)
 
         return moves_list
 
+    # Состояние партии для игрока, чья очередь хода - за одну генерацию разрешенных ходов:
+    #   'status': 'ongoing' - партия продолжается, 'checkmate' - мат, 'stalemate' - пат,
+    #             'seventy_five_moves' - ничья по правилу 75 ходов, 'fivefold_repetition' - пятикратное повторение,
+    #             'insufficient_material' - недостаточно материала для мата
+    #   'winner': 'white' / 'black' при мате, иначе None
+    #   'result': результат партии '1-0', '0-1' или '1/2-1/2', пока партия продолжается - None
+    #   'is_check', 'legal_moves' (в записи ChessBoard) и 'encoded_legal_moves' (см. move_encoding)
+    # Результат запоминается до следующего хода (не копируйте и не изменяйте его списки)
+    def game_status(self) -> dict:
+        color = COLORS[self._color]
+        key = (self.zobrist_key, color, self.halfmove_clock, self._repetitions.get(self.zobrist_key, 0))
+        if self._game_status is not None and self._game_status[0] == key:
+            return self._game_status[1]
+
+        encoded_legal_moves, is_check = self._get_legal_moves_and_check(color)
+        winner = None
+
+        # мат и пат важнее ничьих по правилам (например, мат последним ходом перед правилом 75 ходов)
+        if not encoded_legal_moves:
+            if is_check:
+                status = 'checkmate'
+                winner = 'black' if color == 'white' else 'white'
+            else:
+                status = 'stalemate'
+        elif self.is_insufficient_material():
+            status = 'insufficient_material'
+        elif self.halfmove_clock >= SEVENTY_FIVE_MOVE_RULE_PLIES:
+            status = 'seventy_five_moves'
+        elif self.is_fivefold_repetition():
+            status = 'fivefold_repetition'
+        else:
+            status = 'ongoing'
+
+        board = self.board
+        game_status = {
+            'status': status,
+            'winner': winner,
+            'result': GAME_RESULTS[winner] if status != 'ongoing' else None,
+            'is_check': is_check,
+            'legal_moves': [PIECE_LETTERS[board[move & 63]] + MOVE_BODIES[move] for move in encoded_legal_moves],
+            'encoded_legal_moves': encoded_legal_moves
+        }
+        self._game_status = (key, game_status)
+        return game_status
+
+    # недостаточно материала для мата: только короли, король с одной легкой фигурой против короля
+    # или только слоны (любого количества) на полях одного цвета
+    def is_insufficient_material(self) -> bool:
+        minor_pieces = []
+        for index, code in enumerate(self.board):
+            if code == 0 or code in KING_CODES:
+                continue
+            if code not in MINOR_PIECE_CODES:
+                return False
+            minor_pieces.append((index, code))
+
+        if len(minor_pieces) <= 1:
+            return True
+
+        # цвет поля слона: (вертикаль + горизонталь) % 2
+        return all(code in BISHOP_CODES for _, code in minor_pieces) and \
+            len({(index % 8 + index // 8) % 2 for index, _ in minor_pieces}) == 1
+
     # мат ли
     def is_mate(self, to_color: str) -> bool:
-        legal_moves_list = self.get_legal_moves_list(to_color)
-        return len(legal_moves_list) == 0 and self.is_check(to_color)
+        if to_color not in ['white', 'black']:
+            raise AttributeError("the parameter 'to_color' must be 'white' or 'black'")
+
+        if to_color == COLORS[self._color]:
+            return self.game_status()['status'] == 'checkmate'
+
+        legal_moves_list, is_check = self._get_legal_moves_and_check(to_color)
+        return len(legal_moves_list) == 0 and is_check
 
     # пат ли
     def is_stalemate(self, to_color: str) -> bool:
-        legal_moves_list = self.get_legal_moves_list(to_color)
-        return len(legal_moves_list) == 0 and not self.is_check(to_color)
+        if to_color not in ['white', 'black']:
+            raise AttributeError("the parameter 'to_color' must be 'white' or 'black'")
+
+        if to_color == COLORS[self._color]:
+            return self.game_status()['status'] == 'stalemate'
+
+        legal_moves_list, is_check = self._get_legal_moves_and_check(to_color)
+        return len(legal_moves_list) == 0 and not is_check
 
     # Сделать ход
+    # ход - строка ('Pe2e4') или закодированный ход (см. move_encoding)
     def make_move(self, move):
-        original_cell = move[1:3]
+        original_cell = move[1:3] if isinstance(move, str) else CELLS[move & 63]
         piece = self.get_piece_in_cell(original_cell)
 
         if piece == '00':
@@ -992,16 +1103,79 @@ class ChessBoard:
         else:
             color = 'white' if piece[0] == 'w' else 'black'
 
-            if color != self.context['current_player_color']:
-                raise AssertionError(f'error on move \'{move}\': {self.context['current_player_color']} must move now!')
+            if color != self.current_player_color:
+                raise AssertionError(f'error on move \'{move}\': {self.current_player_color} must move now!')
 
-            legal_moves = self.get_legal_moves_list(color)
-
-            if move not in legal_moves:
+            # проверяем только этот ход (без генерации всех разрешенных ходов)
+            if not self.is_legal_move(move):
                 raise AssertionError(f'{move} is not valid move')
 
             else:
-                self.make_considered_move(move)
+                self.apply_unchecked(move)
+
+    # разрешен ли ход игроку, чья очередь хода
+    # (проверяются только ходы этой фигуры и, сделав ход, нет ли шаха своему королю)
+    def is_legal_move(self, move) -> bool:
+        board = self.board
+
+        if isinstance(move, str):
+            encoded_move = MOVES_BY_BODY.get(move[1:])
+            if encoded_move is None or PIECE_LETTERS[board[encoded_move & 63]] != move[0]:
+                return False
+        else:
+            encoded_move = move
+
+        code = board[encoded_move & 63]
+        color_index = self._color
+        color = COLORS[color_index]
 
+        if code == 0 or PIECE_COLORS[code] != color_index:
+            return False
 
+        if encoded_move not in self._get_preliminary_moves(encoded_move & 63):
+            return False
 
+        flag = encoded_move & FLAGS_MASK
+
+        # рокировка: есть право, нет шаха и король не проходит через битое поле
+        if flag == CASTLING:
+            if not self._castling & CASTLING_RIGHT_OF_MOVE[encoded_move] or self.is_check(color) or any(
+                    self._is_attacked(target, 1 - color_index) for target in CASTLING_PATHS[encoded_move]):
+                return False
+
+        # взятие на проходе разрешено только сразу после двойного хода пешки оппонента
+        elif flag == EN_PASSANT and encoded_move not in self._get_en_passant_moves(color_index):
+            return False
+
+        # после хода своему королю не должно быть шаха
+        self.push(encoded_move)
+        is_check = self.is_check(color)
+        self.pop()
+
+        return not is_check
+
+    # сделать ход без какой-либо проверки (для заведомо правильных ходов, например из архива партий):
+    # обновляются только права на рокировку, взятия на проходе, счетчик полуходов и история
+    def apply_unchecked(self, move):
+        self.push(move)
+        self._history.append(self._history_entry())
+
+    # сыграть последовательность ходов
+    # validate=False - ходы считаются заведомо правильными и не проверяются (см. apply_unchecked)
+    def replay(self, moves, validate: bool = False):
+        if validate:
+            for move in moves:
+                self.make_move(move)
+        else:
+            for move in moves:
+                self.apply_unchecked(move)
+
+
+# прочитать позиции из файла с FEN-строками (по одной в строке), по одной доске за раз
+# пустые строки пропускаются, после ';' может идти комментарий (например, эталонные данные в EPD)
+def read_fen_file(path: str):
+    with open(path, encoding='utf-8') as fen_file:
+        for line in fen_file:
+            fen = line.split(';', 1)[0].strip()
+            if fen:
+                yield ChessBoard.from_fen(fen)
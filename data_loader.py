@@ -0,0 +1,180 @@
+import queue
+import threading
+import time
+
+import numpy as np
+
+from position_store import PositionStore, RECORD_DTYPE, records_to_batch
+
+# Загрузчик батчей для обучения из шардов позиций (см. position_store):
+#     loader = BatchLoader('data/positions', batch_size=1024)
+#     for boards, colors, policies, values in loader:
+#         ...
+#     print(loader.metrics())
+#
+# Записи читаются блоками подряд (блоки в случайном порядке), перемешиваются в буфере
+# ограниченного размера и кодируются в батчи в отдельном потоке, который готовит следующие
+# батчи заранее, пока обучение занято текущим.
+
+# признак окончания данных в очереди батчей
+_END = object()
+
+
+class BatchLoader:
+
+    # store - PositionStore или папка с шардами
+    # shuffle_buffer - сколько записей перемешивается одновременно (0 - без перемешивания)
+    # block_size - сколько записей подряд читается из шарда за раз
+    # prefetch - сколько готовых батчей может ждать в очереди
+    # epochs - сколько раз пройти по данным (None - бесконечно)
+    def __init__(self, store, batch_size: int = 1024, shuffle_buffer: int = 100000, block_size: int = 4096,
+                 prefetch: int = 4, epochs: int = 1, drop_last: bool = False, dtype=np.float32, seed: int = None):
+        if batch_size <= 0:
+            raise AttributeError("the parameter 'batch_size' must be positive")
+        if prefetch <= 0:
+            raise AttributeError("the parameter 'prefetch' must be positive")
+
+        self.store = store if isinstance(store, PositionStore) else PositionStore(store)
+        self.batch_size = batch_size
+        self.shuffle_buffer = shuffle_buffer
+        self.block_size = block_size
+        self.prefetch = prefetch
+        self.epochs = epochs
+        self.drop_last = drop_last
+        self.dtype = dtype
+        self.seed = seed
+
+        self._reset_metrics()
+
+    def _reset_metrics(self):
+        self.batches = 0
+        self.positions = 0
+        self.start_time = None
+        # время, которое обучение ждало следующий батч (очередь была пустой)
+        self.wait_seconds = 0.0
+        # глубина очереди в момент получения каждого батча (для средней)
+        self._queue_depth_sum = 0
+        self._queue = None
+
+    # записи в порядке чтения: блоки подряд идущих записей в случайном порядке
+    def _read_records(self, random: np.random.Generator):
+        store_size = len(self.store)
+        # в пустом хранилище нечего читать (иначе при epochs=None цикл эпох никогда не закончится)
+        if store_size == 0:
+            return
+        epoch = 0
+        while self.epochs is None or epoch < self.epochs:
+            block_starts = np.arange(0, store_size, self.block_size)
+            if self.shuffle_buffer:
+                random.shuffle(block_starts)
+            for start in block_starts:
+                yield self.store[start:min(start + self.block_size, store_size)]
+            epoch += 1
+
+    # записи батчами по batch_size, перемешанные в буфере из shuffle_buffer записей
+    def _shuffled_batches(self, random: np.random.Generator):
+        batch_size = self.batch_size
+        pending = np.empty(0, dtype=RECORD_DTYPE)
+
+        if not self.shuffle_buffer:
+            for records in self._read_records(random):
+                pending = np.concatenate([pending, records])
+                while len(pending) >= batch_size:
+                    yield pending[:batch_size]
+                    pending = pending[batch_size:]
+        else:
+            buffer = np.empty(max(self.shuffle_buffer, batch_size), dtype=RECORD_DTYPE)
+            buffered = 0
+            for records in self._read_records(random):
+                pending = np.concatenate([pending, records])
+
+                # сначала заполняем буфер
+                if buffered < len(buffer):
+                    count = min(len(buffer) - buffered, len(pending))
+                    buffer[buffered:buffered + count] = pending[:count]
+                    buffered += count
+                    pending = pending[count:]
+
+                # затем каждый батч - случайные записи буфера, на их место встают новые записи
+                while buffered == len(buffer) and len(pending) >= batch_size:
+                    slots = random.choice(len(buffer), batch_size, replace=False)
+                    batch = buffer[slots]
+                    buffer[slots] = pending[:batch_size]
+                    pending = pending[batch_size:]
+                    yield batch
+
+            # данные закончились: отдаем оставшиеся записи буфера в случайном порядке
+            pending = np.concatenate([buffer[:buffered], pending])
+            pending = pending[random.permutation(len(pending))]
+            while len(pending) >= batch_size:
+                yield pending[:batch_size]
+                pending = pending[batch_size:]
+
+        if len(pending) and not self.drop_last:
+            yield pending
+
+    # поток подготовки батчей: читает, перемешивает и кодирует, пока в очереди есть место
+    # (ошибка передается в очередь и поднимается в потоке обучения)
+    def _produce(self, batches_queue: queue.Queue, stop: threading.Event):
+
+        # положить в очередь, дожидаясь места, пока загрузчик не остановлен
+        def put(item) -> bool:
+            while not stop.is_set():
+                try:
+                    batches_queue.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        try:
+            for records in self._shuffled_batches(np.random.default_rng(self.seed)):
+                if not put(records_to_batch(records, self.dtype)):
+                    return
+            put(_END)
+        except Exception as error:
+            put(error)
+
+    def __iter__(self):
+        self._reset_metrics()
+        batches_queue = queue.Queue(maxsize=self.prefetch)
+        stop = threading.Event()
+        worker = threading.Thread(target=self._produce, args=(batches_queue, stop), daemon=True)
+        self._queue = batches_queue
+        self.start_time = time.perf_counter()
+        worker.start()
+
+        try:
+            while True:
+                queue_depth = batches_queue.qsize()
+                wait_start = time.perf_counter()
+                batch = batches_queue.get()
+                self.wait_seconds += time.perf_counter() - wait_start
+
+                if batch is _END:
+                    return
+                if isinstance(batch, Exception):
+                    raise batch
+
+                self._queue_depth_sum += queue_depth
+                self.batches += 1
+                self.positions += len(batch[0])
+                yield batch
+        finally:
+            stop.set()
+            worker.join()
+            self._queue = None
+
+    # метрики: скорость (позиций в секунду), глубина очереди готовых батчей и время ожидания батчей
+    def metrics(self) -> dict:
+        seconds = time.perf_counter() - self.start_time if self.start_time is not None else 0.0
+        return {
+            'batches': self.batches,
+            'positions': self.positions,
+            'seconds': round(seconds, 4),
+            'positions_per_second': round(self.positions / seconds, 1) if seconds > 0 else None,
+            'queue_depth': self._queue.qsize() if self._queue is not None else 0,
+            'average_queue_depth': round(self._queue_depth_sum / self.batches, 2) if self.batches else None,
+            'prefetch': self.prefetch,
+            'wait_seconds': round(self.wait_seconds, 4)
+        }
@@ -0,0 +1,139 @@
+import random
+
+import numpy as np
+
+from chessboard import PIECES
+from move_encoding import POLICY_INDEX, POLICY_SIZE
+
+# Вход нейросетей (см. input_output.txt):
+# 1) доска - массив 8x8x12: 8 рядов (индекс ряда = горизонталь - 1, т.е. ряд 0 - первая горизонталь),
+#    в каждом ряду 8 клеток (вертикали a-h), в каждой клетке 12 чисел - one-hot фигуры и цвета
+#    в порядке PIECES без пустой клетки: wp wn wb wr wq wk bp bn bb br bq bk
+# 2) цвет игрока: 1 - белый, 0 - черный
+
+PLANES_COUNT = len(PIECES) - 1
+
+# PIECE_PLANES[код фигуры] - one-hot строка клетки (для пустой клетки - нули)
+# (кодирование всей доски - одна выборка строк этой таблицы по массиву кодов клеток)
+PIECE_PLANES = np.zeros((len(PIECES), PLANES_COUNT), dtype=np.uint8)
+PIECE_PLANES[1:] = np.eye(PLANES_COUNT, dtype=np.uint8)
+
+_piece_planes_by_dtype = {np.dtype(np.uint8): PIECE_PLANES}
+
+
+# таблица PIECE_PLANES в нужном типе (для выборки без промежуточного массива)
+def _get_piece_planes(dtype) -> np.ndarray:
+    dtype = np.dtype(dtype)
+    piece_planes = _piece_planes_by_dtype.get(dtype)
+    if piece_planes is None:
+        piece_planes = _piece_planes_by_dtype[dtype] = PIECE_PLANES.astype(dtype)
+    return piece_planes
+
+
+# получить массив кодов клеток (N, 64) для списка досок (без цикла по клеткам)
+def get_board_codes(boards: list) -> np.ndarray:
+    return np.frombuffer(b''.join([board.board for board in boards]), dtype=np.uint8).reshape(len(boards), 64)
+
+
+# закодировать массив кодов клеток (N, 64) в массив (N, 8, 8, 12)
+# out - заранее выделенный массив (N, 8, 8, 12), в который записывается результат
+def encode_board_codes(codes: np.ndarray, out: np.ndarray = None, dtype=np.uint8) -> np.ndarray:
+    codes = np.asarray(codes, dtype=np.uint8).reshape(-1, 64)
+
+    if out is None:
+        out = np.empty((len(codes), 8, 8, PLANES_COUNT), dtype=dtype)
+    elif out.shape != (len(codes), 8, 8, PLANES_COUNT) or not out.flags.c_contiguous:
+        raise AttributeError(f"the parameter 'out' must be a contiguous array of shape "
+                             f"{(len(codes), 8, 8, PLANES_COUNT)}")
+
+    # коды клеток всегда от 0 до 12, поэтому mode='clip' (без лишней буферизации результата)
+    np.take(_get_piece_planes(out.dtype), codes, axis=0, out=out.reshape(len(codes), 64, PLANES_COUNT), mode='clip')
+    return out
+
+
+# закодировать цвета игроков ('white' / 'black') в вектор (N,): 1 - белый, 0 - черный
+def encode_colors(colors: list, out: np.ndarray = None, dtype=np.uint8) -> np.ndarray:
+    if out is None:
+        out = np.empty(len(colors), dtype=dtype)
+    out[:] = [color == 'white' for color in colors]
+    return out
+
+
+# закодировать доски в массив (N, 8, 8, 12) и вектор цвета игрока, который ходит (N,)
+# out, colors_out - заранее выделенные массивы для результата (например, буфер батча)
+def encode_boards(boards: list, out: np.ndarray = None, colors_out: np.ndarray = None,
+                  dtype=np.uint8) -> tuple:
+    tensor = encode_board_codes(get_board_codes(boards), out=out, dtype=dtype)
+    colors = encode_colors([board.current_player_color for board in boards], out=colors_out, dtype=dtype)
+    return tensor, colors
+
+
+# Выход policy_head: вектор из POLICY_SIZE чисел - по одному на каждый ход из moves.json
+
+# POLICY_INDEX в виде массива для выборки сразу по всем ходам (закодированный ход -> индекс в moves.json)
+POLICY_INDEX_ARRAY = np.array(POLICY_INDEX, dtype=np.int32)
+
+
+# маски разрешенных ходов (N, POLICY_SIZE) для списка досок (ходы игрока, чья очередь хода)
+# out - заранее выделенный булев массив (N, POLICY_SIZE), в который записывается результат
+def legal_policy_masks(boards: list, out: np.ndarray = None) -> np.ndarray:
+    if out is None:
+        out = np.zeros((len(boards), POLICY_SIZE), dtype=bool)
+    elif out.shape != (len(boards), POLICY_SIZE):
+        raise AttributeError(f"the parameter 'out' must have shape {(len(boards), POLICY_SIZE)}")
+    else:
+        out[:] = False
+
+    # все разрешенные ходы всех досок одним списком и номер доски для каждого хода
+    moves = []
+    counts = []
+    for board in boards:
+        legal_moves = board.get_encoded_legal_moves(board.current_player_color)
+        moves.extend(legal_moves)
+        counts.append(len(legal_moves))
+
+    out[np.repeat(np.arange(len(boards)), counts), POLICY_INDEX_ARRAY[moves]] = True
+    return out
+
+
+# softmax по разрешенным ходам (вероятность запрещенных ходов - 0)
+# logits и mask - массивы (POLICY_SIZE,) или (N, POLICY_SIZE)
+def masked_softmax(logits: np.ndarray, mask: np.ndarray) -> np.ndarray:
+    logits = np.where(mask, logits, -np.inf)
+    max_logits = logits.max(axis=-1, keepdims=True)
+    # если разрешенных ходов нет (мат или пат) - все вероятности 0
+    max_logits[~np.isfinite(max_logits)] = 0
+    exp = np.exp(logits - max_logits)
+    total = exp.sum(axis=-1, keepdims=True)
+    return np.divide(exp, total, out=np.zeros_like(exp), where=total > 0)
+
+
+# выбрать ход по выходу policy_head (POLICY_SIZE,) среди разрешенных ходов legal_moves (закодированных):
+# случайно по вероятностям softmax(logits / temperature), при temperature=0 - лучший ход
+def sample_legal_move(logits: np.ndarray, legal_moves: list, rng: random.Random, temperature: float = 1.0) -> int:
+    legal_logits = np.asarray(logits, dtype=np.float64)[POLICY_INDEX_ARRAY[legal_moves]]
+    if temperature == 0:
+        return legal_moves[int(np.argmax(legal_logits))]
+    legal_logits /= temperature
+    return rng.choices(legal_moves, weights=np.exp(legal_logits - legal_logits.max()))[0]
+
+
+# индексы top_k лучших разрешенных ходов (по убыванию), запрещенные ходы никогда не выбираются
+def masked_top_k(logits: np.ndarray, mask: np.ndarray, top_k: int = 1) -> list:
+    logits = np.where(mask, logits, -np.inf)
+    indexes = np.argsort(-logits, axis=-1, kind='stable')[..., :top_k]
+    if logits.ndim == 1:
+        return [int(index) for index in indexes if mask[index]]
+    return [[int(index) for index in row_indexes if row_mask[index]]
+            for row_indexes, row_mask in zip(indexes, mask)]
+
+
+# перевести выход policy_head (N, POLICY_SIZE) в top_k лучших разрешенных ходов для каждой доски
+# результат: для каждой доски список ходов для make_move ('Pe2e4', ...) по убыванию оценки
+def decode_policies(logits: np.ndarray, boards: list, top_k: int = 1, mask: np.ndarray = None) -> list:
+    logits = np.asarray(logits).reshape(len(boards), POLICY_SIZE)
+    if mask is None:
+        mask = legal_policy_masks(boards)
+
+    return [[board.decode_move(board.policy_index_to_move(index)) for index in indexes]
+            for board, indexes in zip(boards, masked_top_k(logits, mask, top_k))]
@@ -0,0 +1,222 @@
+import argparse
+import json
+import time
+
+import numpy as np
+
+from chessboard import ChessBoard
+from encoding import PLANES_COUNT, encode_board_codes, encode_boards, get_board_codes, legal_policy_masks, \
+    masked_softmax
+from move_encoding import POLICY_SIZE
+
+# Вычисление нейросетей policy_head и value_head (см. input_output.txt) на NumPy, без фреймворков:
+#     engine = InferenceEngine.from_npz('weights.npz')
+#     policy, values = engine.evaluate(boards)   # вероятности разрешенных ходов (N, POLICY_SIZE) и оценки (N,)
+#
+# Сеть: вход - доска 64x12 и цвет игрока (769 чисел), общие скрытые слои (ReLU),
+# policy - линейный слой на POLICY_SIZE ходов, value - скрытый слой (ReLU) и один выход (tanh).
+#
+# Веса в .npz (матрицы - (входы, выходы), x @ weight + bias):
+#   trunk_0_weight (769, H0), trunk_0_bias (H0,), trunk_1_weight (H0, H1), ... - общие слои
+#   policy_weight (Hn, POLICY_SIZE), policy_bias
+#   value_hidden_weight (Hn, V), value_hidden_bias, value_weight (V, 1), value_bias
+# Матрица может храниться в int8: <имя>_weight (int8) и <имя>_scale (float32, множитель каждого столбца).
+# int8 - только формат хранения (файл весов вчетверо меньше): при загрузке матрицы один раз переводятся
+# в float32, и прямой проход считается так же, как для весов float32.
+
+INPUT_SIZE = 64 * PLANES_COUNT + 1
+
+# квантование int8: симметричное, свой множитель для каждого выхода (столбца матрицы)
+INT8_MAX = 127
+
+
+# квантовать матрицу (входы, выходы) в int8: (матрица int8, множители столбцов float32)
+def quantize_int8(weight: np.ndarray) -> tuple:
+    scale = np.abs(weight).max(axis=0) / INT8_MAX
+    scale[scale == 0] = 1
+    quantized = np.clip(np.rint(weight / scale), -INT8_MAX, INT8_MAX).astype(np.int8)
+    return quantized, scale.astype(np.float32)
+
+
+# случайные веса сети (для проверки скорости и для начала обучения)
+def init_weights(hidden_sizes: tuple = (512, 256), value_hidden_size: int = 64, seed: int = None) -> dict:
+    rng = np.random.default_rng(seed)
+
+    # инициализация He для слоев с ReLU
+    def dense(inputs: int, outputs: int) -> tuple:
+        return (rng.standard_normal((inputs, outputs)) * np.sqrt(2 / inputs)).astype(np.float32), \
+            np.zeros(outputs, dtype=np.float32)
+
+    weights = {}
+    inputs = INPUT_SIZE
+    for number, outputs in enumerate(hidden_sizes):
+        weights[f'trunk_{number}_weight'], weights[f'trunk_{number}_bias'] = dense(inputs, outputs)
+        inputs = outputs
+    weights['policy_weight'], weights['policy_bias'] = dense(inputs, POLICY_SIZE)
+    weights['value_hidden_weight'], weights['value_hidden_bias'] = dense(inputs, value_hidden_size)
+    weights['value_weight'], weights['value_bias'] = dense(value_hidden_size, 1)
+    return weights
+
+
+# квантовать все матрицы весов в int8 (смещения остаются float32)
+def quantize_weights(weights: dict) -> dict:
+    quantized = {}
+    for name, array in weights.items():
+        if name.endswith('_weight'):
+            quantized[name], quantized[name[:-len('_weight')] + '_scale'] = quantize_int8(array)
+        else:
+            quantized[name] = np.asarray(array, dtype=np.float32)
+    return quantized
+
+
+# сохранить веса в .npz (int8=True - матрицы квантуются в int8)
+def save_weights(path: str, weights: dict, int8: bool = False):
+    np.savez(path, **(quantize_weights(weights) if int8 else weights))
+
+
+class InferenceEngine:
+
+    # weights - словарь весов (см. описание модуля), матрицы float32 или int8 с множителями
+    def __init__(self, weights: dict):
+        # (матрица float32, смещение); матрица int8 умножается на множители столбцов один раз здесь
+        def layer(name: str) -> tuple:
+            if f'{name}_weight' not in weights:
+                raise AttributeError(f"the weights have no '{name}_weight'")
+            weight = np.asarray(weights[f'{name}_weight'], dtype=np.float32)
+            scale = weights.get(f'{name}_scale')
+            if scale is not None:
+                weight = weight * np.asarray(scale, dtype=np.float32)
+            return weight, np.asarray(weights[f'{name}_bias'], dtype=np.float32)
+
+        trunk_count = 0
+        while f'trunk_{trunk_count}_weight' in weights:
+            trunk_count += 1
+        if trunk_count == 0:
+            raise AttributeError("the weights have no 'trunk_0_weight'")
+
+        # первый слой разделен на часть доски и строку цвета игрока: цвет добавляется к смещению,
+        # а вход не нужно склеивать в (N, 769)
+        weight, bias = layer('trunk_0')
+        if weight.shape[0] != INPUT_SIZE:
+            raise AttributeError(f"'trunk_0_weight' must have {INPUT_SIZE} rows")
+        self.input_layer = (np.ascontiguousarray(weight[:-1]), bias, weight[-1].copy())
+        self.trunk = [layer(f'trunk_{number}') for number in range(1, trunk_count)]
+
+        # policy и скрытый слой value считаются одним умножением на склеенную матрицу
+        policy_weight, policy_bias = layer('policy')
+        hidden_weight, hidden_bias = layer('value_hidden')
+        self.heads = (np.concatenate([policy_weight, hidden_weight], axis=1),
+                      np.concatenate([policy_bias, hidden_bias]))
+        self.value_layer = layer('value')
+
+        # веса были загружены из int8 (см. описание модуля)
+        self.int8 = 'trunk_0_scale' in weights
+
+    @classmethod
+    def from_npz(cls, path: str):
+        with np.load(path) as weights:
+            return cls(dict(weights))
+
+    # размер весов в памяти (байт)
+    def weights_size(self) -> int:
+        layers = [self.input_layer, *self.trunk, self.heads, self.value_layer]
+        return sum(array.nbytes for layer in layers for array in layer)
+
+    # x @ weight + bias
+    @staticmethod
+    def _linear(x: np.ndarray, layer: tuple) -> np.ndarray:
+        weight, bias = layer[:2]
+        output = x @ weight
+        output += bias
+        return output
+
+    # Прямой проход: доски (N, 8, 8, 12) и цвета (N,) (1 - белый) -> (выход policy_head (N, POLICY_SIZE), оценки (N,))
+    # (подходит как оценщик для mcts, inference_service и shared_ring)
+    def __call__(self, boards: np.ndarray, colors: np.ndarray) -> tuple:
+        x = np.asarray(boards, dtype=np.float32).reshape(len(boards), 64 * PLANES_COUNT)
+        hidden = self._linear(x, self.input_layer)
+        hidden += np.asarray(colors, dtype=np.float32)[:, None] * self.input_layer[2]
+        np.maximum(hidden, 0, out=hidden)
+
+        for layer in self.trunk:
+            hidden = self._linear(hidden, layer)
+            np.maximum(hidden, 0, out=hidden)
+
+        heads = self._linear(hidden, self.heads)
+        policy = heads[:, :POLICY_SIZE]
+        value_hidden = np.maximum(heads[:, POLICY_SIZE:], 0)
+        values = np.tanh(self._linear(value_hidden, self.value_layer)[:, 0])
+        return policy, values
+
+    # оценить доски: вероятности разрешенных ходов (N, POLICY_SIZE) (запрещенные ходы - 0) и оценки (N,)
+    # для игрока, чья очередь хода
+    def evaluate(self, boards: list) -> tuple:
+        tensor, colors = encode_boards(boards, dtype=np.float32)
+        logits, values = self(tensor, colors)
+        return masked_softmax(logits, legal_policy_masks(boards)), values
+
+
+# Время прямого прохода по размеру батча: для каждого размера - задержка батча (медиана repeats запусков)
+# и позиций в секунду
+def benchmark(engine: InferenceEngine, batch_sizes: tuple = (1, 8, 32, 128, 512), repeats: int = 20,
+              seed: int = 0) -> list:
+    rng = np.random.default_rng(seed)
+    # позиции со случайными ходами из начальной позиции
+    board = ChessBoard()
+    positions = []
+    while len(positions) < max(batch_sizes):
+        legal_moves = board.get_encoded_legal_moves(board.current_player_color)
+        if not legal_moves or board.halfmove_clock >= 100:
+            board = ChessBoard()
+            continue
+        board.push(legal_moves[rng.integers(len(legal_moves))])
+        positions.append((get_board_codes([board])[0], board.current_player_color == 'white'))
+
+    results = []
+    for batch_size in batch_sizes:
+        tensor = encode_board_codes(np.array([codes for codes, _ in positions[:batch_size]]), dtype=np.float32)
+        colors = np.array([color for _, color in positions[:batch_size]], dtype=np.float32)
+        engine(tensor, colors)
+        times = []
+        for _ in range(repeats):
+            start_time = time.perf_counter()
+            engine(tensor, colors)
+            times.append(time.perf_counter() - start_time)
+        latency = float(np.median(times))
+        results.append({
+            'batch_size': batch_size,
+            'latency_ms': round(latency * 1000, 3),
+            'latency_per_position_ms': round(latency * 1000 / batch_size, 4),
+            'positions_per_second': round(batch_size / latency, 1)
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='benchmark the NumPy policy/value network by batch size')
+    parser.add_argument('--weights', help='.npz weights (default: random weights)')
+    parser.add_argument('--hidden-sizes', default='512,256', help='hidden layers of the random network')
+    parser.add_argument('--batch-sizes', default='1,8,32,128,512', help='batch sizes to measure')
+    parser.add_argument('--repeats', type=int, default=20, help='runs per batch size')
+    parser.add_argument('--int8', action='store_true',
+                        help='also report the stored size of int8-quantized weights (storage format only)')
+    args = parser.parse_args()
+
+    if args.weights:
+        with np.load(args.weights) as weights:
+            weights = dict(weights)
+    else:
+        weights = init_weights(tuple(int(size) for size in args.hidden_sizes.split(',')), seed=0)
+    batch_sizes = tuple(int(size) for size in args.batch_sizes.split(','))
+
+    engine = InferenceEngine(weights)
+    report = {'weights_bytes': engine.weights_size(), 'batches': benchmark(engine, batch_sizes, args.repeats)}
+    # int8 не ускоряет прямой проход (веса переводятся в float32 при загрузке), а только уменьшает файл весов
+    if args.int8:
+        stored = weights if engine.int8 else quantize_weights(weights)
+        report['int8_stored_bytes'] = sum(np.asarray(array).nbytes for array in stored.values())
+    print(json.dumps(report, indent=4))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,242 @@
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections import deque
+
+import numpy as np
+
+from chessboard import ChessBoard
+from encoding import PLANES_COUNT, encode_board_codes, sample_legal_move
+from mcts import material_evaluator, uniform_evaluator
+from move_encoding import POLICY_SIZE
+
+# Сервис оценки позиций для множества партий в одном процессе (asyncio):
+#     service = BatchingEvaluator(model, max_batch_size=256, max_wait=0.002)
+#     async with service:
+#         policy, value = await service.evaluate(board)
+#
+# Запросы партий собираются в батч, пока в нем не наберется max_batch_size позиций
+# или пока первый запрос батча не прождет max_wait секунд. Батч кодируется (64x12, см. encoding),
+# оценивается одним вызовом модели, результаты раздаются ожидающим партиям.
+#
+# Модель - функция model(boards, colors) -> (policy, values), как оценщик в mcts:
+#   boards - доски (N, 8, 8, 12), colors - цвет игрока (N,): 1 - белый, 0 - черный
+#   policy - выход policy_head (N, POLICY_SIZE), values - оценки (N,) для игрока, чья очередь хода
+
+# сколько последних задержек хранится для процентилей
+LATENCY_HISTORY = 100000
+
+
+class BatchingEvaluator:
+
+    # max_wait - сколько секунд первый запрос батча может ждать, пока батч наполняется
+    # in_thread - вызывать модель в отдельном потоке, чтобы партии продолжали присылать запросы,
+    # пока модель занята (выгодно для тяжелых моделей, которые отпускают GIL на время вычислений;
+    # для легкой модели переключение потоков обходится дороже самой модели)
+    def __init__(self, model=uniform_evaluator, max_batch_size: int = 256, max_wait: float = 0.002,
+                 in_thread: bool = False, dtype=np.float32):
+        if max_batch_size <= 0:
+            raise AttributeError("the parameter 'max_batch_size' must be positive")
+        if max_wait < 0:
+            raise AttributeError("the parameter 'max_wait' must not be negative")
+
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.in_thread = in_thread
+
+        # буфер кодирования батча (повторно используется для каждого батча)
+        self._boards_buffer = np.empty((max_batch_size, 8, 8, PLANES_COUNT), dtype=dtype)
+        self._colors_buffer = np.empty(max_batch_size, dtype=dtype)
+
+        # ожидающие запросы: (коды клеток, цвет, future, время запроса)
+        self._pending = []
+        self._has_requests = None
+        self._batch_full = None
+        self._task = None
+        self._closed = False
+        self._reset_metrics()
+
+    def _reset_metrics(self):
+        self.requests = 0
+        self.batches = 0
+        self.model_seconds = 0.0
+        self.start_time = time.perf_counter()
+        self._latencies = deque(maxlen=LATENCY_HISTORY)
+
+    async def __aenter__(self):
+        self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    # запустить сбор батчей (в работающем цикле событий)
+    def start(self):
+        if self._task is not None:
+            return
+        self._has_requests = asyncio.Event()
+        self._batch_full = asyncio.Event()
+        self._closed = False
+        self._reset_metrics()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    # остановить сервис: оставшиеся запросы оцениваются, новые не принимаются
+    async def close(self):
+        if self._task is None:
+            return
+        self._closed = True
+        self._has_requests.set()
+        self._batch_full.set()
+        await self._task
+        self._task = None
+
+    # оценить позицию: (policy (POLICY_SIZE,), value) для игрока, чья очередь хода
+    async def evaluate(self, board: ChessBoard) -> tuple:
+        if self._task is None or self._closed:
+            raise AssertionError('the service is not running')
+
+        future = asyncio.get_running_loop().create_future()
+        # доска копируется сразу: партия может изменить ее, пока запрос ждет батча
+        self._pending.append((bytes(board.board), board.current_player_color == 'white', future, time.perf_counter()))
+        self._has_requests.set()
+        if len(self._pending) >= self.max_batch_size:
+            self._batch_full.set()
+        return await future
+
+    # цикл сбора батчей: ждем первый запрос, затем наполнения батча или истечения max_wait
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._has_requests.wait()
+            if not self._pending:
+                if self._closed:
+                    return
+                self._has_requests.clear()
+                continue
+
+            if len(self._pending) < self.max_batch_size and not self._closed:
+                try:
+                    await asyncio.wait_for(self._batch_full.wait(), self.max_wait)
+                except TimeoutError:
+                    pass
+
+            batch = self._pending[:self.max_batch_size]
+            self._pending = self._pending[self.max_batch_size:]
+            if len(self._pending) < self.max_batch_size and not self._closed:
+                self._batch_full.clear()
+
+            try:
+                boards, colors = self._encode(batch)
+                model_start = time.perf_counter()
+                if self.in_thread:
+                    policy, values = await loop.run_in_executor(None, self.model, boards, colors)
+                else:
+                    policy, values = self.model(boards, colors)
+                self.model_seconds += time.perf_counter() - model_start
+                policy = np.asarray(policy).reshape(len(batch), POLICY_SIZE)
+                values = np.asarray(values).reshape(len(batch))
+            except Exception as error:
+                for _, _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(error)
+                continue
+
+            finish_time = time.perf_counter()
+            for (_, _, future, request_time), row, value in zip(batch, policy, values):
+                self._latencies.append(finish_time - request_time)
+                if not future.done():
+                    future.set_result((row, float(value)))
+            self.requests += len(batch)
+            self.batches += 1
+
+    # закодировать батч в буферы сервиса
+    def _encode(self, batch: list) -> tuple:
+        count = len(batch)
+        codes = np.frombuffer(b''.join([request[0] for request in batch]), dtype=np.uint8).reshape(count, 64)
+        boards = encode_board_codes(codes, out=self._boards_buffer[:count])
+        colors = self._colors_buffer[:count]
+        colors[:] = [request[1] for request in batch]
+        return boards, colors
+
+    # метрики: средний размер батча и процентили задержки запроса (от evaluate до результата) в миллисекундах
+    def metrics(self) -> dict:
+        seconds = time.perf_counter() - self.start_time
+        latencies = np.array(self._latencies) * 1000
+        percentiles = np.percentile(latencies, [50, 90, 99]) if len(latencies) else [None] * 3
+        return {
+            'requests': self.requests,
+            'batches': self.batches,
+            'average_batch_size': round(self.requests / self.batches, 2) if self.batches else None,
+            'max_batch_size': self.max_batch_size,
+            'requests_per_second': round(self.requests / seconds, 1) if seconds > 0 else None,
+            'model_seconds': round(self.model_seconds, 4),
+            'latency_ms': {name: round(float(value), 3) if value is not None else None
+                           for name, value in zip(['p50', 'p90', 'p99'], percentiles)},
+            'pending': len(self._pending)
+        }
+
+
+# сыграть партию, выбирая ходы по policy сервиса (случайно по вероятностям разрешенных ходов)
+# результат: ходы (закодированные), результат ('1-0', '0-1', '1/2-1/2') и причина окончания
+async def play_game(service: BatchingEvaluator, seed: int = None, max_plies: int = 512) -> dict:
+    rng = random.Random(seed)
+    board = ChessBoard()
+    moves = []
+
+    while True:
+        status = board.game_status()
+        if status['status'] != 'ongoing':
+            result, termination = status['result'], status['status']
+            break
+        if len(moves) >= max_plies:
+            result, termination = '1/2-1/2', 'max_plies'
+            break
+
+        policy, _ = await service.evaluate(board)
+        move = sample_legal_move(policy, status['encoded_legal_moves'], rng)
+        moves.append(move)
+        board.push(move)
+
+    return {'moves': moves, 'result': result, 'termination': termination}
+
+
+# сыграть games партий одновременно (каждая партия - сопрограмма) через один сервис оценки
+async def play_games(model, games: int, max_batch_size: int = 256, max_wait: float = 0.002, seed: int = 0,
+                     max_plies: int = 512, in_thread: bool = False) -> dict:
+    start_time = time.perf_counter()
+    async with BatchingEvaluator(model, max_batch_size, max_wait, in_thread) as service:
+        results = await asyncio.gather(*[play_game(service, seed + number, max_plies) for number in range(games)])
+        report = service.metrics()
+    seconds = time.perf_counter() - start_time
+
+    report['games'] = games
+    report['plies'] = sum(len(game['moves']) for game in results)
+    report['seconds'] = round(seconds, 4)
+    report['results'] = {}
+    for game in results:
+        report['results'][game['result']] = report['results'].get(game['result'], 0) + 1
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='play many concurrent games through one batching evaluator')
+    parser.add_argument('--games', type=int, default=1000, help='number of concurrent games')
+    parser.add_argument('--max-batch-size', type=int, default=256, help='maximum positions per model call')
+    parser.add_argument('--max-wait', type=float, default=0.002, help='maximum seconds a batch waits to fill')
+    parser.add_argument('--max-plies', type=int, default=200, help='adjudicate a draw after this many plies')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the first game (game i uses seed + i)')
+    parser.add_argument('--model', choices=['uniform', 'material'], default='material', help='stub model')
+    parser.add_argument('--thread', action='store_true', help='call the model in a worker thread')
+    args = parser.parse_args()
+
+    model = uniform_evaluator if args.model == 'uniform' else material_evaluator
+    report = asyncio.run(play_games(model, args.games, args.max_batch_size, args.max_wait, args.seed,
+                                    args.max_plies, args.thread))
+    print(json.dumps(report, indent=4))
+
+
+if __name__ == '__main__':
+    main()
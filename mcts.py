@@ -0,0 +1,389 @@
+import argparse
+import json
+import time
+
+import numpy as np
+
+from chessboard import ChessBoard, INITIAL_FEN
+from encoding import POLICY_INDEX_ARRAY, encode_board_codes
+from move_encoding import POLICY_SIZE
+
+# Поиск по дереву Монте-Карло (PUCT, как в AlphaZero) с оценкой позиций нейросетями policy_head и value_head.
+#     tree = MCTS(evaluator, batch_size=32)
+#     tree.search(800)
+#     move = tree.best_move()
+#     tree.advance(move)      # сыграть ход, поддерево этого хода остается для следующего поиска
+#
+# Оценщик (evaluator) - функция evaluator(boards, colors) -> (policy, values) для батча позиций:
+#   boards - доски (N, 8, 8, 12), colors - цвет игрока (N,): 1 - белый, 0 - черный (см. encoding)
+#   policy - выход policy_head (N, POLICY_SIZE) до softmax, values - оценки (N,) от -1 до 1
+#   для игрока, чья очередь хода
+# Листья дерева собираются в батч с помощью виртуальной потери (virtual loss): путь к уже выбранному
+# листу временно считается проигранным, поэтому следующие спуски по дереву уходят в другие листья.
+#
+# Узлы дерева хранятся в массивах NumPy (узел - индекс), дети узла занимают подряд идущие индексы.
+
+# состояния узлов
+UNEXPANDED = 0
+PENDING = 1
+EXPANDED = 2
+TERMINAL = 3
+
+# результат спуска к конечной позиции (оценка уже распространена к корню, оценщик не нужен)
+_TERMINAL_LEAF = object()
+
+# цена фигур по плоскостям доски (wp wn wb wr wq wk bp bn bb br bq bk) для material_evaluator
+_PLANE_VALUES = np.array([1, 3, 3, 5, 9, 0, -1, -3, -3, -5, -9, 0], dtype=np.float32)
+
+
+# оценщик-заглушка: все разрешенные ходы равновероятны, все позиции равны
+def uniform_evaluator(boards: np.ndarray, colors: np.ndarray) -> tuple:
+    return np.zeros((len(boards), POLICY_SIZE), dtype=np.float32), np.zeros(len(boards), dtype=np.float32)
+
+
+# оценщик-заглушка: ходы равновероятны, оценка позиции - по материалу
+def material_evaluator(boards: np.ndarray, colors: np.ndarray) -> tuple:
+    material = boards.reshape(len(boards), 64, -1).sum(axis=1, dtype=np.float32) @ _PLANE_VALUES
+    values = np.tanh(material / 5) * (np.asarray(colors, dtype=np.float32) * 2 - 1)
+    return np.zeros((len(boards), POLICY_SIZE), dtype=np.float32), values
+
+
+class MCTS:
+
+    # board - начальная позиция (по умолчанию - начальная расстановка), доска принадлежит дереву
+    # c_puct - вес приоритета хода (policy) против средней оценки хода
+    # virtual_loss - сколько проигранных посещений временно добавляется пути к листу, ожидающему оценки
+    # capacity - начальный размер массивов узлов (массивы растут по мере надобности)
+    def __init__(self, evaluator=uniform_evaluator, board: ChessBoard = None, batch_size: int = 32,
+                 c_puct: float = 1.5, virtual_loss: int = 1, capacity: int = 1 << 16):
+        if batch_size <= 0:
+            raise AttributeError("the parameter 'batch_size' must be positive")
+        if virtual_loss < 0:
+            raise AttributeError("the parameter 'virtual_loss' must not be negative")
+
+        self.evaluator = evaluator
+        self.board = board if board is not None else ChessBoard()
+        self.batch_size = batch_size
+        self.c_puct = c_puct
+        self.virtual_loss = virtual_loss
+        self._allocate_tree(capacity)
+        self._reset_metrics()
+
+    # Массивы узлов:
+    #   visits      - количество посещений N
+    #   value_sum   - сумма оценок W для игрока, который сделал ход в этот узел
+    #   prior       - вероятность хода P по policy_head
+    #   moves       - закодированный ход, который ведет в узел (см. move_encoding, помещается в 16 бит)
+    #   first_child - индекс первого ребенка (-1 - детей нет), children_count - количество детей
+    #   states      - состояние узла (UNEXPANDED, PENDING, EXPANDED, TERMINAL)
+    def _allocate_tree(self, capacity: int):
+        self.visits = np.zeros(capacity, dtype=np.int32)
+        self.value_sum = np.zeros(capacity, dtype=np.float32)
+        self.prior = np.zeros(capacity, dtype=np.float32)
+        self.moves = np.zeros(capacity, dtype=np.uint16)
+        self.first_child = np.full(capacity, -1, dtype=np.int32)
+        self.children_count = np.zeros(capacity, dtype=np.uint8)
+        self.states = np.zeros(capacity, dtype=np.int8)
+        # оценка конечных позиций (мат, пат, ничья) для игрока, чья очередь хода: узел -> оценка
+        self.terminal_values = {}
+        # корень - узел 0
+        self.size = 1
+
+    # выделить count узлов подряд, при нехватке места массивы увеличиваются вдвое
+    def _allocate_nodes(self, count: int) -> int:
+        start = self.size
+        if start + count > len(self.visits):
+            capacity = max(len(self.visits) * 2, start + count)
+            for name in ('visits', 'value_sum', 'prior', 'moves', 'first_child', 'children_count', 'states'):
+                old = getattr(self, name)
+                new = np.full(capacity, -1, dtype=old.dtype) if name == 'first_child' \
+                    else np.zeros(capacity, dtype=old.dtype)
+                new[:start] = old[:start]
+                setattr(self, name, new)
+        self.size = start + count
+        return start
+
+    def _reset_metrics(self):
+        self.simulations = 0
+        self.leaves = 0
+        self.batches = 0
+        self.collisions = 0
+        self.terminals = 0
+        self.seconds = 0.0
+        self.evaluator_seconds = 0.0
+        self.reused_nodes = 0
+
+    # Выполнить simulations спусков по дереву (или пока не истечет max_time секунд).
+    # Спуски идут раундами: в раунде собирается до batch_size листьев, они оцениваются одним вызовом
+    # оценщика, затем дерево раскрывается и оценки распространяются к корню.
+    def search(self, simulations: int = 800, max_time: float = None) -> dict:
+        start_time = time.perf_counter()
+        deadline = start_time + max_time if max_time is not None else None
+        done = 0
+
+        while done < simulations and self.states[0] != TERMINAL:
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+
+            limit = min(self.batch_size, simulations - done)
+            pending = []
+            collisions = 0
+            while len(pending) < limit and collisions < limit:
+                leaf = self._collect_leaf()
+                if leaf is None:
+                    collisions += 1
+                elif leaf is _TERMINAL_LEAF:
+                    done += 1
+                    # корень оказался конечной позицией - дальше спускаться некуда
+                    if done + len(pending) >= simulations or self.states[0] == TERMINAL:
+                        break
+                else:
+                    pending.append(leaf)
+
+            self.collisions += collisions
+            if pending:
+                self._evaluate_and_expand(pending)
+                done += len(pending)
+
+        self.simulations += done
+        self.seconds += time.perf_counter() - start_time
+        return self.metrics()
+
+    # Спуститься от корня до листа, выбирая детей по PUCT: Q + c_puct * P * sqrt(N родителя) / (1 + N).
+    # Результат: лист, ожидающий оценки (узел, путь, коды клеток, цвет, разрешенные ходы),
+    # _TERMINAL_LEAF - лист оказался конечной позицией (оценка уже распространена),
+    # None - лист уже ожидает оценки в этом батче (столкновение).
+    def _collect_leaf(self):
+        board = self.board
+        node = 0
+        path = [0]
+        states = self.states
+        visits = self.visits
+        value_sum = self.value_sum
+        prior = self.prior
+
+        try:
+            while states[node] == EXPANDED:
+                first = self.first_child[node]
+                children = slice(first, first + self.children_count[node])
+                children_visits = visits[children]
+                q = np.divide(value_sum[children], children_visits, out=np.zeros(len(children_visits), np.float32),
+                              where=children_visits > 0)
+                u = self.c_puct * np.sqrt(visits[node]) * prior[children] / (1 + children_visits)
+                node = first + int(np.argmax(q + u))
+                board.push(int(self.moves[node]))
+                path.append(node)
+
+            state = states[node]
+            if state == PENDING:
+                return None
+
+            if state == UNEXPANDED:
+                status = board.game_status()
+                if status['status'] == 'ongoing' and not board.is_threefold_repetition():
+                    # виртуальная потеря: путь временно выглядит проигранным для выбирающих его игроков
+                    virtual_loss = self.virtual_loss
+                    for path_node in path:
+                        visits[path_node] += virtual_loss
+                        value_sum[path_node] -= virtual_loss
+                    states[node] = PENDING
+                    return node, path, bytes(board.board), board.current_player_color == 'white', \
+                        status['encoded_legal_moves']
+
+                states[node] = TERMINAL
+                self.terminal_values[node] = -1.0 if status['status'] == 'checkmate' else 0.0
+
+            self.terminals += 1
+            self._backup(path, self.terminal_values[node], 0)
+            return _TERMINAL_LEAF
+        finally:
+            for _ in range(len(path) - 1):
+                board.pop()
+
+    # распространить оценку листа (для игрока, чья очередь хода в листе) к корню
+    # и снять виртуальную потерю virtual_loss с пути
+    def _backup(self, path: list, value: float, virtual_loss: int):
+        visits = self.visits
+        value_sum = self.value_sum
+        for node in reversed(path):
+            # value_sum узла - для игрока, который сделал ход в узел, т.е. для соперника игрока в узле
+            visits[node] += 1 - virtual_loss
+            value_sum[node] += virtual_loss - value
+            value = -value
+
+    # оценить листья батча одним вызовом оценщика, раскрыть их и распространить оценки
+    def _evaluate_and_expand(self, pending: list):
+        codes = np.frombuffer(b''.join([leaf[2] for leaf in pending]), dtype=np.uint8).reshape(len(pending), 64)
+        boards = encode_board_codes(codes, dtype=np.float32)
+        colors = np.array([leaf[3] for leaf in pending], dtype=np.float32)
+
+        evaluator_start = time.perf_counter()
+        policy, values = self.evaluator(boards, colors)
+        self.evaluator_seconds += time.perf_counter() - evaluator_start
+        policy = np.asarray(policy, dtype=np.float32).reshape(len(pending), POLICY_SIZE)
+        values = np.asarray(values, dtype=np.float32).reshape(len(pending))
+
+        for (node, path, _, _, legal_moves), logits, value in zip(pending, policy, values):
+            # вероятности ходов - softmax по разрешенным ходам
+            legal_logits = logits[POLICY_INDEX_ARRAY[legal_moves]]
+            priors = np.exp(legal_logits - legal_logits.max())
+            priors /= priors.sum()
+
+            first = self._allocate_nodes(len(legal_moves))
+            children = slice(first, first + len(legal_moves))
+            self.moves[children] = legal_moves
+            self.prior[children] = priors
+            self.first_child[node] = first
+            self.children_count[node] = len(legal_moves)
+            self.states[node] = EXPANDED
+
+            self._backup(path, float(value), self.virtual_loss)
+
+        self.leaves += len(pending)
+        self.batches += 1
+
+    # дети корня: (закодированный ход, количество посещений, средняя оценка для игрока, чья очередь хода)
+    def root_children(self) -> list:
+        first = self.first_child[0]
+        if first == -1:
+            return []
+        return [(int(self.moves[child]), int(self.visits[child]),
+                 float(self.value_sum[child] / self.visits[child]) if self.visits[child] else 0.0)
+                for child in range(first, first + self.children_count[0])]
+
+    # ход с наибольшим количеством посещений (None - ходов нет или поиск не запускался)
+    def best_move(self):
+        children = self.root_children()
+        if not children:
+            return None
+        return max(children, key=lambda child: child[1])[0]
+
+    # распределение посещений детей корня по индексам ходов moves.json (POLICY_SIZE,) - цель обучения policy_head
+    def policy_target(self) -> np.ndarray:
+        target = np.zeros(POLICY_SIZE, dtype=np.float32)
+        children = self.root_children()
+        total = sum(child[1] for child in children)
+        if total:
+            for move, visits, _ in children:
+                target[POLICY_INDEX_ARRAY[move]] = visits / total
+        return target
+
+    # выбрать ход по посещениям: temperature=0 - лучший ход, иначе пропорционально visits ** (1 / temperature)
+    def select_move(self, temperature: float = 0.0, rng: np.random.Generator = None):
+        children = self.root_children()
+        if not children or temperature == 0:
+            return self.best_move()
+        weights = np.array([child[1] for child in children], dtype=np.float64) ** (1 / temperature)
+        if weights.sum() == 0:
+            weights[:] = 1
+        rng = rng or np.random.default_rng()
+        return children[int(rng.choice(len(children), p=weights / weights.sum()))][0]
+
+    # Сыграть ход (закодированный или строкой ChessBoard) на доске дерева.
+    # Поддерево этого хода становится новым деревом: узлы переписываются в начало массивов
+    # (обход в ширину сохраняет детей каждого узла подряд), остальные узлы отбрасываются.
+    def advance(self, move):
+        board = self.board
+        legal_moves = board.get_encoded_legal_moves(board.current_player_color)
+        if isinstance(move, str):
+            move = next((legal_move for legal_move in legal_moves if board.decode_move(legal_move) == move), None)
+        if move not in legal_moves:
+            raise AssertionError('move is not valid')
+        board.push(move)
+
+        new_root = None
+        first = self.first_child[0]
+        if first != -1:
+            for child in range(first, first + self.children_count[0]):
+                if self.moves[child] == move:
+                    new_root = child
+                    break
+
+        if new_root is None:
+            self._allocate_tree(len(self.visits))
+            return
+
+        old = (self.visits, self.value_sum, self.prior, self.moves, self.first_child, self.children_count,
+               self.states, self.terminal_values)
+        old_visits, old_value_sum, old_prior, old_moves, old_first_child, old_children_count, old_states, \
+            old_terminal_values = old
+        self._allocate_tree(len(self.visits))
+
+        self.visits[0] = old_visits[new_root]
+        self.value_sum[0] = old_value_sum[new_root]
+        self.states[0] = old_states[new_root]
+        if new_root in old_terminal_values:
+            self.terminal_values[0] = old_terminal_values[new_root]
+
+        # очередь обхода: (старый узел, новый узел)
+        queue = [(new_root, 0)]
+        for old_node, new_node in queue:
+            old_first = old_first_child[old_node]
+            if old_first == -1:
+                continue
+            count = int(old_children_count[old_node])
+            new_first = self._allocate_nodes(count)
+            old_children = slice(old_first, old_first + count)
+            new_children = slice(new_first, new_first + count)
+            self.visits[new_children] = old_visits[old_children]
+            self.value_sum[new_children] = old_value_sum[old_children]
+            self.prior[new_children] = old_prior[old_children]
+            self.moves[new_children] = old_moves[old_children]
+            self.states[new_children] = old_states[old_children]
+            self.first_child[new_node] = new_first
+            self.children_count[new_node] = count
+            for offset in range(count):
+                if old_first + offset in old_terminal_values:
+                    self.terminal_values[new_first + offset] = old_terminal_values[old_first + offset]
+                queue.append((old_first + offset, new_first + offset))
+
+        self.reused_nodes += self.size
+
+    # метрики: скорость оценки листьев и заполненность батчей (средний размер батча / batch_size)
+    def metrics(self) -> dict:
+        seconds = self.seconds
+        return {
+            'simulations': self.simulations,
+            'leaves': self.leaves,
+            'terminals': self.terminals,
+            'batches': self.batches,
+            'average_batch_size': round(self.leaves / self.batches, 2) if self.batches else None,
+            'batch_fill_rate': round(self.leaves / (self.batches * self.batch_size), 3) if self.batches else None,
+            'collisions': self.collisions,
+            'seconds': round(seconds, 4),
+            'evaluator_seconds': round(self.evaluator_seconds, 4),
+            'leaves_per_second': round(self.leaves / seconds, 1) if seconds > 0 else None,
+            'nodes': self.size,
+            'root_visits': int(self.visits[0]),
+            'reused_nodes': self.reused_nodes
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='batched PUCT tree search with a stub evaluator')
+    parser.add_argument('--fen', default=INITIAL_FEN, help='position (default: initial position)')
+    parser.add_argument('--simulations', type=int, default=800, help='simulations per move')
+    parser.add_argument('--batch-size', type=int, default=32, help='leaves evaluated per evaluator call')
+    parser.add_argument('--virtual-loss', type=int, default=1, help='virtual loss of a leaf waiting for evaluation')
+    parser.add_argument('--moves', type=int, default=1, help='moves to play, reusing the subtree of each move')
+    parser.add_argument('--evaluator', choices=['uniform', 'material'], default='material', help='stub evaluator')
+    args = parser.parse_args()
+
+    evaluator = uniform_evaluator if args.evaluator == 'uniform' else material_evaluator
+    tree = MCTS(evaluator, ChessBoard.from_fen(args.fen), args.batch_size, virtual_loss=args.virtual_loss)
+    played = []
+    for _ in range(args.moves):
+        tree.search(args.simulations)
+        move = tree.best_move()
+        if move is None:
+            break
+        played.append(tree.board.decode_move(move))
+        tree.advance(move)
+
+    report = tree.metrics()
+    report['moves'] = played
+    print(json.dumps(report, indent=4))
+
+
+if __name__ == '__main__':
+    main()
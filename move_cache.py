@@ -0,0 +1,79 @@
+import sys
+from collections import OrderedDict
+
+# Кэш разрешенных ходов: ключ позиции -> (список разрешенных ходов, есть ли шах)
+# Ограничен по количеству записей и (необязательно) по примерному объему памяти в байтах,
+# при переполнении удаляются записи, которые дольше всех не использовались (LRU).
+#
+# Подключается один на процесс для всех досок:
+#     ChessBoard.legal_moves_cache = LegalMovesCache(max_entries=200000)
+
+
+class LegalMovesCache:
+
+    def __init__(self, max_entries: int = 100000, max_bytes: int = None):
+        if max_entries is not None and max_entries <= 0:
+            raise AttributeError("the parameter 'max_entries' must be positive")
+        if max_bytes is not None and max_bytes <= 0:
+            raise AttributeError("the parameter 'max_bytes' must be positive")
+
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        # ключ -> (ходы, шах, примерный размер записи в байтах)
+        self._entries = OrderedDict()
+        self.bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    # получить (ходы, шах) по ключу или None, если позиции нет в кэше
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0], entry[1]
+
+    # сохранить ходы позиции (ходы хранятся кортежем, чтобы их нельзя было изменить через кэш)
+    def put(self, key, moves_list, is_check: bool):
+        moves = tuple(moves_list)
+        size = sys.getsizeof(moves) + sum([sys.getsizeof(move) for move in moves])
+
+        old_entry = self._entries.pop(key, None)
+        if old_entry is not None:
+            self.bytes -= old_entry[2]
+
+        self._entries[key] = (moves, is_check, size)
+        self.bytes += size
+
+        # удаляем самые давно использованные записи
+        while self._entries and (
+                (self.max_entries is not None and len(self._entries) > self.max_entries) or
+                (self.max_bytes is not None and self.bytes > self.max_bytes)):
+            _, evicted_entry = self._entries.popitem(last=False)
+            self.bytes -= evicted_entry[2]
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+        self.bytes = 0
+
+    # статистика для подбора размера кэша
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'bytes': self.bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
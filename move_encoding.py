@@ -0,0 +1,119 @@
+import json
+import os
+
+from board_tables import CELLS, CELL_INDEX
+
+# Компактная запись хода одним 16-битным числом:
+#   биты 0-5   - начальная клетка (индекс 0-63, см. board_tables.CELLS)
+#   биты 6-11  - конечная клетка
+#   биты 12-15 - флаги: вид хода и фигура превращения
+#
+# Флаги хранятся уже сдвинутыми на 12 бит, поэтому ход = from | to << 6 | флаг
+
+FLAGS_MASK = 0xF000
+
+QUIET = 0                 # обычный ход
+CAPTURE = 1 << 12         # взятие
+EN_PASSANT = 2 << 12      # взятие на проходе
+CASTLING = 3 << 12        # рокировка (ход короля e1-g1, e1-c1, e8-g8 или e8-c8)
+PROMOTION = 4 << 12       # превращение пешки: + номер фигуры из PROMOTION_PIECES << 12
+PROMOTION_CAPTURE = 8 << 12  # взятие с превращением пешки: + номер фигуры из PROMOTION_PIECES << 12
+
+PROMOTION_PIECES = ['Q', 'N', 'B', 'R']
+
+
+# закодировать ход по индексам клеток и флагу
+def encode_move(from_index: int, to_index: int, flag: int = QUIET) -> int:
+    return from_index | to_index << 6 | flag
+
+
+# фигура превращения ('Q', 'N', 'B', 'R') или None, если ход без превращения
+def get_promotion_piece(move: int):
+    if move & FLAGS_MASK >= PROMOTION:
+        return PROMOTION_PIECES[(move >> 12) & 3]
+    return None
+
+
+# Таблицы перевода в запись ходов ChessBoard ('Pe2e4', 'Ke1<O-O>', 'Pe5xd6EP', 'Pe7xd8Q')
+# без первой буквы (фигуры), которая зависит от доски:
+# MOVE_BODIES: закодированный ход -> запись без фигуры ('e2e4', 'e1<O-O>', 'e5xd6EP', 'e7xd8Q')
+# MOVES_BY_BODY: обратная таблица
+MOVE_BODIES = {}
+
+for _from_index in range(64):
+    for _to_index in range(64):
+        if _from_index != _to_index:
+            MOVE_BODIES[encode_move(_from_index, _to_index)] = CELLS[_from_index] + CELLS[_to_index]
+            MOVE_BODIES[encode_move(_from_index, _to_index, CAPTURE)] = \
+                CELLS[_from_index] + 'x' + CELLS[_to_index]
+
+# взятия на проходе (белые с 5-й горизонтали на 6-ю, черные с 4-й на 3-ю)
+# и превращения (белые с 7-й на 8-ю, черные со 2-й на 1-ю)
+for _from_rank, _to_rank, _is_promotion in [('5', '6', False), ('4', '3', False), ('7', '8', True), ('2', '1', True)]:
+    for _file in range(8):
+        _from_index = CELL_INDEX['abcdefgh'[_file] + _from_rank]
+        for _to_file in (_file - 1, _file, _file + 1):
+            if not 0 <= _to_file <= 7:
+                continue
+            _to_index = CELL_INDEX['abcdefgh'[_to_file] + _to_rank]
+            if not _is_promotion:
+                if _to_file != _file:
+                    MOVE_BODIES[encode_move(_from_index, _to_index, EN_PASSANT)] = \
+                        CELLS[_from_index] + 'x' + CELLS[_to_index] + 'EP'
+                continue
+            for _number, _piece in enumerate(PROMOTION_PIECES):
+                if _to_file == _file:
+                    MOVE_BODIES[encode_move(_from_index, _to_index, PROMOTION | _number << 12)] = \
+                        CELLS[_from_index] + CELLS[_to_index] + _piece
+                else:
+                    MOVE_BODIES[encode_move(_from_index, _to_index, PROMOTION_CAPTURE | _number << 12)] = \
+                        CELLS[_from_index] + 'x' + CELLS[_to_index] + _piece
+
+# рокировки
+for _king_cell, _target_cell, _castling_type in [('e1', 'g1', '<O-O>'), ('e1', 'c1', '<O-O-O>'),
+                                                 ('e8', 'g8', '<O-O>'), ('e8', 'c8', '<O-O-O>')]:
+    MOVE_BODIES[encode_move(CELL_INDEX[_king_cell], CELL_INDEX[_target_cell], CASTLING)] = \
+        _king_cell + _castling_type
+
+MOVES_BY_BODY = {body: move for move, body in MOVE_BODIES.items()}
+
+
+# закодировать ход из записи ChessBoard ('Pe2e4', 'Ke1<O-O>', ...)
+def move_from_str(move: str) -> int:
+    return MOVES_BY_BODY[move[1:]]
+
+
+# Словарь ходов нейросети (policy head) - см. moveslist.py и moves.json
+with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'moves.json'), encoding='utf-8') as _json_file:
+    POLICY_MOVES_LIST = json.load(_json_file)
+
+POLICY_SIZE = len(POLICY_MOVES_LIST)
+
+# POLICY_INDEX[закодированный ход] - индекс хода в moves.json (-1 для несуществующих ходов)
+# POLICY_MOVES[индекс в moves.json] - закодированный ход без учета взятия (обычный ход, рокировка
+# или превращение, для превращения по диагонали - взятие с превращением);
+# флаг взятия для обычных ходов зависит от доски (см. ChessBoard.policy_index_to_move)
+POLICY_INDEX = [-1] * (1 << 16)
+POLICY_MOVES = [0] * POLICY_SIZE
+
+_policy_indexes = {policy_move: index for index, policy_move in enumerate(POLICY_MOVES_LIST)}
+
+for _move, _body in MOVE_BODIES.items():
+    _flag = _move & FLAGS_MASK
+    if _flag == CASTLING:
+        _policy_move = _body
+    else:
+        _policy_move = CELLS[_move & 63] + CELLS[(_move >> 6) & 63]
+        if _flag >= PROMOTION:
+            _policy_move += get_promotion_piece(_move)
+    POLICY_INDEX[_move] = _policy_indexes[_policy_move]
+    if _flag != CAPTURE and _flag != EN_PASSANT:
+        POLICY_MOVES[_policy_indexes[_policy_move]] = _move
+
+del _from_index, _to_index, _from_rank, _to_rank, _is_promotion, _file, _to_file, _number, _piece
+del _king_cell, _target_cell, _castling_type, _json_file, _policy_indexes, _move, _body, _flag, _policy_move
+
+
+# индекс хода в moves.json по закодированному ходу
+def move_to_policy_index(move: int) -> int:
+    return POLICY_INDEX[move]
@@ -0,0 +1,268 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from chessboard import ChessBoard
+
+# Perft - подсчет количества всех позиций (узлов) на заданной глубине ходов.
+# Используется для проверки правильности генерации ходов (сравнение с эталонными числами)
+# и для измерения скорости генерации ходов.
+
+# Набор эталонных позиций: nodes[i] - количество узлов на глубине i + 1
+PERFT_SUITE = [
+    {'name': 'startpos',
+     'fen': 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1',
+     'nodes': [20, 400, 8902, 197281, 4865609]},
+    {'name': 'kiwipete',
+     'fen': 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+     'nodes': [48, 2039, 97862, 4085603]},
+    {'name': 'position3',
+     'fen': '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1',
+     'nodes': [14, 191, 2812, 43238, 674624]},
+    {'name': 'position4',
+     'fen': 'r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1',
+     'nodes': [6, 264, 9467, 422333]},
+    {'name': 'position5',
+     'fen': 'rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8',
+     'nodes': [44, 1486, 62379, 2103487]},
+    {'name': 'position6',
+     'fen': 'r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10',
+     'nodes': [46, 2079, 89890, 3894594]},
+
+    # взятие на проходе
+    {'name': 'ep_discovered_check',
+     'fen': '8/8/1k6/2b5/2pP4/8/5K2/8 b - d3 0 1',
+     'nodes': [15, 126, 1928, 13931, 206379]},
+    {'name': 'illegal_ep_white',
+     'fen': '3k4/3p4/8/K1P4r/8/8/8/8 b - - 0 1',
+     'nodes': [18, 92, 1670, 10138, 185429]},
+    {'name': 'illegal_ep_black',
+     'fen': '8/8/8/8/k1p4R/8/3P4/3K4 w - - 0 1',
+     'nodes': [18, 92, 1670, 10138, 185429]},
+    {'name': 'ep_gives_check',
+     'fen': '8/8/4k3/8/2p5/8/B2P2K1/8 w - - 0 1',
+     'nodes': [13, 102, 1266, 10276, 135655]},
+
+    # превращение пешки
+    {'name': 'promote_out_of_check',
+     'fen': '2K2r2/4P3/8/8/8/8/8/3k4 w - - 0 1',
+     'nodes': [11, 133, 1442, 19174, 266199]},
+    {'name': 'promote_to_give_check',
+     'fen': '4k3/1P6/8/8/8/8/K7/8 w - - 0 1',
+     'nodes': [9, 40, 472, 2661, 38983]},
+    {'name': 'underpromote_to_give_check',
+     'fen': '8/P1k5/K7/8/8/8/8/8 w - - 0 1',
+     'nodes': [6, 27, 273, 1329, 18135]},
+
+    # рокировка
+    {'name': 'castling_rights',
+     'fen': 'r3k2r/1b4bq/8/8/8/8/7B/R3K2R w KQkq - 0 1',
+     'nodes': [26, 1141, 27826]},
+    {'name': 'castling_prevented',
+     'fen': 'r3k2r/8/3Q4/8/8/5q2/8/R3K2R b KQkq - 0 1',
+     'nodes': [44, 1494, 50509]},
+    {'name': 'short_castling_gives_check',
+     'fen': '5k2/8/8/8/8/8/8/4K2R w K - 0 1',
+     'nodes': [15, 66, 1198, 6399, 120330]},
+    {'name': 'long_castling_gives_check',
+     'fen': '3k4/8/8/8/8/8/8/R3K3 w Q - 0 1',
+     'nodes': [16, 71, 1286, 7418, 141077]},
+]
+
+
+# количество позиций на глубине depth
+def perft(board: ChessBoard, depth: int) -> int:
+    if depth <= 0:
+        return 1
+
+    moves_list = board.get_encoded_legal_moves(board.current_player_color)
+
+    # на последнем уровне достаточно количества разрешенных ходов
+    if depth == 1:
+        return len(moves_list)
+
+    nodes = 0
+    for move in moves_list:
+        board.push(move)
+        nodes += perft(board, depth - 1)
+        board.pop()
+
+    return nodes
+
+
+# количество позиций на глубине depth отдельно для каждого первого хода
+def divide(board: ChessBoard, depth: int) -> dict:
+    result = {}
+    for move in board.get_legal_moves_list(board.current_player_color):
+        board.push(move)
+        result[move] = perft(board, depth - 1)
+        board.pop()
+    return result
+
+
+# запустить perft для позиции и получить отчет: узлы, время и скорость (узлов в секунду)
+def run_perft(fen: str, depth: int, expected: int = None, with_divide: bool = False) -> dict:
+    board = ChessBoard.from_fen(fen)
+
+    start_time = time.perf_counter()
+    if with_divide:
+        moves = divide(board, depth)
+        nodes = sum(moves.values())
+    else:
+        moves = None
+        nodes = perft(board, depth)
+    seconds = time.perf_counter() - start_time
+
+    report = {
+        'fen': fen,
+        'depth': depth,
+        'nodes': nodes,
+        'seconds': round(seconds, 4),
+        'nps': round(nodes / seconds) if seconds > 0 else None
+    }
+    if expected is not None:
+        report['expected'] = expected
+        report['ok'] = nodes == expected
+    if moves is not None:
+        report['divide'] = moves
+
+    return report
+
+
+# Параллельный perft: первые ходы (или поддеревья после двух первых ходов) делятся между процессами.
+# Каждому процессу передается только FEN исходной позиции и список ходов до поддерева.
+
+# подсчет узлов одного поддерева в процессе-исполнителе
+def _perft_subtree(task: tuple) -> tuple:
+    fen, moves, depth = task
+    board = ChessBoard.from_fen(fen)
+    for move in moves:
+        board.push(move)
+
+    start_time = time.perf_counter()
+    nodes = perft(board, depth)
+    return moves, nodes, time.perf_counter() - start_time, os.getpid()
+
+
+# perft с разделением работы между процессами
+# split_depth - на какой глубине делить дерево на задачи: 1 - по первым ходам, 2 - по парам первых ходов
+def run_parallel_perft(fen: str, depth: int, workers: int = None, split_depth: int = 1,
+                       expected: int = None) -> dict:
+    if depth < 1:
+        raise AttributeError("the parameter 'depth' must be at least 1")
+    split_depth = max(1, min(split_depth, depth))
+    board = ChessBoard.from_fen(fen)
+
+    # задачи: ходы до поддерева и оставшаяся глубина
+    tasks = [[]]
+    for _ in range(split_depth):
+        next_tasks = []
+        for moves in tasks:
+            for move in moves:
+                board.push(move)
+            for move in board.get_legal_moves_list(board.current_player_color):
+                next_tasks.append(moves + [move])
+            for _ in moves:
+                board.pop()
+        tasks = next_tasks
+
+    workers = workers or os.cpu_count()
+    # все первые ходы: ход без ответов (мат или пат) не дает задач при split_depth=2, но должен быть в divide
+    moves_nodes = {move: 0 for move in board.get_legal_moves_list(board.current_player_color)}
+    workers_stats = {}
+
+    start_time = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # задачи отправляются пачками, чтобы не тратить время на пересылку каждой по отдельности
+        for moves, nodes, seconds, pid in executor.map(
+                _perft_subtree, [(fen, moves, depth - split_depth) for moves in tasks],
+                chunksize=max(1, len(tasks) // (workers * 8))):
+            moves_nodes[moves[0]] = moves_nodes.get(moves[0], 0) + nodes
+            stats = workers_stats.setdefault(pid, {'tasks': 0, 'nodes': 0, 'seconds': 0.0})
+            stats['tasks'] += 1
+            stats['nodes'] += nodes
+            stats['seconds'] += seconds
+    seconds = time.perf_counter() - start_time
+
+    nodes = sum(moves_nodes.values())
+    report = {
+        'fen': fen,
+        'depth': depth,
+        'nodes': nodes,
+        'seconds': round(seconds, 4),
+        'nps': round(nodes / seconds) if seconds > 0 else None,
+        'workers': workers,
+        'tasks': len(tasks),
+        'worker_stats': [
+            {'pid': pid, 'tasks': stats['tasks'], 'nodes': stats['nodes'],
+             'seconds': round(stats['seconds'], 4),
+             'nps': round(stats['nodes'] / stats['seconds']) if stats['seconds'] > 0 else None}
+            for pid, stats in sorted(workers_stats.items())
+        ]
+    }
+    if expected is not None:
+        report['expected'] = expected
+        report['ok'] = nodes == expected
+    report['divide'] = moves_nodes
+
+    return report
+
+
+# глубина из командной строки: целое число от 1
+def _positive_depth(value: str) -> int:
+    depth = int(value)
+    if depth < 1:
+        raise argparse.ArgumentTypeError('depth must be at least 1')
+    return depth
+
+
+def main():
+    parser = argparse.ArgumentParser(description='perft / divide for ChessBoard move generation')
+    parser.add_argument('--fen', help='position in FEN (default: the reference suite)')
+    parser.add_argument('--depth', type=_positive_depth, default=3,
+                        help='search depth (for the suite: maximum depth, capped by known node counts)')
+    parser.add_argument('--divide', action='store_true', help='report node counts per root move')
+    parser.add_argument('--only', nargs='*', help='names of suite positions to run')
+    parser.add_argument('--workers', type=int,
+                        help='run in parallel with this many processes (0 - one per CPU core)')
+    parser.add_argument('--split-depth', type=int, default=1, choices=[1, 2],
+                        help='parallel mode: split the tree by root moves (1) or by depth-2 subtrees (2)')
+    args = parser.parse_args()
+
+    # запуск одной позиции: параллельно или в текущем процессе
+    def run(fen, depth, expected=None):
+        if args.workers is not None:
+            return run_parallel_perft(fen, depth, args.workers or None, args.split_depth, expected)
+        return run_perft(fen, depth, expected, args.divide)
+
+    if args.fen:
+        reports = [run(args.fen, args.depth)]
+    else:
+        reports = []
+        for position in PERFT_SUITE:
+            if args.only and position['name'] not in args.only:
+                continue
+            depth = min(args.depth, len(position['nodes']))
+            report = run(position['fen'], depth, position['nodes'][depth - 1])
+            reports.append({'name': position['name'], **report})
+
+    total_nodes = sum(report['nodes'] for report in reports)
+    total_seconds = sum(report['seconds'] for report in reports)
+    summary = {
+        'positions': reports,
+        'total_nodes': total_nodes,
+        'total_seconds': round(total_seconds, 4),
+        'nps': round(total_nodes / total_seconds) if total_seconds > 0 else None,
+        'ok': all(report.get('ok', True) for report in reports)
+    }
+    print(json.dumps(summary, indent=4))
+
+    if not summary['ok']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,232 @@
+import argparse
+import bz2
+import gzip
+import json
+import os
+import re
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from board_tables import CELLS
+from chessboard import ChessBoard, INITIAL_FEN, PIECE_LETTERS
+from move_encoding import MOVES_BY_BODY, POLICY_INDEX, get_promotion_piece
+
+# Чтение партий из PGN-файлов (в том числе очень больших: партии читаются по одной)
+# и перевод ходов из SAN ('Nf3', 'exd5', 'O-O', 'e8=Q+') в ходы ChessBoard.
+#
+# Результат для обучения - позиции партии:
+#     (FEN позиции, индекс сыгранного хода в moves.json, результат партии для игрока, чья очередь хода)
+# результат: 1 - этот игрок выиграл, -1 - проиграл, 0 - ничья
+
+# результат партии для белых
+RESULTS = {'1-0': 1, '0-1': -1, '1/2-1/2': 0}
+
+_HEADER_RE = re.compile(r'\[\s*(\w+)\s+"((?:[^"\\]|\\.)*)"\s*]')
+
+# лексемы текста ходов: комментарии, скобки вариантов, NAG ($1), остальное - ходы, номера ходов и результат
+_MOVETEXT_TOKEN_RE = re.compile(r'\{[^}]*}|;[^\n]*|[()]|\$\d+|[^\s(){};$]+')
+
+# номер хода перед ходом: '12.', '12...' (бывает без пробела: '12.e4')
+_MOVE_NUMBER_RE = re.compile(r'^\d+\.+')
+
+
+# открыть PGN-файл (сжатые .gz и .bz2 читаются без распаковки на диск)
+def _open_pgn(path: str):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', errors='replace')
+    if path.endswith('.bz2'):
+        return bz2.open(path, 'rt', encoding='utf-8', errors='replace')
+    return open(path, encoding='utf-8', errors='replace')
+
+
+# прочитать тексты партий по одной (заголовки и ходы), не загружая файл целиком
+def read_pgn_texts(path: str):
+    with _open_pgn(path) as pgn_file:
+        lines = []
+        has_movetext = False
+        for line in pgn_file:
+            # новая партия начинается с заголовка после ходов предыдущей
+            if line.startswith('[') and has_movetext:
+                yield ''.join(lines)
+                lines = []
+                has_movetext = False
+            if line.strip() and not line.startswith('['):
+                has_movetext = True
+            lines.append(line)
+        if has_movetext:
+            yield ''.join(lines)
+
+
+# разобрать текст партии: заголовки, ходы в SAN (только основной вариант) и результат
+def parse_pgn_game(text: str) -> dict:
+    headers = {}
+    movetext_lines = []
+    for line in text.splitlines():
+        if line.startswith('['):
+            match = _HEADER_RE.match(line)
+            if match:
+                headers[match.group(1)] = match.group(2)
+        elif not line.startswith('%'):
+            movetext_lines.append(line)
+
+    moves = []
+    result = headers.get('Result', '*')
+    variation_depth = 0
+    for token in _MOVETEXT_TOKEN_RE.findall('\n'.join(movetext_lines)):
+        if token == '(':
+            variation_depth += 1
+        elif token == ')':
+            variation_depth -= 1
+        elif variation_depth > 0 or token[0] in '{;$':
+            continue
+        elif token in RESULTS or token == '*':
+            result = token
+        else:
+            token = _MOVE_NUMBER_RE.sub('', token)
+            if token and token != 'e.p.':
+                moves.append(token)
+
+    return {'headers': headers, 'moves': moves, 'result': result}
+
+
+# перевести ход из SAN в закодированный ход (см. move_encoding) в текущей позиции доски
+# (ход ищется среди разрешенных ходов игрока, чья очередь хода)
+def san_to_move(board: ChessBoard, san: str) -> int:
+    color = board.current_player_color
+    legal_moves = board.get_encoded_legal_moves(color)
+    stripped_san = san.rstrip('+#!?')
+
+    # рокировка
+    if stripped_san in ('O-O', '0-0', 'O-O-O', '0-0-0'):
+        castling_type = '<O-O>' if len(stripped_san) == 3 else '<O-O-O>'
+        move = MOVES_BY_BODY[('e1' if color == 'white' else 'e8') + castling_type]
+        if move in legal_moves:
+            return move
+        raise AssertionError(f'{san} is not valid move')
+
+    # превращение: 'e8=Q' или 'e8Q'
+    promotion = None
+    if '=' in stripped_san:
+        stripped_san, promotion = stripped_san.split('=', 1)
+        promotion = promotion[:1]
+    elif stripped_san and stripped_san[-1] in 'QNBR' and stripped_san[0].islower():
+        stripped_san, promotion = stripped_san[:-1], stripped_san[-1]
+
+    if len(stripped_san) < 2:
+        raise AttributeError(f"invalid SAN '{san}'")
+
+    letter = stripped_san[0] if stripped_san[0] in 'NBRQK' else 'P'
+    body = stripped_san[1:] if letter != 'P' else stripped_san
+    target = body[-2:]
+    # уточнение начальной клетки: вертикаль, горизонталь или клетка целиком ('Nbd7', 'R1e2', 'Qh4e1')
+    disambiguation = body[:-2].replace('x', '').replace('-', '')
+
+    board_codes = board.board
+    candidates = [
+        move for move in legal_moves
+        if CELLS[(move >> 6) & 63] == target and PIECE_LETTERS[board_codes[move & 63]] == letter and
+        get_promotion_piece(move) == promotion and all(symbol in CELLS[move & 63] for symbol in disambiguation)
+    ]
+
+    if len(candidates) != 1:
+        raise AssertionError(f'{san} is not valid move' if not candidates else f'{san} is ambiguous')
+    return candidates[0]
+
+
+# позиции партии для обучения (см. описание модуля)
+# партии без результата ('*') пропускаются: для них нет оценки позиций
+def game_samples(game: dict) -> list:
+    white_result = RESULTS.get(game['result'])
+    if white_result is None:
+        return []
+
+    board = ChessBoard.from_fen(game['headers'].get('FEN', INITIAL_FEN))
+    samples = []
+    for san in game['moves']:
+        move = san_to_move(board, san)
+        result = white_result if board.current_player_color == 'white' else -white_result
+        samples.append((board.to_fen(), POLICY_INDEX[move], result))
+        board.apply_unchecked(move)
+    return samples
+
+
+# обработка пачки партий в процессе-исполнителе: (позиции, количество партий с ошибками)
+def _texts_samples(texts: list) -> tuple:
+    samples = []
+    errors = 0
+    for text in texts:
+        try:
+            samples.extend(game_samples(parse_pgn_game(text)))
+        except (AttributeError, AssertionError, KeyError, ValueError):
+            errors += 1
+    return samples, errors, len(texts)
+
+
+# Прочитать позиции из PGN-файла, разбирая партии в нескольких процессах.
+# Партии отправляются пачками по games_per_task, одновременно в работе не больше max_pending пачек,
+# поэтому память не растет с размером файла. Позиции выдаются в порядке партий в файле.
+# stats (необязательный словарь) заполняется счетчиками: партии, партии с ошибками, позиции
+def read_pgn_samples(path: str, workers: int = None, games_per_task: int = 64, max_pending: int = None,
+                     stats: dict = None):
+    workers = workers or os.cpu_count()
+    max_pending = max_pending or workers * 4
+    if stats is None:
+        stats = {}
+    stats.update({'games': 0, 'errors': 0, 'positions': 0})
+
+    def collect(future):
+        samples, errors, games = future.result()
+        stats['games'] += games
+        stats['errors'] += errors
+        stats['positions'] += len(samples)
+        return samples
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        texts = []
+        for text in read_pgn_texts(path):
+            texts.append(text)
+            if len(texts) < games_per_task:
+                continue
+            pending.append(executor.submit(_texts_samples, texts))
+            texts = []
+            if len(pending) >= max_pending:
+                yield from collect(pending.popleft())
+
+        if texts:
+            pending.append(executor.submit(_texts_samples, texts))
+        while pending:
+            yield from collect(pending.popleft())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='read training positions from a PGN file')
+    parser.add_argument('path', help='PGN file (.pgn, .pgn.gz or .pgn.bz2)')
+    parser.add_argument('--workers', type=int, help='number of processes (default: one per CPU core)')
+    parser.add_argument('--games-per-task', type=int, default=64, help='games sent to a process at once')
+    parser.add_argument('--output', help='write positions to shards in this directory (see position_store)')
+    args = parser.parse_args()
+
+    stats = {}
+    start_time = time.perf_counter()
+    samples = read_pgn_samples(args.path, args.workers, args.games_per_task, stats=stats)
+    if args.output:
+        from position_store import PositionWriter
+
+        with PositionWriter(args.output) as writer:
+            for fen, policy_index, result in samples:
+                writer.write_boards([ChessBoard.from_fen(fen)], [policy_index], [result])
+    else:
+        for _ in samples:
+            pass
+    seconds = time.perf_counter() - start_time
+
+    stats['seconds'] = round(seconds, 4)
+    stats['games_per_second'] = round(stats['games'] / seconds, 1) if seconds > 0 else None
+    stats['positions_per_second'] = round(stats['positions'] / seconds, 1) if seconds > 0 else None
+    print(json.dumps(stats, indent=4))
+
+
+if __name__ == '__main__':
+    main()
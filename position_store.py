@@ -0,0 +1,202 @@
+import glob
+import os
+
+import numpy as np
+
+from chessboard import ChessBoard, ALL_CASTLING_RIGHTS
+from encoding import get_board_codes, encode_board_codes
+
+# Хранилище позиций для обучения: записи фиксированной длины (39 байт) в файлах-шардах,
+# которые читаются через np.memmap без загрузки в память.
+#
+# Запись (RECORD_DTYPE):
+#   squares        32 байта - по 4 бита на клетку (код фигуры, см. chessboard.PIECES):
+#                  младшие 4 бита байта i - клетка 2i, старшие - клетка 2i + 1 (индексы клеток - см. CELLS)
+#   flags          1 байт - биты 0-3: права на рокировку (в порядке CASTLING_KEYS),
+#                  бит 4: очередь хода белых (1 - белые, 0 - черные)
+#   en_passant     1 байт - вертикаль взятия на проходе + 1 (0 - взятия на проходе нет)
+#   halfmove_clock 1 байт - счетчик полуходов (до 255)
+#   policy         2 байта - индекс сыгранного хода в moves.json
+#   value          2 байта (float16) - оценка позиции для игрока, чья очередь хода (от -1 до 1)
+
+RECORD_DTYPE = np.dtype([
+    ('squares', np.uint8, 32),
+    ('flags', np.uint8),
+    ('en_passant', np.uint8),
+    ('halfmove_clock', np.uint8),
+    ('policy', np.uint16),
+    ('value', np.float16),
+])
+
+WHITE_TO_MOVE_FLAG = 1 << 4
+
+SHARD_SUFFIX = '.bin'
+
+
+# упаковать доски в записи (N,)
+# policies - индексы ходов в moves.json, values - оценки позиций (по одному на доску)
+def pack_boards(boards: list, policies, values) -> np.ndarray:
+    records = np.zeros(len(boards), dtype=RECORD_DTYPE)
+    if not boards:
+        return records
+
+    codes = get_board_codes(boards)
+    records['squares'] = codes[:, 0::2] | codes[:, 1::2] << 4
+
+    # права на рокировку на доске хранятся теми же 4 битами (в порядке CASTLING_KEYS)
+    records['flags'] = [board.castling_rights | (WHITE_TO_MOVE_FLAG if board.current_player_color == 'white' else 0)
+                        for board in boards]
+    records['en_passant'] = [board.en_passant_square % 8 + 1 if board.en_passant_square is not None else 0
+                             for board in boards]
+    records['halfmove_clock'] = np.minimum([board.halfmove_clock for board in boards], 255)
+    records['policy'] = policies
+    records['value'] = values
+    return records
+
+
+# получить коды клеток (N, 64) из записей - для encoding.encode_board_codes без создания досок
+def unpack_board_codes(records: np.ndarray, out: np.ndarray = None) -> np.ndarray:
+    squares = records['squares']
+    if out is None:
+        out = np.empty((len(records), 64), dtype=np.uint8)
+    np.bitwise_and(squares, 0x0F, out=out[:, 0::2])
+    np.right_shift(squares, 4, out=out[:, 1::2])
+    return out
+
+
+# перевести записи в батч для обучения: доски (N, 8, 8, 12), цвет игрока (N,), индексы ходов (N,) и оценки (N,)
+def records_to_batch(records: np.ndarray, dtype=np.float32) -> tuple:
+    tensor = encode_board_codes(unpack_board_codes(records), dtype=dtype)
+    colors = ((records['flags'] & WHITE_TO_MOVE_FLAG) != 0).astype(dtype)
+    return tensor, colors, records['policy'].astype(np.int64), records['value'].astype(np.float32)
+
+
+# восстановить доску из записи (номер хода не хранится и всегда равен 1)
+def unpack_board(record) -> ChessBoard:
+    record = np.asarray(record, dtype=RECORD_DTYPE).reshape(1)
+    flags = int(record['flags'][0])
+    en_passant = int(record['en_passant'][0])
+    return ChessBoard.from_packed(unpack_board_codes(record)[0].tobytes(), flags & ALL_CASTLING_RIGHTS,
+                                  'white' if flags & WHITE_TO_MOVE_FLAG else 'black',
+                                  en_passant - 1 if en_passant else None, int(record['halfmove_clock'][0]))
+
+
+# Запись позиций в файлы-шарды <directory>/<prefix>-00000.bin, <prefix>-00001.bin, ...
+# (новый шард начинается после records_per_shard записей, дописывание продолжается с последнего шарда)
+class PositionWriter:
+
+    def __init__(self, directory: str, prefix: str = 'positions', records_per_shard: int = 1000000,
+                 buffer_records: int = 65536):
+        if records_per_shard <= 0:
+            raise AttributeError("the parameter 'records_per_shard' must be positive")
+
+        self.directory = directory
+        self.prefix = prefix
+        self.records_per_shard = records_per_shard
+        self.buffer_records = buffer_records
+
+        os.makedirs(directory, exist_ok=True)
+
+        # продолжаем последний шард, если он не заполнен
+        shards = get_shard_paths(directory, prefix)
+        self.shard_number = len(shards) - 1 if shards else 0
+        self.shard_records = os.path.getsize(shards[-1]) // RECORD_DTYPE.itemsize if shards else 0
+        if self.shard_records >= records_per_shard:
+            self.shard_number += 1
+            self.shard_records = 0
+
+        self._buffer = []
+        self._buffered = 0
+        self.records_written = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _shard_path(self) -> str:
+        return os.path.join(self.directory, f'{self.prefix}-{self.shard_number:05d}{SHARD_SUFFIX}')
+
+    # добавить записи (массив RECORD_DTYPE)
+    def write(self, records: np.ndarray):
+        records = np.asarray(records, dtype=RECORD_DTYPE)
+        self._buffer.append(records)
+        self._buffered += len(records)
+        if self._buffered >= self.buffer_records:
+            self.flush()
+
+    # добавить позиции досок (см. pack_boards)
+    def write_boards(self, boards: list, policies, values):
+        self.write(pack_boards(boards, policies, values))
+
+    # записать накопленные записи на диск
+    def flush(self):
+        if not self._buffer:
+            return
+        records = np.concatenate(self._buffer)
+        self._buffer = []
+        self._buffered = 0
+
+        while len(records):
+            count = min(len(records), self.records_per_shard - self.shard_records)
+            with open(self._shard_path(), 'ab') as shard_file:
+                shard_file.write(records[:count].tobytes())
+            records = records[count:]
+            self.shard_records += count
+            self.records_written += count
+            if self.shard_records >= self.records_per_shard:
+                self.shard_number += 1
+                self.shard_records = 0
+
+    def close(self):
+        self.flush()
+
+
+# пути шардов в порядке номеров
+def get_shard_paths(directory: str, prefix: str = 'positions') -> list:
+    return sorted(glob.glob(os.path.join(glob.escape(directory), f'{prefix}-*{SHARD_SUFFIX}')))
+
+
+# Чтение позиций из шардов: все шарды отображаются в память (np.memmap) и читаются как один массив
+class PositionStore:
+
+    def __init__(self, directory: str, prefix: str = 'positions'):
+        self.shards = [
+            np.memmap(path, dtype=RECORD_DTYPE, mode='r')
+            for path in get_shard_paths(directory, prefix)
+            if os.path.getsize(path) >= RECORD_DTYPE.itemsize
+        ]
+        # offsets[i] - номер первой записи шарда i во всем хранилище
+        self.offsets = np.cumsum([0] + [len(shard) for shard in self.shards])
+
+    def __len__(self):
+        return int(self.offsets[-1])
+
+    # получить записи по номерам (номер, массив номеров или срез)
+    def __getitem__(self, indexes) -> np.ndarray:
+        if isinstance(indexes, slice):
+            indexes = np.arange(*indexes.indices(len(self)))
+        is_scalar = np.ndim(indexes) == 0
+        indexes = np.atleast_1d(np.asarray(indexes, dtype=np.int64))
+        # отрицательные номера - с конца хранилища (как у массивов)
+        size = len(self)
+        if len(indexes) and (indexes.min() < -size or indexes.max() >= size):
+            raise IndexError(f'record index out of range for a store of {size} records')
+        indexes = np.where(indexes < 0, indexes + size, indexes)
+
+        if len(self.shards) == 1:
+            records = self.shards[0][indexes]
+        else:
+            shard_numbers = np.searchsorted(self.offsets, indexes, side='right') - 1
+            records = np.empty(len(indexes), dtype=RECORD_DTYPE)
+            for shard_number in np.unique(shard_numbers):
+                selected = shard_numbers == shard_number
+                records[selected] = self.shards[shard_number][indexes[selected] - self.offsets[shard_number]]
+
+        return records[0] if is_scalar else records
+
+    # получить батч для обучения по номерам записей:
+    # доски (N, 8, 8, 12), цвет игрока (N,), индексы ходов (N,) и оценки (N,)
+    def get_batch(self, indexes, dtype=np.float32) -> tuple:
+        return records_to_batch(self[indexes], dtype)
@@ -0,0 +1,393 @@
+import argparse
+import json
+import time
+
+from chessboard import ChessBoard, INITIAL_FEN, PIECE_CODES, PIECE_LETTERS
+from move_encoding import FLAGS_MASK, CAPTURE, EN_PASSANT, PROMOTION, PROMOTION_CAPTURE, get_promotion_piece
+
+# Поиск лучшего хода: negamax с альфа-бета отсечением и итеративным углублением.
+#     search = AlphaBetaSearch()
+#     result = search.search(ChessBoard(), max_depth=6, max_time=5)
+#     print(result['best_move'], result['score'], result['pv'])
+#
+# Оценка позиции подключаемая: evaluate(board) -> оценка в сотых долях пешки
+# для игрока, чья очередь хода (по умолчанию - материал и положение фигур, см. material_evaluation).
+# Ходы - закодированные ходы (см. move_encoding), в отчете ходы записаны строками ChessBoard ('Pe2e4').
+
+# стоимость фигур по букве
+PIECE_VALUES = {'P': 100, 'N': 320, 'B': 330, 'R': 500, 'Q': 900, 'K': 0}
+
+# стоимость фигуры по коду (код 0 - пустая клетка)
+CODE_VALUES = [0] + [PIECE_VALUES[letter] for letter in PIECE_LETTERS[1:]]
+
+# Бонусы за положение фигур для белых (индекс - клетка, a1 = 0); для черных доска отражается
+_CENTER_BONUS = [0, 5, 10, 15, 15, 10, 5, 0]
+POSITION_BONUSES = {
+    'P': [0] * 8 + [5 * rank + (10 if 2 <= file <= 5 and rank >= 2 else 0) for rank in range(1, 7) for file in range(8)]
+         + [0] * 8,
+    'N': [_CENTER_BONUS[file] + _CENTER_BONUS[rank] - 20 for rank in range(8) for file in range(8)],
+    'B': [(_CENTER_BONUS[file] + _CENTER_BONUS[rank]) // 2 for rank in range(8) for file in range(8)],
+    'R': [10 if rank == 6 else 0 for rank in range(8) for file in range(8)],
+    'Q': [(_CENTER_BONUS[file] + _CENTER_BONUS[rank]) // 3 for rank in range(8) for file in range(8)],
+    'K': [(20 if file in (1, 2, 6) else 0) - 10 * rank for rank in range(8) for file in range(8)],
+}
+
+# оценка фигуры на клетке по коду фигуры: SQUARE_VALUES[code][index] (для черных - со знаком минус)
+SQUARE_VALUES = [[0] * 64]
+for _code in range(1, 13):
+    _letter = PIECE_LETTERS[_code]
+    if _code < PIECE_CODES['bp']:
+        SQUARE_VALUES.append([PIECE_VALUES[_letter] + POSITION_BONUSES[_letter][index] for index in range(64)])
+    else:
+        SQUARE_VALUES.append([-PIECE_VALUES[_letter] - POSITION_BONUSES[_letter][index ^ 56] for index in range(64)])
+
+# оценка мата: мат через ply полуходов оценивается как MATE_SCORE - ply
+MATE_SCORE = 100000
+MAX_PLY = 128
+MATE_BOUND = MATE_SCORE - MAX_PLY
+INFINITY = MATE_SCORE + 1
+
+# типы оценок в таблице транспозиций
+EXACT = 0
+LOWER_BOUND = 1
+UPPER_BOUND = 2
+
+# как часто (в узлах) проверять ограничение по времени
+TIME_CHECK_INTERVAL = 1024
+
+
+# оценка по материалу и положению фигур для игрока, чья очередь хода
+def material_evaluation(board: ChessBoard) -> int:
+    score = 0
+    for index, code in enumerate(board.board):
+        if code:
+            score += SQUARE_VALUES[code][index]
+    return score if board.current_player_color == 'white' else -score
+
+
+# взятие ли ход (в том числе взятие на проходе и превращение со взятием)
+def is_capture(move: int) -> bool:
+    flag = move & FLAGS_MASK
+    return flag == CAPTURE or flag == EN_PASSANT or flag >= PROMOTION_CAPTURE
+
+
+# Таблица транспозиций фиксированного размера: позиция по хешу Зобриста попадает в ячейку key & mask.
+# Запись: (ключ, глубина, оценка, тип оценки, лучший ход, номер поиска).
+# Замена: запись из прошлого поиска или с меньшей глубиной вытесняется всегда,
+# запись текущего поиска с большей глубиной - только той же позицией.
+class TranspositionTable:
+
+    # size_power - размер таблицы 2 ** size_power записей
+    def __init__(self, size_power: int = 20):
+        self.size = 1 << size_power
+        self.mask = self.size - 1
+        self.entries = [None] * self.size
+        self.age = 0
+
+    # начать новый поиск: записи прошлых поисков становятся кандидатами на замену
+    def new_search(self):
+        self.age += 1
+
+    def clear(self):
+        self.entries = [None] * self.size
+        self.age = 0
+
+    def get(self, key: int):
+        entry = self.entries[key & self.mask]
+        if entry is not None and entry[0] == key:
+            return entry
+        return None
+
+    def put(self, key: int, depth: int, score: int, bound: int, move: int):
+        index = key & self.mask
+        entry = self.entries[index]
+        if entry is None or entry[0] == key or entry[5] != self.age or depth >= entry[1]:
+            # ход той же позиции не теряем, если новый поиск хода не нашел
+            if not move and entry is not None and entry[0] == key:
+                move = entry[4]
+            self.entries[index] = (key, depth, score, bound, move, self.age)
+
+    # заполненность таблицы (доля занятых ячеек по первой тысяче)
+    def usage(self) -> float:
+        sample = self.entries[:1000]
+        return sum(1 for entry in sample if entry is not None) / len(sample)
+
+
+# поиск прерван по ограничению узлов или времени
+class SearchStopped(Exception):
+    pass
+
+
+class AlphaBetaSearch:
+
+    # evaluate - функция оценки позиции (см. описание модуля)
+    # tt_size_power - размер таблицы транспозиций 2 ** tt_size_power записей
+    def __init__(self, evaluate=material_evaluation, tt_size_power: int = 20):
+        self.evaluate = evaluate
+        self.table = TranspositionTable(tt_size_power)
+        self.nodes = 0
+        self._reset_ordering()
+
+    def _reset_ordering(self):
+        # два хода-убийцы на каждый полуход: тихие ходы, которые дали отсечение
+        self.killers = [[0, 0] for _ in range(MAX_PLY)]
+        # история: сколько отсечений дал тихий ход (из клетки, в клетку)
+        self.history = [0] * 4096
+
+    # Найти лучший ход с итеративным углублением (глубина 1, 2, ... до max_depth).
+    # Поиск останавливается по max_depth, max_nodes (узлов) или max_time (секунд);
+    # результат - по последней полностью просчитанной глубине.
+    # on_depth(info) вызывается после каждой глубины
+    # info: глубина, оценка, узлы, время, узлов в секунду, главный вариант (pv)
+    def search(self, board: ChessBoard, max_depth: int = 64, max_nodes: int = None, max_time: float = None,
+               on_depth=None) -> dict:
+        max_depth = min(max_depth, MAX_PLY - 1)
+        self.table.new_search()
+        self._reset_ordering()
+        self.nodes = 0
+        self.max_nodes = max_nodes
+        self.deadline = time.perf_counter() + max_time if max_time is not None else None
+        self._next_time_check = TIME_CHECK_INTERVAL
+        self._pv = [[0] * MAX_PLY for _ in range(MAX_PLY)]
+        self._pv_length = [0] * MAX_PLY
+
+        start_time = time.perf_counter()
+        result = {'best_move': None, 'encoded_best_move': None, 'score': None, 'depth': 0, 'pv': [], 'depths': []}
+
+        for depth in range(1, max_depth + 1):
+            try:
+                score = self._negamax(board, depth, -INFINITY, INFINITY, 0)
+            except SearchStopped:
+                # не успели просчитать даже глубину 1 - берем лучший из просмотренных ходов
+                if result['best_move'] is None and self._pv_length[0] > 0:
+                    move = self._pv[0][0]
+                    result.update({'best_move': board.decode_move(move), 'encoded_best_move': move})
+                break
+
+            seconds = time.perf_counter() - start_time
+            pv, decoded_pv = self._extend_pv(board, self._pv[0][:self._pv_length[0]], depth)
+            info = {
+                'depth': depth,
+                'score': score,
+                'nodes': self.nodes,
+                'seconds': round(seconds, 4),
+                'nodes_per_second': round(self.nodes / seconds) if seconds > 0 else None,
+                'pv': decoded_pv
+            }
+            result['depths'].append(info)
+            result.update({'best_move': info['pv'][0] if pv else None, 'encoded_best_move': pv[0] if pv else None,
+                           'score': score, 'depth': depth, 'pv': info['pv']})
+            if on_depth is not None:
+                on_depth(info)
+
+            # мат найден - глубже искать незачем
+            if abs(score) >= MATE_BOUND or not pv:
+                break
+
+        seconds = time.perf_counter() - start_time
+        result['nodes'] = self.nodes
+        result['seconds'] = round(seconds, 4)
+        result['nodes_per_second'] = round(self.nodes / seconds) if seconds > 0 else None
+        result['table_usage'] = round(self.table.usage(), 3)
+        return result
+
+    # перевести главный вариант в ходы ChessBoard, проходя его на доске
+    # (вариант, оборванный отсечением по таблице транспозиций, продолжается ходами из таблицы)
+    def _extend_pv(self, board: ChessBoard, pv: list, depth: int) -> tuple:
+        pv = list(pv)
+        decoded = []
+        for move in pv:
+            decoded.append(board.decode_move(move))
+            board.push(move)
+        while len(pv) < depth and board.get_repetition_count() < 2:
+            entry = self.table.get(board.zobrist_key)
+            if entry is None or entry[4] not in board.get_encoded_legal_moves(board.current_player_color):
+                break
+            pv.append(entry[4])
+            decoded.append(board.decode_move(entry[4]))
+            board.push(entry[4])
+        for _ in pv:
+            board.pop()
+        return pv, decoded
+
+    # проверить ограничения по узлам и времени
+    def _check_limits(self):
+        if self.max_nodes is not None and self.nodes >= self.max_nodes:
+            raise SearchStopped()
+        if self.deadline is not None and self.nodes >= self._next_time_check:
+            self._next_time_check = self.nodes + TIME_CHECK_INTERVAL
+            if time.perf_counter() >= self.deadline:
+                raise SearchStopped()
+
+    # упорядочить ходы: ход из таблицы транспозиций, взятия и превращения по MVV-LVA
+    # (самая ценная жертва самой дешевой фигурой), ходы-убийцы, остальные - по истории
+    def _order_moves(self, board: ChessBoard, moves: list, tt_move: int, ply: int) -> list:
+        board_codes = board.board
+        killers = self.killers[ply]
+        history = self.history
+        scores = {}
+        for move in moves:
+            if move == tt_move:
+                scores[move] = 1 << 30
+            elif is_capture(move) or move & FLAGS_MASK >= PROMOTION:
+                victim = CODE_VALUES[board_codes[(move >> 6) & 63]] or (100 if is_capture(move) else 0)
+                promotion = get_promotion_piece(move)
+                gain = victim + (PIECE_VALUES[promotion] if promotion else 0)
+                scores[move] = (1 << 28) + gain * 16 - CODE_VALUES[board_codes[move & 63]] // 10
+            elif move == killers[0]:
+                scores[move] = (1 << 27) + 1
+            elif move == killers[1]:
+                scores[move] = 1 << 27
+            else:
+                scores[move] = history[move & 4095]
+        return sorted(moves, key=scores.__getitem__, reverse=True)
+
+    def _negamax(self, board: ChessBoard, depth: int, alpha: int, beta: int, ply: int) -> int:
+        self._pv_length[ply] = ply
+
+        # ничья по повторению или правилу 50 ходов (в корне ход все равно нужен)
+        if ply > 0 and (board.get_repetition_count() >= 2 or board.halfmove_clock >= 100):
+            return 0
+
+        if depth <= 0 or ply >= MAX_PLY - 1:
+            return self._quiescence(board, alpha, beta, ply)
+
+        self.nodes += 1
+        self._check_limits()
+
+        key = board.zobrist_key
+        entry = self.table.get(key)
+        tt_move = 0
+        if entry is not None:
+            tt_move = entry[4]
+            if ply > 0 and entry[1] >= depth:
+                score = _score_from_table(entry[2], ply)
+                bound = entry[3]
+                if bound == EXACT or (bound == LOWER_BOUND and score >= beta) or \
+                        (bound == UPPER_BOUND and score <= alpha):
+                    return score
+
+        color = board.current_player_color
+        moves = board.get_encoded_legal_moves(color)
+        if not moves:
+            return -MATE_SCORE + ply if board.is_check(color) else 0
+
+        original_alpha = alpha
+        best_score = -INFINITY
+        best_move = 0
+        pv = self._pv
+
+        for move in self._order_moves(board, moves, tt_move, ply):
+            board.push(move)
+            try:
+                score = -self._negamax(board, depth - 1, -beta, -alpha, ply + 1)
+            finally:
+                board.pop()
+
+            if score > best_score:
+                best_score = score
+                best_move = move
+            if score > alpha:
+                alpha = score
+                # главный вариант: этот ход + главный вариант ответа
+                pv[ply][ply] = move
+                next_length = self._pv_length[ply + 1]
+                pv[ply][ply + 1:next_length] = pv[ply + 1][ply + 1:next_length]
+                self._pv_length[ply] = max(next_length, ply + 1)
+            if alpha >= beta:
+                if not is_capture(move) and move & FLAGS_MASK < PROMOTION:
+                    killers = self.killers[ply]
+                    if killers[0] != move:
+                        killers[1] = killers[0]
+                        killers[0] = move
+                    self.history[move & 4095] += depth * depth
+                break
+
+        if best_score <= original_alpha:
+            bound = UPPER_BOUND
+        elif best_score >= beta:
+            bound = LOWER_BOUND
+        else:
+            bound = EXACT
+        self.table.put(key, depth, _score_to_table(best_score, ply), bound,
+                       best_move if bound != UPPER_BOUND else 0)
+        return best_score
+
+    # поиск только взятий и превращений до спокойной позиции (чтобы не оценивать позицию посреди размена)
+    # под шахом просматриваются все ходы: оценка позиции не годится, пока шах не закрыт
+    def _quiescence(self, board: ChessBoard, alpha: int, beta: int, ply: int) -> int:
+        self.nodes += 1
+        self._check_limits()
+
+        color = board.current_player_color
+        moves = board.get_encoded_legal_moves(color)
+        in_check = board.is_check(color)
+        if not moves:
+            return -MATE_SCORE + ply if in_check else 0
+
+        if not in_check:
+            stand_pat = self.evaluate(board)
+            if stand_pat >= beta or ply >= MAX_PLY - 1:
+                return stand_pat
+            if stand_pat > alpha:
+                alpha = stand_pat
+            moves = [move for move in moves if is_capture(move) or move & FLAGS_MASK >= PROMOTION]
+        elif ply >= MAX_PLY - 1:
+            return self.evaluate(board)
+
+        best_score = alpha
+        for move in self._order_moves(board, moves, 0, ply):
+            board.push(move)
+            try:
+                score = -self._quiescence(board, -beta, -alpha, ply + 1)
+            finally:
+                board.pop()
+
+            if score >= beta:
+                return score
+            if score > best_score:
+                best_score = alpha = score
+        return best_score
+
+
+# оценка мата в таблице транспозиций хранится от текущей позиции, а не от корня поиска
+def _score_to_table(score: int, ply: int) -> int:
+    if score >= MATE_BOUND:
+        return score + ply
+    if score <= -MATE_BOUND:
+        return score - ply
+    return score
+
+
+def _score_from_table(score: int, ply: int) -> int:
+    if score >= MATE_BOUND:
+        return score - ply
+    if score <= -MATE_BOUND:
+        return score + ply
+    return score
+
+
+def main():
+    parser = argparse.ArgumentParser(description='alpha-beta search of the best move')
+    parser.add_argument('--fen', default=INITIAL_FEN, help='position (default: initial position)')
+    parser.add_argument('--depth', type=int, help='maximum depth in plies')
+    parser.add_argument('--nodes', type=int, help='maximum number of nodes')
+    parser.add_argument('--time', type=float, help='maximum time in seconds')
+    parser.add_argument('--tt-size-power', type=int, default=20, help='transposition table of 2 ** N entries')
+    args = parser.parse_args()
+
+    if args.depth is None and args.nodes is None and args.time is None:
+        parser.error('set at least one of --depth, --nodes and --time')
+
+    def print_depth(info: dict):
+        print(f"depth {info['depth']} score {info['score']} nodes {info['nodes']} "
+              f"nps {info['nodes_per_second']} pv {' '.join(info['pv'])}")
+
+    search = AlphaBetaSearch(tt_size_power=args.tt_size_power)
+    result = search.search(ChessBoard.from_fen(args.fen), args.depth or MAX_PLY, args.nodes, args.time, print_depth)
+    del result['depths']
+    print(json.dumps(result, indent=4))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+import argparse
+import json
+import multiprocessing
+import random
+import time
+
+import numpy as np
+
+from chessboard import ChessBoard
+from move_encoding import POLICY_INDEX
+from pgn import RESULTS
+from position_store import PositionWriter, RECORD_DTYPE, pack_boards
+
+# Самоигра: ChessBoard играет сам с собой, партии идут параллельно в нескольких процессах,
+# позиции законченных партий сразу записываются в шарды (см. position_store).
+#
+# Выбор хода (policy) - функция policy(board, legal_moves, rng) -> ход,
+# где legal_moves - закодированные разрешенные ходы (см. move_encoding), rng - random.Random партии.
+# Функция должна передаваться в другой процесс (pickle), т.е. быть объявлена на уровне модуля.
+
+
+# случайный ход
+def random_policy(board: ChessBoard, legal_moves: list, rng: random.Random) -> int:
+    return rng.choice(legal_moves)
+
+
+# ход по оценке нейросети: evaluator(board) возвращает выход policy_head (вектор по словарю moves.json),
+# ход выбирается по вероятностям разрешенных ходов (temperature=0 - всегда лучший ход)
+class EvaluatorPolicy:
+
+    def __init__(self, evaluator, temperature: float = 1.0):
+        self.evaluator = evaluator
+        self.temperature = temperature
+
+    def __call__(self, board: ChessBoard, legal_moves: list, rng: random.Random) -> int:
+        from encoding import sample_legal_move
+        return sample_legal_move(self.evaluator(board), legal_moves, rng, self.temperature)
+
+
+# сыграть одну партию
+# результат: ходы (закодированные), результат ('1-0', '0-1', '1/2-1/2'), причина окончания
+# и записи позиций для обучения (см. position_store, value - результат для игрока, чья очередь хода)
+# ходы делаются через push: история позиций (stats_list) не накапливается, в стеке отмены на каждый
+# полуход остается только короткая запись изменений; повторения считаются по хешам позиций
+def play_game(policy=random_policy, seed: int = None, max_plies: int = 512,
+              draw_on_threefold: bool = False) -> dict:
+    rng = random.Random(seed)
+    board = ChessBoard()
+    moves = []
+    records = []
+
+    while True:
+        # одна генерация разрешенных ходов на полуход: и для проверки окончания партии, и для выбора хода
+        status = board.game_status()
+        legal_moves = status['encoded_legal_moves']
+
+        if status['status'] != 'ongoing':
+            result, termination = status['result'], status['status']
+            break
+        if draw_on_threefold and board.is_threefold_repetition():
+            result, termination = '1/2-1/2', 'threefold_repetition'
+            break
+        if len(moves) >= max_plies:
+            result, termination = '1/2-1/2', 'max_plies'
+            break
+
+        move = policy(board, legal_moves, rng)
+        records.append(pack_boards([board], [POLICY_INDEX[move]], [0]))
+        moves.append(move)
+        board.push(move)
+
+    # оценка позиции - результат партии для игрока, чья очередь хода (белые ходят на четных полуходах)
+    records = np.concatenate(records) if records else np.empty(0, dtype=RECORD_DTYPE)
+    white_result = RESULTS[result]
+    records['value'] = np.where(np.arange(len(records)) % 2 == 0, white_result, -white_result)
+
+    return {'moves': moves, 'result': result, 'termination': termination, 'records': records}
+
+
+# политика выбора хода, переданная в процесс-исполнитель при запуске
+_worker_policy = None
+
+
+def _init_worker(policy):
+    global _worker_policy
+    _worker_policy = policy
+
+
+# партия в процессе-исполнителе: возвращаются только записи позиций и итог партии
+def _play_worker_game(task: tuple) -> tuple:
+    seed, max_plies, draw_on_threefold = task
+    game = play_game(_worker_policy, seed, max_plies, draw_on_threefold)
+    return game['records'].tobytes(), len(game['moves']), game['result'], game['termination']
+
+
+# Запустить самоигру: games партий на workers процессах, позиции пишутся в шарды папки output
+# по мере окончания партий (если output не задан - только статистика)
+def run_selfplay(games: int, output: str = None, workers: int = None, policy=random_policy, seed: int = 0,
+                 max_plies: int = 512, draw_on_threefold: bool = False, records_per_shard: int = 1000000) -> dict:
+    workers = workers or multiprocessing.cpu_count()
+    tasks = [(seed + number, max_plies, draw_on_threefold) for number in range(games)]
+    report = {'games': 0, 'plies': 0, 'results': {}, 'terminations': {}}
+
+    writer = PositionWriter(output, records_per_shard=records_per_shard) if output else None
+    start_time = time.perf_counter()
+    try:
+        with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(policy,)) as pool:
+            for records, plies, result, termination in pool.imap_unordered(_play_worker_game, tasks):
+                if writer is not None:
+                    writer.write(np.frombuffer(records, dtype=RECORD_DTYPE))
+                report['games'] += 1
+                report['plies'] += plies
+                report['results'][result] = report['results'].get(result, 0) + 1
+                report['terminations'][termination] = report['terminations'].get(termination, 0) + 1
+    finally:
+        if writer is not None:
+            writer.close()
+    seconds = time.perf_counter() - start_time
+
+    report['workers'] = workers
+    report['seconds'] = round(seconds, 4)
+    report['games_per_second'] = round(report['games'] / seconds, 2) if seconds > 0 else None
+    report['plies_per_second'] = round(report['plies'] / seconds, 1) if seconds > 0 else None
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='self-play with random moves, positions written to shards')
+    parser.add_argument('--games', type=int, default=100, help='number of games')
+    parser.add_argument('--output', help='directory for position shards (default: statistics only)')
+    parser.add_argument('--workers', type=int, help='number of processes (default: one per CPU core)')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the first game (game i uses seed + i)')
+    parser.add_argument('--max-plies', type=int, default=512, help='adjudicate a draw after this many plies')
+    parser.add_argument('--draw-on-threefold', action='store_true', help='end games on threefold repetition')
+    parser.add_argument('--records-per-shard', type=int, default=1000000, help='positions per shard file')
+    args = parser.parse_args()
+
+    report = run_selfplay(args.games, args.output, args.workers, random_policy, args.seed, args.max_plies,
+                          args.draw_on_threefold, args.records_per_shard)
+    print(json.dumps(report, indent=4))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,320 @@
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import threading
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from chessboard import ChessBoard
+from encoding import PLANES_COUNT, encode_board_codes, sample_legal_move
+from mcts import material_evaluator
+from move_encoding import POLICY_SIZE
+
+# Кольцевой буфер позиций в общей памяти (multiprocessing.shared_memory) для передачи позиций
+# от процессов самоигры процессу-оценщику без pickle:
+#
+#   процесс самоигры (производитель)          процесс-оценщик (потребитель)
+#   policy, value = ring.evaluate(board)      start, count = ring.next_batch(256)
+#                                             boards, colors = ring.get_inputs(start, count)  # без копирования
+#                                             ring.policy[start:start + count] = ...
+#                                             ring.values[start:start + count] = ...
+#                                             ring.complete(start, count)
+#
+# Буфер - slots ячеек, ячейки выдаются производителям по кругу. Производитель пишет позицию прямо в ячейку
+# (коды клеток или закодированную доску 8x8x12), потребитель берет подряд идущие готовые ячейки
+# одним срезом массива и пишет в те же ячейки результат (policy и value), производитель забирает результат
+# и освобождает ячейку. Если свободных ячеек нет, производитель ждет (ограничение очереди).
+#
+# Кольцо передается в другие процессы только при их создании (наследованием): как аргумент
+# multiprocessing.Process(args=...) или через initializer / initargs у multiprocessing.Pool.
+# При передаче копируются только имя общей памяти и объекты синхронизации. Lock и Semaphore
+# нельзя передать в уже запущенный процесс, поэтому кольцо нельзя передавать в Pool.map / apply
+# (будет RuntimeError).
+
+# состояния ячеек
+FREE = 0
+WRITING = 1
+READY = 2
+DONE = 3
+
+# счетчики в общей памяти: сколько ячеек выдано производителям и сколько взято потребителем
+_HEAD = 0
+_TAIL = 1
+
+# выравнивание массивов в общей памяти
+_ALIGNMENT = 64
+
+
+# раскладка массивов в общей памяти: [(имя, dtype, форма, смещение)], общий размер
+def _layout(slots: int, planes: bool, policy_dtype) -> tuple:
+    arrays = [
+        ('control', np.dtype(np.int64), (2,)),
+        ('states', np.dtype(np.int32), (slots,)),
+        ('boards', np.dtype(np.uint8), (slots, 8, 8, PLANES_COUNT) if planes else (slots, 64)),
+        ('colors', np.dtype(np.uint8), (slots,)),
+        ('policy', np.dtype(policy_dtype), (slots, POLICY_SIZE)),
+        ('values', np.dtype(np.float32), (slots,)),
+    ]
+    layout = []
+    offset = 0
+    for name, dtype, shape in arrays:
+        layout.append((name, dtype, shape, offset))
+        size = dtype.itemsize * int(np.prod(shape))
+        offset += (size + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
+    return layout, offset
+
+
+class SharedPositionRing:
+
+    # slots - количество ячеек (сколько позиций может одновременно ждать оценки)
+    # planes - хранить в ячейках закодированную доску 8x8x12 (768 байт) вместо кодов клеток (64 байта);
+    #          с кодами клеток доски кодируются потребителем одним вызовом на батч
+    # policy_dtype - тип policy в ячейках (float16 вдвое уменьшает общую память)
+    # poll_interval - пауза (секунды) между проверками состояния ячейки при ожидании
+    def __init__(self, slots: int = 1024, planes: bool = False, policy_dtype=np.float16,
+                 poll_interval: float = 0.0001):
+        if slots <= 0:
+            raise AttributeError("the parameter 'slots' must be positive")
+
+        self.slots = slots
+        self.planes = planes
+        self.policy_dtype = np.dtype(policy_dtype)
+        self.poll_interval = poll_interval
+
+        layout, size = _layout(slots, planes, self.policy_dtype)
+        self._memory = shared_memory.SharedMemory(create=True, size=size)
+        # общую память удаляет только создавший ее процесс (при fork копия кольца попадает в дочерние процессы)
+        self._owner_pid = os.getpid()
+        self._attach_arrays(layout)
+        self.control[:] = 0
+        self.states[:] = FREE
+
+        # lock - выдача ячеек производителям
+        # free_slots - количество свободных ячеек (производитель ждет, если их нет)
+        # ready_slots - количество готовых, но не взятых потребителем ячеек (потребитель ждет, если их нет)
+        self.lock = multiprocessing.Lock()
+        self.free_slots = multiprocessing.Semaphore(slots)
+        self.ready_slots = multiprocessing.Semaphore(0)
+
+    def _attach_arrays(self, layout: list):
+        for name, dtype, shape, offset in layout:
+            setattr(self, name, np.ndarray(shape, dtype=dtype, buffer=self._memory.buf, offset=offset))
+
+    # при передаче в создаваемый процесс передается имя общей памяти, а не ее содержимое
+    # (объекты синхронизации multiprocessing передаются только при создании процесса)
+    def __getstate__(self):
+        return {'name': self._memory.name, 'slots': self.slots, 'planes': self.planes,
+                'policy_dtype': self.policy_dtype.str, 'poll_interval': self.poll_interval,
+                'lock': self.lock, 'free_slots': self.free_slots, 'ready_slots': self.ready_slots}
+
+    def __setstate__(self, state: dict):
+        self.slots = state['slots']
+        self.planes = state['planes']
+        self.policy_dtype = np.dtype(state['policy_dtype'])
+        self.poll_interval = state['poll_interval']
+        self.lock = state['lock']
+        self.free_slots = state['free_slots']
+        self.ready_slots = state['ready_slots']
+        self._memory = shared_memory.SharedMemory(name=state['name'], track=False)
+        self._owner_pid = None
+        self._attach_arrays(_layout(self.slots, self.planes, self.policy_dtype)[0])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    # отключиться от общей памяти (создатель кольца также удаляет ее)
+    def close(self):
+        if self._memory is None:
+            return
+        for name in ('control', 'states', 'boards', 'colors', 'policy', 'values'):
+            setattr(self, name, None)
+        self._memory.close()
+        if self._owner_pid == os.getpid():
+            self._memory.unlink()
+        self._memory = None
+
+    # --- производитель ---
+
+    # получить свободную ячейку (ждет, пока не освободится)
+    def _claim_slot(self) -> int:
+        self.free_slots.acquire()
+        with self.lock:
+            slot = int(self.control[_HEAD] % self.slots)
+            self.control[_HEAD] += 1
+        # ячейки выдаются по кругу: прежний владелец ячейки мог еще не забрать свой результат
+        while self.states[slot] != FREE:
+            time.sleep(self.poll_interval)
+        self.states[slot] = WRITING
+        return slot
+
+    # отметить ячейку готовой к оценке
+    def _publish(self, slot: int):
+        self.states[slot] = READY
+        self.ready_slots.release()
+
+    # записать позицию доски в свободную ячейку, результат - номер ячейки
+    def submit(self, board: ChessBoard) -> int:
+        slot = self._claim_slot()
+        codes = np.frombuffer(board.board, dtype=np.uint8)
+        if self.planes:
+            encode_board_codes(codes, out=self.boards[slot:slot + 1])
+        else:
+            self.boards[slot] = codes
+        self.colors[slot] = board.current_player_color == 'white'
+        self._publish(slot)
+        return slot
+
+    # записать уже закодированную позицию (коды клеток (64,) или доску (8, 8, 12) - по формату кольца)
+    def submit_encoded(self, board: np.ndarray, color: int) -> int:
+        slot = self._claim_slot()
+        self.boards[slot] = board
+        self.colors[slot] = color
+        self._publish(slot)
+        return slot
+
+    # дождаться результата ячейки: (policy (POLICY_SIZE,) float32, value), ячейка освобождается
+    def result(self, slot: int) -> tuple:
+        while self.states[slot] != DONE:
+            time.sleep(self.poll_interval)
+        policy = self.policy[slot].astype(np.float32)
+        value = float(self.values[slot])
+        self.states[slot] = FREE
+        self.free_slots.release()
+        return policy, value
+
+    # оценить позицию: записать в кольцо и дождаться результата
+    def evaluate(self, board: ChessBoard) -> tuple:
+        return self.result(self.submit(board))
+
+    # --- потребитель (один процесс) ---
+
+    # Получить батч: подряд идущие готовые ячейки, начиная с первой не взятой (не больше max_batch_size
+    # и без перехода через конец кольца, чтобы батч был одним срезом массивов).
+    # Результат: (первая ячейка, количество) или None, если за timeout секунд готовых ячеек не появилось
+    def next_batch(self, max_batch_size: int = 256, timeout: float = None):
+        deadline = time.perf_counter() + timeout if timeout is not None else None
+        while True:
+            remaining = max(deadline - time.perf_counter(), 0) if deadline is not None else None
+            if not self.ready_slots.acquire(timeout=remaining):
+                return None
+
+            start = int(self.control[_TAIL] % self.slots)
+            run = self.states[start:min(start + max_batch_size, self.slots)] == READY
+            count = len(run) if run.all() else int(run.argmin())
+            if count:
+                # каждая готовая ячейка батча уже отметилась в ready_slots (одну отметку взяли выше)
+                for _ in range(count - 1):
+                    self.ready_slots.acquire()
+                self.control[_TAIL] += count
+                return start, count
+
+            # готова другая ячейка, а первая еще записывается - возвращаем отметку и ждем
+            self.ready_slots.release()
+            time.sleep(self.poll_interval)
+
+    # входы батча для модели: доски (N, 8, 8, 12) и цвета (N,)
+    # (в формате planes - срезы общей памяти без копирования, иначе доски кодируются из кодов клеток)
+    def get_inputs(self, start: int, count: int) -> tuple:
+        boards = self.boards[start:start + count]
+        if not self.planes:
+            boards = encode_board_codes(boards)
+        return boards, self.colors[start:start + count]
+
+    # отметить результаты батча (policy и values уже записаны в ячейки) готовыми для производителей
+    def complete(self, start: int, count: int):
+        self.states[start:start + count] = DONE
+
+    # записать результаты модели в ячейки батча и отдать их производителям
+    def complete_with(self, start: int, count: int, policy: np.ndarray, values: np.ndarray):
+        self.policy[start:start + count] = policy
+        self.values[start:start + count] = values
+        self.complete(start, count)
+
+    # сколько позиций ждет оценки
+    def pending(self) -> int:
+        return int(self.control[_HEAD] - self.control[_TAIL])
+
+
+# Цикл оценщика: брать батчи из кольца и оценивать моделью model(boards, colors) -> (policy, values),
+# пока не установлен stop. Результат - статистика батчей
+def serve(ring: SharedPositionRing, model, stop, max_batch_size: int = 256) -> dict:
+    stats = {'batches': 0, 'positions': 0, 'model_seconds': 0.0}
+    while True:
+        batch = ring.next_batch(max_batch_size, timeout=0.05)
+        if batch is None:
+            if stop.is_set():
+                break
+            continue
+
+        start, count = batch
+        boards, colors = ring.get_inputs(start, count)
+        model_start = time.perf_counter()
+        policy, values = model(boards, colors)
+        stats['model_seconds'] += time.perf_counter() - model_start
+        ring.complete_with(start, count, policy, values)
+        stats['batches'] += 1
+        stats['positions'] += count
+
+    stats['average_batch_size'] = round(stats['positions'] / stats['batches'], 2) if stats['batches'] else None
+    stats['model_seconds'] = round(stats['model_seconds'], 4)
+    return stats
+
+
+# процесс самоигры для проверки скорости: партии со случайными по policy ходами, positions оценок
+def _produce_games(ring: SharedPositionRing, positions: int, seed: int):
+    rng = random.Random(seed)
+    board = ChessBoard()
+    for _ in range(positions):
+        status = board.game_status()
+        if status['status'] != 'ongoing' or board.halfmove_clock >= 100:
+            board = ChessBoard()
+            status = board.game_status()
+        policy, _ = ring.evaluate(board)
+        board.push(sample_legal_move(policy, status['encoded_legal_moves'], rng))
+    ring.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='self-play processes evaluated through a shared-memory ring')
+    parser.add_argument('--producers', type=int, default=multiprocessing.cpu_count(), help='self-play processes')
+    parser.add_argument('--positions', type=int, default=2000, help='evaluations per producer')
+    parser.add_argument('--slots', type=int, default=1024, help='ring slots')
+    parser.add_argument('--max-batch-size', type=int, default=256, help='maximum positions per model call')
+    parser.add_argument('--planes', action='store_true', help='producers write 8x8x12 planes instead of codes')
+    args = parser.parse_args()
+
+    with SharedPositionRing(args.slots, args.planes) as ring:
+        stop = multiprocessing.Event()
+        producers = [multiprocessing.Process(target=_produce_games, args=(ring, args.positions, number))
+                     for number in range(args.producers)]
+        start_time = time.perf_counter()
+        for producer in producers:
+            producer.start()
+
+        # когда все производители закончат, цикл оценщика остановится
+        def wait_producers():
+            for producer in producers:
+                producer.join()
+            stop.set()
+
+        waiter = threading.Thread(target=wait_producers, daemon=True)
+        waiter.start()
+        report = serve(ring, material_evaluator, stop, args.max_batch_size)
+        waiter.join()
+        seconds = time.perf_counter() - start_time
+
+    report['producers'] = args.producers
+    report['seconds'] = round(seconds, 4)
+    report['positions_per_second'] = round(report['positions'] / seconds, 1) if seconds > 0 else None
+    print(json.dumps(report, indent=4))
+
+
+if __name__ == '__main__':
+    main()
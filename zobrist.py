@@ -0,0 +1,21 @@
+import random
+
+# Ключи Зобриста (64-битные случайные числа) для хеширования позиции
+# Хеш позиции = XOR ключей всех фигур на своих клетках, очереди хода черных,
+# прав на рокировку и вертикали взятия на проходе.
+# Генератор с фиксированным зерном: хеши одинаковые во всех процессах и запусках.
+
+_random = random.Random(20240611)
+
+# PIECE_KEYS[код фигуры][индекс клетки] (для пустой клетки - нули)
+PIECE_KEYS = [[0] * 64] + [[_random.getrandbits(64) for _ in range(64)] for _ in range(12)]
+
+# ход черных
+BLACK_TO_MOVE_KEY = _random.getrandbits(64)
+
+# права на рокировку (в порядке CASTLING_KEYS из chessboard):
+# белые короткая, белые длинная, черные короткая, черные длинная
+CASTLING_RIGHTS_KEYS = [_random.getrandbits(64) for _ in range(4)]
+
+# вертикаль (a-h), на которой возможно взятие на проходе
+EN_PASSANT_FILE_KEYS = [_random.getrandbits(64) for _ in range(8)]